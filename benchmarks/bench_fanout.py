@@ -0,0 +1,95 @@
+"""
+Задержка двухсторонних шагов игры (PlayerCode.BOTH и пачек действий)
+при сетевой задержке Bot API: одновременная рассылка обоим игрокам
+против прежней последовательной. Игры идут одновременно, так что при
+большом --games к задержке сети добавляется загрузка процессора.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_fanout --games 50 --delay 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Awaitable, Iterable
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.fakes import FakeBot, unlimit_outbound
+from handlers.user_handlers.game_managers import (GameMaster, GameSession,
+                                                  PlayerAction)
+from utils.enums import PlayerCode
+
+
+class SequentialGameMaster(GameMaster):
+    """GameMaster с прежним поведением: операции сторон по очереди"""
+
+    @staticmethod
+    async def _fan_out(*aws: Awaitable[Any]) -> list[Any]:
+        return [await aw for aw in aws]
+
+    async def batch(self, actions: Iterable[PlayerAction]) -> list[Any]:
+        return [await aw for _, aw in actions]
+
+
+async def play_steps(master: GameMaster) -> dict[str, float]:
+    '''Проходит типичные двухсторонние шаги игры, замеряя каждый'''
+    timings: dict[str, float] = {}
+
+    async def step(name: str, aw: Awaitable[Any]) -> None:
+        start = time.perf_counter()
+        await aw
+        timings[name] = time.perf_counter() - start
+
+    for user_id in master.session_id:
+        master.session.moves[user_id].update(first_hand='rock',
+                                             second_hand='paper')
+        master.session.countdown_messages[user_id] = 1
+    await step('answer(BOTH)', master.answer(PlayerCode.BOTH, text='hi'))
+    await step('show_players_hands', master.show_players_hands())
+    await step('start_hand_choice_round', master.start_hand_choice_round())
+    await step('delete_countdown(BOTH)', master.delete_countdown(
+        PlayerCode.BOTH))
+    await step('finish_game', master.finish_game())
+    return timings
+
+
+async def run(games: int, delay: float,
+              sequential: bool) -> dict[str, list[float]]:
+    unlimit_outbound()  # Лимиты Telegram здесь не измеряются
+    bot, storage = FakeBot(delay=delay), MemoryStorage()
+    master_cls = SequentialGameMaster if sequential else GameMaster
+    masters = [
+        master_cls(GameSession((2 * i + 1, 2 * i + 2),
+                               bot, storage),  # type: ignore[arg-type]
+                   2 * i + 1)
+        for i in range(games)
+    ]
+    results = await asyncio.gather(*(play_steps(m) for m in masters))
+    assert not GameSession.sessions
+    return {name: [timings[name] for timings in results]
+            for name in results[0]}
+
+
+def report(title: str, samples: dict[str, list[float]]) -> None:
+    print(title)
+    for name, values in samples.items():
+        values.sort()
+        p99 = values[min(int(len(values) * 0.99), len(values) - 1)]
+        print(f"  {name:<26} median {statistics.median(values) * 1e3:7.1f} ms"
+              f"   p99 {p99 * 1e3:7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.05,
+                        help='задержка одного вызова Bot API, с')
+    args = parser.parse_args()
+    for sequential in (True, False):
+        samples = asyncio.run(run(args.games, args.delay, sequential))
+        report('sequential' if sequential else 'concurrent', samples)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Сравнение ожидания выбора обеих рук: опрос FSM каждые 100 мс против
+почтового ящика GameSession (ходы - события, таймаут - колесо таймеров).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_hands_wait --games 500 --timeout 2
+"""
+import argparse
+import asyncio
+import random
+
+from aiogram.fsm.storage.base import StorageKey
+
+from benchmarks.fakes import CountingEventLoop, CountingStorage, FakeBot
+from handlers.user_handlers.game_managers import (GameMaster, GameSession,
+                                                  Move)
+from states.states import FSMPlay
+from utils.enums import GamePhase, PlayerCode
+
+
+class ObservedSession(GameSession):
+    """Сессия, которая по итогам выбора ходов только запоминает итог"""
+
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        self.result: asyncio.Future[PlayerCode] = (
+            asyncio.get_running_loop().create_future())
+
+    async def _end_moves(self, master: GameMaster) -> None:
+        self.result.set_result(master.players_ready())
+
+
+async def legacy_wait(storage: CountingStorage, keys: list[StorageKey],
+                      timeout: float,
+                      check_interval: float = 0.1) -> PlayerCode:
+    """Прежняя реализация wait_for_hands_completion (опрос хранилища)"""
+    start_time = asyncio.get_event_loop().time()
+    while True:
+        user_state, opp_state = await asyncio.gather(
+            *(storage.get_state(key) for key in keys))
+        user_complete = (user_state == FSMPlay.both_hands_ready)
+        opp_complete = (opp_state == FSMPlay.both_hands_ready)
+        if user_complete and opp_complete:
+            return PlayerCode.BOTH
+        if asyncio.get_event_loop().time() - start_time >= timeout:
+            if user_complete:
+                return PlayerCode.USER
+            if opp_complete:
+                return PlayerCode.OPPONENT
+            return PlayerCode.NOBODY
+        await asyncio.sleep(check_interval)
+
+
+async def play_game(bot: FakeBot, storage: CountingStorage, user_id: int,
+                    opponent_id: int, timeout: float, legacy: bool,
+                    rnd: random.Random) -> PlayerCode:
+    session = ObservedSession((user_id, opponent_id), bot, storage)
+    # Первые руки уже выбраны, ждем вторые
+    session.phase = GamePhase.MOVES
+    for uid in session.session_id:
+        session.moves[uid]['first_hand'] = 'rock'
+    keys = [StorageKey(bot_id=bot.id, chat_id=uid, user_id=uid)
+            for uid in session.session_id]
+
+    async def click(uid: int, key: StorageKey) -> None:
+        # Примерно каждый пятый игрок не успевает сделать ход
+        if rnd.random() < 0.2:
+            return
+        await asyncio.sleep(rnd.uniform(0.1, timeout * 0.8))
+        if legacy:  # Прежний process_second_hand писал состояние сам
+            await storage.set_state(key, FSMPlay.both_hands_ready)
+        else:
+            session.post(Move(uid, 'second_hand', 'paper'))
+
+    clicks = [asyncio.create_task(click(uid, key))
+              for uid, key in zip(session.session_id, keys)]
+    if legacy:
+        result = await legacy_wait(storage, keys, timeout)
+    else:
+        session._arm('hands', timeout)
+        result = await session.result
+    await asyncio.gather(*clicks)
+    await session.join()
+    session.delete()
+    return result
+
+
+async def run(games: int, timeout: float, legacy: bool,
+              seed: int) -> tuple[list[PlayerCode], CountingStorage]:
+    bot, storage, rnd = FakeBot(), CountingStorage(), random.Random(seed)
+    results = await asyncio.gather(*(
+        play_game(bot, storage, 2 * i + 1, 2 * i + 2, timeout, legacy, rnd)
+        for i in range(games)
+    ))
+    assert not GameSession.sessions
+    return list(results), storage
+
+
+def measure(games: int, timeout: float, legacy: bool, seed: int) -> dict:
+    loop = CountingEventLoop()
+    start = loop.time()
+    try:
+        results, storage = loop.run_until_complete(
+            run(games, timeout, legacy, seed))
+    finally:
+        loop.close()
+    return {
+        'results': results,
+        'wakeups': loop.wakeups / games,
+        'storage': sum(storage.ops.values()) / games,
+        'reads': storage.ops['get_state'] / games,
+        'elapsed': loop.time() - start,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    before = measure(args.games, args.timeout, legacy=True, seed=args.seed)
+    after = measure(args.games, args.timeout, legacy=False, seed=args.seed)
+    assert before['results'] == after['results'], 'Семантика изменилась'
+
+    print(f'games={args.games} timeout={args.timeout}s')
+    print(f'{"":>8} {"wakeups/game":>14} {"storage ops/game":>17} '
+          f'{"state reads/game":>17} {"wall, s":>8}')
+    for name, res in (('polling', before), ('actor', after)):
+        print(f'{name:>8} {res["wakeups"]:>14.1f} {res["storage"]:>17.1f} '
+              f'{res["reads"]:>17.1f} {res["elapsed"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+История игр под нагрузкой: --games партий идут через обработчики
+game_handlers волнами по --concurrency, итоги пишутся в SQLite через
+очередь отложенной записи. Для прогона без истории и с ней показываются
+скорость партий, вставок и задержки цикла событий; затем - предельная
+скорость записи, когда в очередь разом попадает --burst итогов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_history --games 5000 --concurrency 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.bench_storage_ops import play_game
+from benchmarks.fakes import FakeBot, unlimit_outbound
+from database.history import MatchHistory, MatchRecord, history_task
+from handlers.user_handlers.game_managers import GameSession
+from utils.enums import MatchOutcome
+
+
+async def probe_lag(lags: list[float], interval: float = 0.001) -> None:
+    """Насколько позже заказанного просыпается задача в цикле событий"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def play(games: int, concurrency: int,
+               history: MatchHistory | None) -> dict:
+    unlimit_outbound()
+    bot, storage = FakeBot(), MemoryStorage()
+    GameSession.history = history
+    writer = (asyncio.create_task(history_task(history))
+              if history is not None else None)
+    lags: list[float] = []
+    probe = asyncio.create_task(probe_lag(lags))
+    start = time.perf_counter()
+    for wave in range(0, games, concurrency):
+        await asyncio.gather(*(
+            play_game(bot, storage, 2 * i + 1, 2 * i + 2)
+            for i in range(wave, min(wave + concurrency, games))))
+    played = time.perf_counter() - start
+    if history is not None:
+        # Ждем, пока фоновая запись догонит игры
+        while history.stats.written < history.stats.recorded:
+            await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+    if writer is not None:
+        writer.cancel()
+    GameSession.history = None
+    lags.sort()
+    return {'games/s': games / played, 'elapsed': elapsed,
+            'lag p99': lags[int(len(lags) * 0.99)], 'lag max': lags[-1]}
+
+
+async def burst(history: MatchHistory, count: int) -> float:
+    writer = asyncio.create_task(history_task(history))
+    start = time.perf_counter()
+    for i in range(count):
+        history.record(MatchRecord(
+            finished_at=time.time(), player1=2 * i + 1, player2=2 * i + 2,
+            first_hand1='rock', second_hand1='paper', first_hand2='rock',
+            second_hand2=None, winner=2 * i + 1, outcome=MatchOutcome.WIN))
+    while history.stats.written < history.stats.recorded:
+        await asyncio.sleep(0.001)
+    writer.cancel()
+    return count / (time.perf_counter() - start)
+
+
+async def run(games: int, concurrency: int, burst_size: int) -> None:
+    print(f"games={games} concurrency={concurrency}")
+    print(f"{'':>10} {'games/s':>9} {'inserts/s':>10} {'batches':>8} "
+          f"{'avg batch':>10} {'lag p99, ms':>12} {'lag max, ms':>12}")
+    with tempfile.TemporaryDirectory() as path:
+        history = MatchHistory(os.path.join(path, 'history.sqlite3'))
+        for name, store in (('no history', None), ('history', history)):
+            result = await play(games, concurrency, store)
+            stats = history.stats
+            inserts = (f"{stats.written / result['elapsed']:10.0f}"
+                       if store else f"{'-':>10}")
+            batches = f"{stats.batches:8}" if store else f"{'-':>8}"
+            average = (f"{stats.written / stats.batches:10.1f}"
+                       if store else f"{'-':>10}")
+            print(f"{name:>10} {result['games/s']:9.0f} {inserts} "
+                  f"{batches} {average} {result['lag p99'] * 1e3:12.2f} "
+                  f"{result['lag max'] * 1e3:12.2f}")
+
+        recent = await history.recent(limit=5)
+        start = time.perf_counter()
+        for user_id in range(1, 1001):
+            await history.user_history(user_id, limit=20)
+        per_query = (time.perf_counter() - start) / 1000
+        assert recent and recent[0].player1 == 2 * games - 1
+        written = history.stats.written
+        rate = await burst(history, burst_size)
+        assert history.stats.written == written + burst_size
+        print(f"user history query: {per_query * 1e6:.0f} us "
+              f"(table of {written} matches)")
+        per_row = history.stats.write_seconds / history.stats.written
+        print(f"burst of {burst_size}: {rate:.0f} inserts/s, "
+              f"max batch {history.stats.max_batch}, "
+              f"write time per row {per_row * 1e6:.1f} us")
+        await history.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--burst', type=int, default=50_000,
+                        help='не больше емкости очереди записи (100000)')
+    args = parser.parse_args()
+    asyncio.run(run(args.games, args.concurrency, args.burst))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Задержка от поступления апдейта до хэндлера: long polling через
+локальный поддельный Bot API против вебхука с очередью и пулом воркеров.
+Отправитель апдейтов работает в том же цикле событий, поэтому для вебхука
+в задержку входит и работа HTTP-клиента. Первые --warmup апдейтов
+(установка соединений) в статистику не попадают.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_ingestion --updates 2000 --rate 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from aiohttp import ClientSession, web
+from aiogram import Dispatcher, Router
+from aiogram.types import Message
+
+from benchmarks.fake_bot_api import FakeBotAPI, make_message
+from services.webhook import SECRET_HEADER, WebhookIngestor
+
+SECRET = 'bench-secret'
+
+
+class LatencyProbe:
+    """Хэндлер, записывающий задержку по метке из текста сообщения"""
+
+    def __init__(self, expected: int) -> None:
+        self.sent: dict[int, float] = {}
+        self.latencies: list[float] = []
+        self.expected = expected
+        self.done = asyncio.Event()
+
+    def dispatcher(self) -> Dispatcher:
+        router = Router()
+
+        @router.message()
+        async def probe(message: Message) -> None:
+            sent_at = self.sent[int(message.text or 0)]
+            self.latencies.append(time.perf_counter() - sent_at)
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        return dp
+
+
+async def paced(count: int, rate: float):
+    start = time.perf_counter()
+    for index in range(count):
+        delay = start + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield index
+
+
+async def run_polling(api: FakeBotAPI, count: int, rate: float) -> list:
+    probe = LatencyProbe(count)
+    dp, bot = probe.dispatcher(), api.make_bot()
+    polling = asyncio.create_task(
+        dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    await asyncio.sleep(0.2)  # Даем поллингу стартовать
+    async for index in paced(count, rate):
+        probe.sent[index] = time.perf_counter()
+        api.push_update(message=make_message(index % 1000 + 1, str(index)))
+    await asyncio.wait_for(probe.done.wait(), 30)
+    await dp.stop_polling()
+    await polling
+    return probe.latencies
+
+
+async def run_webhook(api: FakeBotAPI, count: int, rate: float,
+                      workers: int) -> list:
+    probe = LatencyProbe(count)
+    dp, bot = probe.dispatcher(), api.make_bot()
+    ingestor = WebhookIngestor(dp, bot, secret=SECRET, workers=workers)
+    runner = web.AppRunner(ingestor.build_app('/webhook'))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    ingestor.start_workers()
+
+    url = f'http://127.0.0.1:{port}/webhook'
+    headers = {SECRET_HEADER: SECRET, 'Content-Type': 'application/json'}
+    requests: list[asyncio.Task] = []
+    async with ClientSession() as client:
+        async def post(body: bytes) -> None:
+            async with client.post(url, data=body, headers=headers) as resp:
+                assert resp.status == 200, resp.status
+
+        async for index in paced(count, rate):
+            body = json.dumps({'update_id': index + 1, 'message':
+                               make_message(index % 1000 + 1, str(index))})
+            probe.sent[index] = time.perf_counter()
+            requests.append(asyncio.create_task(post(body.encode())))
+        await asyncio.gather(*requests)
+        await asyncio.wait_for(probe.done.wait(), 30)
+    await runner.cleanup()
+    await ingestor.drain()
+    await bot.session.close()
+    return probe.latencies
+
+
+def report(name: str, latencies: list[float], warmup: int) -> None:
+    latencies = latencies[warmup:]
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f'{name:>8}: p50={cuts[49] * 1e3:7.2f} мс  '
+          f'p99={cuts[98] * 1e3:7.2f} мс  max={max(latencies) * 1e3:7.2f} мс')
+
+
+async def main(count: int, rate: float, workers: int, warmup: int) -> None:
+    api = FakeBotAPI()
+    await api.start()
+    print(f'updates={count} rate={rate}/s webhook workers={workers}')
+    report('polling', await run_polling(api, count, rate), warmup)
+    report('webhook', await run_webhook(api, count, rate, workers), warmup)
+    await api.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=500)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--warmup', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.rate, args.workers, args.warmup))
@@ -0,0 +1,97 @@
+"""
+Таблица лидеров на --users игроков: обновление рейтинга, место игрока,
+топ-10 и соседи игрока через дерево Фенвика (services.rating.Leaderboard)
+против сортировки всех игроков на каждый запрос. Затем - пересчет
+рейтингов и таблицы по истории из --matches игр, как при запуске бота.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_leaderboard --users 100000 --matches 1000000
+"""
+import argparse
+import random
+import time
+from typing import Callable
+
+from database.history import MatchRecord
+from services.rating import Leaderboard, Ratings
+from utils.enums import MatchOutcome
+
+
+def per_call(function: Callable[[int], object], user_ids: list[int]) -> float:
+    start = time.perf_counter()
+    for user_id in user_ids:
+        function(user_id)
+    return (time.perf_counter() - start) / len(user_ids)
+
+
+def sorted_board(ratings: dict[int, float]) -> list[int]:
+    return sorted(ratings, key=lambda user_id: (-round(ratings[user_id]),
+                                                user_id))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--matches', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    ratings = {user_id: rng.gauss(1000, 200)
+               for user_id in range(1, args.users + 1)}
+    leaderboard = Leaderboard()
+    leaderboard.rebuild(ratings)
+    sample = rng.sample(list(ratings), args.queries)
+
+    def update(user_id: int) -> None:
+        ratings[user_id] += rng.uniform(-32, 32)
+        leaderboard.set(user_id, ratings[user_id])
+
+    def sorted_place(user_id: int) -> int:
+        return sorted_board(ratings).index(user_id) + 1
+
+    def sorted_around(user_id: int) -> list[int]:
+        board = sorted_board(ratings)
+        place = board.index(user_id)
+        return board[max(0, place - 2):place + 3]
+
+    # Сортировка на каждый запрос медленная - ей хватит меньшей выборки
+    slow = sample[:max(1, args.queries // 100)]
+    print(f"users={args.users}")
+    print(f"{'':>8} {'leaderboard, us':>16} {'sort per query, us':>19}")
+    rows = [
+        ('update', per_call(update, sample), None),
+        ('place', per_call(leaderboard.place, sample),
+         per_call(sorted_place, slow)),
+        ('top 10', per_call(lambda _: leaderboard.top(10), sample),
+         per_call(lambda _: sorted_board(ratings)[:10], slow)),
+        ('around', per_call(leaderboard.around, sample),
+         per_call(sorted_around, slow)),
+    ]
+    for name, fast, baseline in rows:
+        baseline_text = f"{baseline * 1e6:19.1f}" if baseline else f"{'-':>19}"
+        print(f"{name:>8} {fast * 1e6:16.1f} {baseline_text}")
+    # Равные по рейтингу стоят в таблице в произвольном порядке
+    assert [rating for _, _, rating in leaderboard.top(10)] == [
+        round(ratings[user_id]) for user_id in sorted_board(ratings)[:10]]
+
+    outcomes = (MatchOutcome.WIN, MatchOutcome.NO_MOVES)
+    matches = []
+    for _ in range(args.matches):
+        player1, player2 = rng.sample(range(1, args.users + 1), 2)
+        outcome = rng.choice(outcomes)
+        matches.append(MatchRecord(
+            finished_at=0.0, player1=player1, player2=player2,
+            first_hand1=None, second_hand1=None, first_hand2=None,
+            second_hand2=None,
+            winner=player1 if outcome is MatchOutcome.WIN else None,
+            outcome=outcome))
+    rebuilt = Ratings()
+    start = time.perf_counter()
+    rebuilt.rebuild(matches)
+    print(f"rebuild from {args.matches} matches: "
+          f"{time.perf_counter() - start:.2f} s "
+          f"({len(rebuilt.leaderboard)} players)")
+
+
+if __name__ == '__main__':
+    main()
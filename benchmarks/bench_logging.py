@@ -0,0 +1,81 @@
+"""
+Цена строки лога в потоке цикла событий: прежний print в файл против
+записи через очередь (services.logs) - выключенной уровнем, с
+lazy-полем, отброшенной выборкой и попадающей в лог. Вывод потока
+записи идет в файл во временном каталоге. Строка, попадающая в лог,
+стоит дороже самого вызова: пока поток записи форматирует записи, он
+держит GIL.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_logging --lines 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable
+
+from config_data.config import LoggingConfig
+from services.logs import get_logger, lazy, log_stats, setup_logging
+
+
+def timed(write: Callable[[int], None], lines: int) -> float:
+    '''Время одной строки, нс'''
+    start = time.perf_counter()
+    for index in range(lines):
+        write(index)
+    return (time.perf_counter() - start) / lines * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=10_000,
+                        help='размер словаря в строке print')
+    args = parser.parse_args()
+    users = {user_id: time.monotonic() for user_id in range(args.users)}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bot.log')
+        with open(path, 'w', encoding='utf-8') as file:
+            rows = [('print, one line', timed(
+                lambda index: print(f"Update {index} handled", file=file),
+                args.lines))]
+            rows.append(('print, users dict', timed(
+                lambda index: print(f"Online users: {users}", file=file),
+                max(args.lines // 1000, 10))))
+        listener = setup_logging(LoggingConfig(
+            level='INFO', levels={}, sampling={'bench.sampled': 0.01},
+            format='text', queue_size=args.lines))
+        # Поток записи пишет в файл, а не в терминал
+        output = listener.handlers[0]
+        output.setStream(open(path, 'a', encoding='utf-8'))  # type: ignore
+        logger = get_logger('bench')
+        sampled = get_logger('bench.sampled')
+        rows += [
+            ('debug, disabled', timed(
+                lambda index: logger.debug('Online users', users=users),
+                args.lines)),
+            ('debug, lazy field', timed(
+                lambda index: logger.debug('Online users',
+                                           users=lazy(repr, users)),
+                args.lines)),
+            ('info, sampled out', timed(
+                lambda index: sampled.info('Update handled', update=index),
+                args.lines)),
+            ('info, queued', timed(
+                lambda index: logger.info('Update handled', update=index),
+                args.lines)),
+        ]
+        start = time.perf_counter()
+        listener.stop()
+        drained = time.perf_counter() - start
+        output.stream.close()  # type: ignore[attr-defined]
+    for label, ns in rows:
+        print(f"{label:<20} {ns:10.0f} ns per line")
+    print(f"writer thread drained the queue in {drained * 1e3:.0f} ms; "
+          f"dropped {log_stats.dropped}, sampled out "
+          f"{log_stats.sampled_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Цена метрик: HandlerMetricsMiddleware на один апдейт в сравнении с
+обработкой апдейта Dispatcher.feed_update, BotApiMetricsMiddleware на
+вызов Bot API, запись в гистограмму и счетчик, а также время ответа на
+опрос /metrics при --sessions живых игровых сессиях и --users
+пользователях онлайн.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_metrics --updates 100000 --sessions 100000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendMessage
+from aiogram.types import CallbackQuery, Update
+
+from benchmarks.fakes import FakeBot
+from database.db import online_users
+from handlers.user_handlers.game_managers import GameSession
+from middlewares.instrumentation import (API_SECONDS, HANDLER_ERRORS,
+                                         BotApiMetricsMiddleware,
+                                         HandlerMetricsMiddleware)
+from services.metrics import metrics
+
+UPDATE = {'update_id': 1, 'callback_query': {
+    'id': '1', 'chat_instance': '1', 'data': 'rock',
+    'from': {'id': 1001, 'is_bot': False, 'first_name': 'Player'},
+    'message': {'message_id': 1, 'date': 0,
+                'chat': {'id': 1001, 'type': 'private'}, 'text': ''}}}
+
+
+async def timed(operation: Callable[[], Awaitable[Any]],
+                loops: int) -> float:
+    '''Время одного вызова, нс'''
+    start = time.perf_counter()
+    for _ in range(loops):
+        await operation()
+    return (time.perf_counter() - start) / loops * 1e9
+
+
+def build_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.callback_query(F.data == 'rock')
+    async def process_move(callback: CallbackQuery) -> None:
+        return None
+
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    return dp
+
+
+async def bench_handlers(updates: int) -> None:
+    bot = Bot('42:TEST')
+    update = Update.model_validate(UPDATE)
+    dp = build_dispatcher()
+    feed = await timed(lambda: dp.feed_update(bot, update), updates // 10)
+    # Само middleware - на том же HandlerObject, что нашел диспетчер
+    data = {'handler': dp.sub_routers[0].callback_query.handlers[0]}
+    middleware = HandlerMetricsMiddleware()
+
+    async def handler(event: Any, data: dict) -> None:
+        return None
+
+    plain = await timed(lambda: handler(update, data), updates)
+    instrumented = await timed(
+        lambda: middleware(handler, update, data), updates)
+    overhead = instrumented - plain
+    print(f"feed_update: {feed:.0f} ns per update; handler metrics "
+          f"+{overhead:.0f} ns ({overhead / feed:.2%})")
+    await bot.session.close()
+
+
+async def bench_api(calls: int) -> None:
+    middleware = BotApiMetricsMiddleware()
+    bot = FakeBot()
+    method = SendMessage(chat_id=1, text='Давай!')
+
+    async def make_request(bot: Any, method: Any) -> bool:
+        return True
+
+    plain = await timed(lambda: make_request(bot, method), calls)
+    instrumented = await timed(
+        lambda: middleware(make_request, bot, method), calls)  # type: ignore
+    print(f"Bot API call: +{instrumented - plain:.0f} ns per call "
+          f"for the latency histogram")
+
+
+def bench_primitives(loops: int) -> None:
+    histogram = API_SECONDS.labels('benchmark')
+    counter = HANDLER_ERRORS.labels('benchmark', 'benchmark')
+    for name, operation in (('histogram observe', histogram.observe),
+                            ('counter inc', counter.inc)):
+        start = time.perf_counter()
+        for _ in range(loops):
+            operation(0.003)
+        elapsed = (time.perf_counter() - start) / loops * 1e9
+        print(f"{name:<18} {elapsed:6.0f} ns")
+
+
+def bench_render(sessions: int, users: int) -> None:
+    bot, storage = FakeBot(), MemoryStorage()
+    live = [GameSession((2 * index + 1, 2 * index + 2),
+                        bot, storage)  # type: ignore[arg-type]
+            for index in range(sessions)]
+    now = time.monotonic()
+    online_users.load((user_id, now) for user_id in range(users))
+    start = time.perf_counter()
+    body = metrics.render()
+    elapsed = time.perf_counter() - start
+    print(f"/metrics render: {elapsed * 1e3:.2f} ms for {sessions} sessions,"
+          f" {len(body.splitlines())} lines, {len(body)} bytes")
+    for session in live:
+        session.evict()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=100_000)
+    parser.add_argument('--sessions', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(bench_handlers(args.updates))
+    asyncio.run(bench_api(args.updates))
+    bench_primitives(args.updates * 10)
+    bench_render(args.sessions, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Накладные расходы OnlineUserMiddleware на один апдейт: прежняя
+перевалидация Update против чтения id из уже разобранного события.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_middleware --updates 100000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Optional
+
+from aiogram.types import Update
+
+from database.db import online_users
+from middlewares.actual_state import OnlineUserMiddleware
+
+USER = {'id': 1001, 'is_bot': False, 'first_name': 'Player'}
+CHAT = {'id': 1001, 'type': 'private'}
+MESSAGE = {'message_id': 1, 'date': 0, 'chat': CHAT, 'from': USER,
+           'text': 'Давай!'}
+UPDATES = {
+    'message': {'update_id': 1, 'message': MESSAGE},
+    'callback_query': {'update_id': 2, 'callback_query': {
+        'id': '1', 'from': USER, 'chat_instance': '1',
+        'message': MESSAGE, 'data': 'rock'}},
+    'poll_answer': {'update_id': 3, 'poll_answer': {
+        'poll_id': '1', 'user': USER, 'option_ids': [0],
+        'option_persistent_ids': ['0']}},
+}
+
+
+class LegacyOnlineUserMiddleware:
+    """Прежняя реализация (без print, он не влияет на найденный id)"""
+
+    async def __call__(self, handler, event, data) -> Any:
+        def extract_user_id(update: Update) -> Optional[int]:
+            if update.message:
+                if update.message.from_user:
+                    return update.message.from_user.id
+            elif update.callback_query:
+                return update.callback_query.from_user.id
+            elif update.poll_answer:
+                if update.poll_answer.user:
+                    return update.poll_answer.user.id
+            return None
+
+        update_event = Update.model_validate(event, from_attributes=True)
+        user_id = extract_user_id(update_event)
+        if user_id is not None:
+            online_users.set_online(user_id)
+        return await handler(event, data)
+
+
+async def handler(event: Any, data: dict) -> None:
+    return None
+
+
+async def measure(middleware: Any, update: Update, count: int) -> float:
+    data: dict = {}
+    start = time.perf_counter()
+    for step in range(count):
+        await middleware(handler, update, data)
+        if step % 16 == 0:  # Как под нагрузкой: несколько апдейтов
+            await asyncio.sleep(0)  # на одну итерацию цикла событий
+    await asyncio.sleep(0)  # Даем выполниться отложенным отметкам
+    return (time.perf_counter() - start) / count * 1e6
+
+
+async def main(count: int) -> None:
+    middlewares = {
+        'legacy': LegacyOnlineUserMiddleware(),
+        'table': OnlineUserMiddleware(),
+        'deferred': OnlineUserMiddleware(deferred=True),
+    }
+    print(f'updates={count}, мкс на апдейт')
+    print(f'{"":>16}' + ''.join(f'{name:>10}' for name in middlewares))
+    for kind, raw in UPDATES.items():
+        update = Update.model_validate(raw)
+        row = [await measure(mw, update, count)
+               for mw in middlewares.values()]
+        print(f'{kind:>16}' + ''.join(f'{us:>10.2f}' for us in row))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=100_000)
+    asyncio.run(main(parser.parse_args().updates))
@@ -0,0 +1,101 @@
+"""
+Прогон 1M пользователей через OnlineUsers.set_online и cleanup:
+прежний полный обход словаря против очереди по времени активности.
+
+Модель: все пользователи заходят в онлайн, затем каждые 10 секунд
+модельного времени случайная доля activity из них снова пишет боту,
+после чего выполняется cleanup. Живых пользователей много, истекших мало.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_online_users --users 1000000
+"""
+import argparse
+import random
+import time
+from unittest import mock
+
+from database import db
+from database.db import OnlineUsers
+
+
+class LegacyOnlineUsers:
+    """Прежняя реализация (без print, иначе 1M не дождаться)"""
+
+    def __init__(self, online_duration: int) -> None:
+        self.online_duration = online_duration
+        self.users: dict[int, float] = {}
+
+    def set_online(self, user_id: int) -> None:
+        self.users[user_id] = time.monotonic()
+
+    def cleanup(self) -> None:
+        now = time.monotonic()
+        to_remove = [
+            user_id for user_id, last_seen in self.users.items()
+            if now - last_seen >= self.online_duration
+        ]
+        for user_id in to_remove:
+            del self.users[user_id]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def run(users: int, sweeps: int, activity: float, legacy: bool,
+        seed: int) -> dict:
+    clock, rnd = FakeClock(), random.Random(seed)
+    online = (LegacyOnlineUsers if legacy else OnlineUsers)(60)
+    ids = list(range(users))
+    set_online_time = cleanup_time = 0.0
+    calls = removed = 0
+    with mock.patch.object(time, 'monotonic', clock.monotonic), \
+            mock.patch.object(db.time, 'monotonic', clock.monotonic):
+        for sweep in range(sweeps + 1):
+            active = ids if sweep == 0 else rnd.sample(
+                ids, int(users * activity))
+            start = time.perf_counter()
+            for user_id in active:
+                online.set_online(user_id)
+            set_online_time += time.perf_counter() - start
+            calls += len(active)
+
+            clock.now += 10
+            before = len(online.users)
+            start = time.perf_counter()
+            online.cleanup()
+            cleanup_time += time.perf_counter() - start
+            removed += before - len(online.users)
+    return {
+        'set_online_ns': set_online_time / calls * 1e9,
+        'cleanup_ms': cleanup_time / (sweeps + 1) * 1e3,
+        'removed': removed,
+        'online': len(online.users),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--sweeps', type=int, default=8)
+    parser.add_argument('--activity', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'users={args.users} sweeps={args.sweeps} '
+          f'activity={args.activity}')
+    print(f'{"":>8} {"set_online, ns":>15} {"cleanup, ms":>12} '
+          f'{"removed":>8} {"online at end":>14}')
+    for name, legacy in (('legacy', True), ('ordered', False)):
+        res = run(args.users, args.sweeps, args.activity, legacy, args.seed)
+        print(f'{name:>8} {res["set_online_ns"]:>15.0f} '
+              f'{res["cleanup_ms"]:>12.2f} {res["removed"]:>8} '
+              f'{res["online"]:>14}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Общая таблица присутствия (database.presence) против OnlineUsers одного
+процесса: отметка активности, выборка случайного онлайна и очистка
+таблицы владельцем. Затем --workers процессов одновременно отмечают
+случайных пользователей из общего набора --users: пропускная способность
+всех процессов и сколько отметок потеряно или задвоено гонками вставки
+без блокировок (задвоенные id сливает следующая очистка).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_presence --users 100000 --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter
+
+from database.db import OnlineUsers, sweep_presence
+from database.presence import PresenceTable
+
+
+def capacity_for(users: int) -> int:
+    return 1 << (2 * users - 1).bit_length()
+
+
+def timed(label: str, operation, loops: int) -> None:
+    start = time.perf_counter()
+    for _ in range(loops):
+        operation()
+    elapsed = (time.perf_counter() - start) / loops * 1e9
+    print(f"  {label:<32} {elapsed:8.0f} ns")
+
+
+def single_process(name: str, users: int, loops: int) -> None:
+    table = PresenceTable.open(name, capacity_for(users), owner=True)
+    local = OnlineUsers(online_duration=60)
+    shared = OnlineUsers(online_duration=60)
+    shared.table = table
+    for user_id in range(1, users + 1):
+        local.set_online(user_id)
+        shared.set_online(user_id)
+    rng = random.Random(1)
+    ids = [rng.randrange(1, users + 1) for _ in range(loops)]
+    print(f"{users} users online, table of {table.capacity} slots")
+    for label, target in (('local', local), ('local + shared', shared)):
+        touches = iter(ids)
+        timed(f'set_online, {label}', lambda: target.set_online(
+            next(touches)), loops)
+    start = time.perf_counter()
+    asyncio.run(sweep_presence(table, online_duration=60))
+    print(f"  sweep of the whole table          "
+          f"{(time.perf_counter() - start) * 1e3:8.1f} ms")
+    # Выборка из общей таблицы идет по индексу, который пишет очистка
+    timed('sample_many(10), local', lambda: local.sample_many(10, 0),
+          loops // 10)
+    timed('sample_many(10), shared', lambda: shared.sample_many(10, 0),
+          loops // 10)
+    print(f"  {table.stats}")
+    table.close()
+    table.unlink()
+
+
+def touch_users(name: str, users: int, duration: float, seed: int,
+                results: multiprocessing.Queue) -> None:
+    table = PresenceTable.open(name)
+    rng = random.Random(seed)
+    touched = set()
+    count = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for _ in range(1000):
+            user_id = rng.randrange(1, users + 1)
+            table.touch(user_id)
+            touched.add(user_id)
+        count += 1000
+    table.close()
+    results.put((count, touched))
+
+
+def many_processes(name: str, users: int, workers: int,
+                   duration: float) -> None:
+    table = PresenceTable.open(name, capacity_for(users), owner=True)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=touch_users, args=(
+        name, users, duration, seed, results)) for seed in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    touches = sum(count for count, _ in reports)
+    touched = set().union(*(ids for _, ids in reports))
+    keys = Counter(key for key in table._keys.tolist() if key > 0)
+    lost = sum(1 for user_id in touched if user_id not in keys)
+    doubled = sum(1 for count in keys.values() if count > 1)
+    print(f"{workers} processes on {os.cpu_count()} CPUs, {duration:g} s: "
+          f"{touches / duration:,.0f} touches/s in total; "
+          f"{len(touched)} users touched, lost {lost}, doubled {doubled}")
+    table.close()
+    table.unlink()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--loops', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=3)
+    args = parser.parse_args()
+    name = f'bench-presence-{os.getpid()}'
+    single_process(name, args.users, args.loops)
+    many_processes(name, args.users, args.workers, args.duration)
+
+
+if __name__ == '__main__':
+    main()
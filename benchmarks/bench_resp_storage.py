@@ -0,0 +1,70 @@
+"""
+FSM-хранилище поверх протокола Redis на заменителе сервера в том же
+процессе: поштучные чтения/записи состояния обоих игроков против
+конвейерных get_many/set_many.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_resp_storage --games 2000
+    python -m benchmarks.bench_resp_storage --url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database.resp import RespServer
+from database.storage import RespStorage
+from states.states import FSMPlay
+
+
+def keys_for(game: int) -> list[StorageKey]:
+    return [StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+            for user_id in (2 * game + 1, 2 * game + 2)]
+
+
+async def sequential(storage: RespStorage, games: int) -> None:
+    for game in range(games):
+        for key in keys_for(game):
+            await storage.set_state(key, FSMPlay.choice_hand)
+            await storage.set_data(key, {'opponent_id': key.user_id})
+        for key in keys_for(game):
+            await storage.get_state(key)
+            await storage.get_data(key)
+
+
+async def pipelined(storage: RespStorage, games: int) -> None:
+    for game in range(games):
+        keys = keys_for(game)
+        await storage.set_many([
+            (key, FSMPlay.choice_hand.state, {'opponent_id': key.user_id})
+            for key in keys])
+        await storage.get_many(keys)
+
+
+async def main(games: int, url: str | None) -> None:
+    server = None
+    if url is None:
+        server = RespServer()
+        await server.start()
+        url = server.url
+    storage = RespStorage.from_url(url)
+    print(f'games={games} server={url}')
+    for name, scenario in (('sequential', sequential),
+                           ('pipelined', pipelined)):
+        start = time.perf_counter()
+        await scenario(storage, games)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>10}: {elapsed / games * 1e6:8.1f} мкс на игру '
+              f'(запись и чтение обоих игроков)')
+    await storage.close()
+    if server is not None:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--url', default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.games, args.url))
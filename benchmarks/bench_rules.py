@@ -0,0 +1,90 @@
+"""
+Разрешение раундов: --rounds случайных пар ходов по одной через
+Rules.resolve (и прежний get_winner, собиравший словарь правил на каждый
+вызов) против пакетного Rules.resolve_batch - векторно с NumPy и
+запасным путем на чистом Python. Для классических правил и для
+"камень, ножницы, бумага, ящерица, Спок".
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_rules --rounds 1000000
+"""
+import argparse
+import random
+import time
+from typing import Callable, TypeVar
+
+from services.rules import RPSLS, Rules, rules
+
+
+def legacy_winner(user_choice: str, bot_choice: str) -> str:
+    """Прежний services.get_winner без print"""
+    beats = {"rock": "scissors",
+             "scissors": "paper",
+             "paper": "rock"}
+    if user_choice == bot_choice:
+        return "nobody_won"
+    elif beats[user_choice] == bot_choice:
+        return "user_won"
+    return "bot_won"
+
+
+Result = TypeVar('Result')
+
+
+def timed(function: Callable[[], Result]) -> tuple[float, Result]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def pure_python(game: Rules) -> Rules:
+    """Те же правила без NumPy - для замера запасного пути"""
+    fallback = Rules(game.moves, {})
+    fallback.matrix = game.matrix
+    fallback._outcomes = game._outcomes
+    fallback._np_matrix = None
+    return fallback
+
+
+def run(name: str, game: Rules, rounds: int, rng: random.Random) -> None:
+    first = rng.choices(game.moves, k=rounds)
+    second = rng.choices(game.moves, k=rounds)
+    resolve = game.resolve
+    scalar, expected = timed(lambda: [resolve(a, b)
+                                      for a, b in zip(first, second)])
+    encode, (first_ids, second_ids) = timed(
+        lambda: (game.encode(first), game.encode(second)))
+    rows = [('scalar resolve', scalar)]
+    if game is rules:
+        rows.append(('legacy get_winner', timed(lambda: [
+            legacy_winner(a, b) for a, b in zip(first, second)])[0]))
+    rows.append(('encode moves', encode))
+    if game._np_matrix is not None:
+        batch, result = timed(lambda: game.resolve_batch(first_ids,
+                                                         second_ids))
+        assert list(result) == expected
+        rows.append(('batch, NumPy', batch))
+    fallback, result = timed(lambda: pure_python(game).resolve_batch(
+        first_ids, second_ids))
+    assert list(result) == expected
+    rows.append(('batch, pure Python', fallback))
+    print(f"{name}: {rounds} rounds, {len(game.moves)} moves")
+    for label, seconds in rows:
+        print(f"  {label:<20} {seconds * 1e3:9.1f} ms "
+              f"{seconds / rounds * 1e9:8.1f} ns/round "
+              f"{scalar / seconds:7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=1_000_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    if rules._np_matrix is None:
+        print("NumPy is not installed: only the pure Python batch path")
+    run('rock-paper-scissors', rules, args.rounds, rng)
+    run('rock-paper-scissors-lizard-spock', RPSLS, args.rounds, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Снапшоты состояния бота: время полного снимка, дописывания журнала и
+восстановления после "сбоя" для --users игроков в FSM и онлайн и
+--sessions идущих игровых сессий с таймерами.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_snapshot --users 100000 --sessions 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeBot, make_context
+from database.db import OnlineUsers
+from database.storage import JournaledMemoryStorage
+from handlers.user_handlers.game_managers import GameSession
+from services.snapshot import SnapshotManager
+from services.timers import timer_wheel
+from states.states import FSMPlay
+from utils.enums import GamePhase
+
+
+async def populate(bot: FakeBot, storage: JournaledMemoryStorage,
+                   online_users: OnlineUsers, users: int,
+                   sessions: int) -> None:
+    for user_id in range(1, users + 1):
+        context = make_context(storage, bot, user_id)
+        opponent_id = user_id + 1 if user_id % 2 else user_id - 1
+        await context.set_state(FSMPlay.choice_action_for_second_hand)
+        await context.set_data({'opponent_id': opponent_id})
+        online_users.set_online(user_id)
+    for i in range(sessions):
+        session = GameSession((2 * i + 1, 2 * i + 2),
+                              bot, storage)  # type: ignore[arg-type]
+        session.phase = GamePhase.MOVES
+        for user_id in session.session_id:
+            session.moves[user_id]['first_hand'] = 'rock'
+        session._arm('hands', 60)
+
+
+def reset_sessions() -> None:
+    for session in list(GameSession.sessions.values()):
+        session.delete()
+
+
+async def run(users: int, sessions: int, changed: float) -> dict:
+    bot = FakeBot()
+    results: dict = {}
+    with tempfile.TemporaryDirectory() as path:
+        storage, online_users = JournaledMemoryStorage(), OnlineUsers(60)
+        manager = SnapshotManager(path, bot,  # type: ignore[arg-type]
+                                  storage, online_users)
+        await populate(bot, storage, online_users, users, sessions)
+
+        start = time.perf_counter()
+        await manager.compact()
+        results['compact'] = time.perf_counter() - start
+        results['snapshot_bytes'] = os.path.getsize(
+            os.path.join(path, manager.SNAPSHOT_FILE))
+
+        # Меняется доля игроков - в журнал уходят только они
+        for user_id in range(1, int(users * changed) + 1):
+            await make_context(storage, bot, user_id).set_state(
+                FSMPlay.both_hands_ready)
+        start = time.perf_counter()
+        await manager.flush()
+        results['flush'] = time.perf_counter() - start
+        results['flush_bytes'] = manager.stats.journal_bytes
+
+        # "Сбой": все в памяти теряется, остаются только файлы
+        reset_sessions()
+        storage, online_users = JournaledMemoryStorage(), OnlineUsers(60)
+        manager = SnapshotManager(path, bot,  # type: ignore[arg-type]
+                                  storage, online_users)
+        assert manager.restore()
+        results['restore'] = manager.stats.restore_seconds
+        assert manager.stats.restored_fsm == users
+        assert len(online_users.users) == users
+        assert len(GameSession.sessions) == sessions
+        assert all('hands' in session.timers
+                   for session in GameSession.sessions.values())
+        changed_state = await make_context(storage, bot, 1).get_state()
+        assert changed_state == FSMPlay.both_hands_ready.state
+        reset_sessions()
+        assert not timer_wheel.pending
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--sessions', type=int, default=10_000)
+    parser.add_argument('--changed', type=float, default=0.01,
+                        help='доля игроков, изменившихся до записи журнала')
+    args = parser.parse_args()
+    results = asyncio.run(run(args.users, args.sessions, args.changed))
+    print(f"users={args.users} sessions={args.sessions}")
+    print(f"  full snapshot   {results['compact'] * 1e3:8.1f} ms"
+          f"   {results['snapshot_bytes'] / 2 ** 20:6.1f} MiB")
+    print(f"  journal flush   {results['flush'] * 1e3:8.1f} ms"
+          f"   {results['flush_bytes'] / 2 ** 10:6.1f} KiB"
+          f" ({args.changed:.0%} of users changed)")
+    print(f"  restore         {results['restore'] * 1e3:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Обращения к FSM-хранилищу за игру: партии проходят через обработчики
+game_handlers и почтовые ящики игровых сессий, а хранилище считает
+каждый вызов. Для RespStorage (--resp, локальный сервер
+database.resp.RespServer) показываются также сетевые запросы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_storage_ops --games 200
+    python -m benchmarks.bench_storage_ops --games 200 --resp
+"""
+import argparse
+import asyncio
+from collections import Counter
+
+from aiogram.fsm.storage.base import BaseStorage
+
+from benchmarks.fakes import (CountingStorage, FakeBot, make_callback,
+                              make_context, unlimit_outbound)
+from database.resp import RespServer
+from database.storage import RespStorage
+from handlers.user_handlers import game_handlers
+from handlers.user_handlers.game_managers import GameSession
+from states.states import FSMPlay
+from utils.enums import GamePhase
+
+
+class CountingRespStorage(RespStorage):
+    """RespStorage, считающая отправленные на сервер запросы."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.ops: Counter[str] = Counter()
+        execute, pipeline = self.client.execute, self.client.pipeline
+
+        async def counted_execute(*command):
+            self.ops[f'execute {command[0]}'] += 1
+            return await execute(*command)
+
+        async def counted_pipeline(commands):
+            self.ops['pipeline'] += 1
+            return await pipeline(commands)
+
+        self.client.execute = counted_execute  # type: ignore[method-assign]
+        self.client.pipeline = counted_pipeline  # type: ignore
+
+
+async def play_game(bot: FakeBot, storage: BaseStorage, user_id: int,
+                    opponent_id: int) -> None:
+    user = make_context(storage, bot, user_id)
+    opponent = make_context(storage, bot, opponent_id)
+    for context, other_id in ((user, opponent_id), (opponent, user_id)):
+        await context.set_state(FSMPlay.waiting_game_start)
+        await context.update_data(opponent_id=other_id)
+    # Первый игрок соглашается и ждет второго
+    await game_handlers.process_start_game(
+        make_callback(bot, user_id, 'start_game'), user)
+    session = GameSession.sessions[
+        GameSession.generate_session_id(user_id, opponent_id)]
+    await session.join()
+    await game_handlers.process_start_game(
+        make_callback(bot, opponent_id, 'start_game'), opponent)
+    await session.join()
+    for context, player_id in ((user, user_id), (opponent, opponent_id)):
+        await game_handlers.process_first_hand(
+            make_callback(bot, player_id, 'rock'), context)
+        await game_handlers.process_second_hand(
+            make_callback(bot, player_id, 'paper'), context)
+    await session.join()
+    assert await user.get_state() == FSMPlay.choice_hand.state
+    for context, player_id in ((user, user_id), (opponent, opponent_id)):
+        await game_handlers.process_hand_choice(
+            make_callback(bot, player_id, 'first_hand'), context)
+    await session.join()
+    assert session.phase is GamePhase.FINISHED
+
+
+async def run(games: int, resp: bool) -> Counter[str]:
+    unlimit_outbound()
+    bot = FakeBot()
+    server = None
+    storage: BaseStorage
+    if resp:
+        server = RespServer()
+        await server.start()
+        storage = CountingRespStorage.from_url(server.url)
+    else:
+        storage = CountingStorage()
+    try:
+        await asyncio.gather(*(play_game(bot, storage, 2 * i + 1, 2 * i + 2)
+                               for i in range(games)))
+    finally:
+        if server is not None:
+            await storage.close()
+            await server.stop()
+    return storage.ops  # type: ignore[union-attr]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--resp', action='store_true',
+                        help='RespStorage на локальном RESP-сервере')
+    args = parser.parse_args()
+    ops = asyncio.run(run(args.games, args.resp))
+    # Подготовка партии и итоговая проверка в счет не идут
+    ops.subtract({'set_state': 2 * args.games, 'get_data': 2 * args.games,
+                  'set_data': 2 * args.games, 'get_state': args.games,
+                  'execute SET': 4 * args.games,
+                  'execute GET': 3 * args.games})
+    ops = +ops
+    print(f"storage calls per game: {sum(ops.values()) / args.games:.1f}")
+    for name, count in sorted(ops.items()):
+        print(f"  {name:<24} {count / args.games:6.1f}")
+    print("GameSession operations per event:")
+    for event, counter in GameSession.storage_ops.items():
+        events = counter['events']
+        total = sum(counter.values()) - counter['events']
+        print(f"  {event:<24} {total / events:6.1f}"
+              f"   {dict(counter - Counter(events=counter['events']))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Память и процессор на 100k ожидающих таймаутов: колесо таймеров
+services.timers против loop.call_later (куча таймеров цикла) и прежней
+схемы "задача + asyncio.wait_for" на каждое ожидание.
+
+Для каждой схемы заводится --count таймаутов, половина отменяется,
+остальные дожидаются срабатывания.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_timers --count 100000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from services.timers import TimerWheel
+
+
+class Scheme:
+    """Способ завести таймаут на future и отменить его"""
+
+    name: str
+
+    def __init__(self) -> None:
+        self.fired = 0
+
+    def start(self, future: asyncio.Future, delay: float) -> Any:
+        raise NotImplementedError
+
+    def cancel(self, handle: Any) -> None:
+        raise NotImplementedError
+
+
+class WheelScheme(Scheme):
+    name = 'timer wheel'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.wheel = TimerWheel()
+
+    def _expire(self, future: asyncio.Future) -> None:
+        self.fired += 1
+        future.set_exception(asyncio.TimeoutError())
+
+    def start(self, future: asyncio.Future, delay: float) -> Any:
+        return self.wheel.schedule(delay, self._expire, future)
+
+    def cancel(self, handle: Any) -> None:
+        self.wheel.cancel(handle)
+
+
+class CallLaterScheme(Scheme):
+    name = 'loop.call_later'
+
+    def _expire(self, future: asyncio.Future) -> None:
+        self.fired += 1
+        future.set_exception(asyncio.TimeoutError())
+
+    def start(self, future: asyncio.Future, delay: float) -> Any:
+        return asyncio.get_running_loop().call_later(
+            delay, self._expire, future)
+
+    def cancel(self, handle: Any) -> None:
+        handle.cancel()
+
+
+class TaskScheme(Scheme):
+    name = 'task + wait_for'
+
+    async def _wait(self, future: asyncio.Future, delay: float) -> None:
+        try:
+            await asyncio.wait_for(future, delay)
+        except asyncio.TimeoutError:
+            self.fired += 1
+
+    def start(self, future: asyncio.Future, delay: float) -> Any:
+        return asyncio.create_task(self._wait(future, delay))
+
+    def cancel(self, handle: Any) -> None:
+        handle.cancel()
+
+
+async def measure(scheme: Scheme, count: int, delay: float) -> dict:
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future() for _ in range(count)]
+    await asyncio.sleep(0)
+
+    # Память - отдельным проходом: tracemalloc замедляет все вокруг
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    handles = [scheme.start(future, delay) for future in futures]
+    await asyncio.sleep(0)  # Задачи схемы с задачами успевают стартовать
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for handle in handles:
+        scheme.cancel(handle)
+    await asyncio.sleep(0)
+    futures = [loop.create_future() for _ in range(count)]
+
+    cpu = time.process_time()
+    handles = [scheme.start(future, delay) for future in futures]
+    await asyncio.sleep(0)
+    start_cpu = time.process_time() - cpu
+
+    cpu = time.process_time()
+    for handle in handles[::2]:
+        scheme.cancel(handle)
+    await asyncio.sleep(0)
+    cancel_cpu = time.process_time() - cpu
+
+    # Ждем срабатывания оставшейся половины
+    cpu = time.process_time()
+    while scheme.fired < count - len(handles[::2]):
+        await asyncio.sleep(0.05)
+    wait_cpu = time.process_time() - cpu
+    for future in futures:  # Чтобы не было "exception was never retrieved"
+        if future.done() and not future.cancelled():
+            future.exception()
+    return {'memory': memory, 'start': start_cpu, 'cancel': cancel_cpu,
+            'wait': wait_cpu}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--delay', type=float, default=2.0,
+                        help='таймаут, с')
+    args = parser.parse_args()
+    print(f"count={args.count} delay={args.delay}s")
+    print(f"{'':>16} {'bytes/timeout':>14} {'start, us':>10} "
+          f"{'cancel, us':>11} {'CPU while pending+firing, s':>28}")
+    schemes: list[Callable[[], Scheme]] = [
+        WheelScheme, CallLaterScheme, TaskScheme]
+    for make_scheme in schemes:
+        scheme = make_scheme()
+        result = asyncio.run(measure(scheme, args.count, args.delay))
+        half = args.count // 2
+        print(f"{scheme.name:>16} {result['memory'] / args.count:14.0f} "
+              f"{result['start'] / args.count * 1e6:10.2f} "
+              f"{result['cancel'] / half * 1e6:11.2f} "
+              f"{result['wait']:28.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Турнир в режиме симуляции: --entrants игроков записываются кнопкой
+"Турнир", затем играют раунды по швейцарской системе. Бот ходит в
+локальный поддельный Bot API, а тот, получив сообщение с кнопками,
+через --think секунд "нажимает" кнопку за игрока - апдейт проходит через
+Dispatcher с роутерами бота. Доля игроков отказывается (--refuse) или не
+отвечает (--absent). По каждому раунду показываются время составления
+пар, длительность раунда, число вызовов Bot API и наибольшее число
+одновременных запросов к нему (не больше лимита соединений сессии).
+
+Таймауты игр сокращены до секунд, поэтому раунды идут быстро.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_tournament --entrants 10000 --rounds 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from benchmarks.fake_bot_api import FakeBotAPI, make_message, make_user
+from benchmarks.fakes import unlimit_outbound
+from handlers import other_handlers, user_routers
+from handlers.user_handlers.game_managers import GameSession
+from services.outbound import TokenBucket, outbound
+from services.tournament import Tournament, tournaments
+from states.states import FSMMenu
+
+
+# Поддельный Bot API, за которым стоят симулируемые игроки
+class PlayersAPI(FakeBotAPI):
+    def __init__(self, think: float, refuse: float, absent: float,
+                 seed: int = 1) -> None:
+        super().__init__()
+        self.think = think
+        self.refuse = refuse
+        self.absent = absent
+        self.rng = random.Random(seed)
+        self.dispatcher: Dispatcher | None = None
+        self.bot: Bot | None = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.clicks = 0
+        self._ids = iter(range(1, 1 << 62))
+        self.stopped = False
+        self._tasks: set[asyncio.Task] = set()
+
+    async def count_in_flight(self, make_request: Any, bot: Bot,
+                              method: Any) -> Any:
+        '''Middleware сессии бота: сколько запросов к API идет сразу'''
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.in_flight -= 1
+
+    def choose(self, buttons: list[str]) -> str | None:
+        '''Какую кнопку нажмет игрок (None - никакую)'''
+        if 'start_game' in buttons:
+            roll = self.rng.random()
+            if roll < self.absent:
+                return None
+            return 'refuse' if roll < self.absent + self.refuse else (
+                'start_game')
+        # Ход руки или рука, которую игрок оставляет
+        return self.rng.choice(buttons)
+
+    async def api_sendmessage(self, params: dict[str, Any]) -> Any:
+        message = await super().api_sendmessage(params)
+        if (markup := params.get('reply_markup')) is not None:
+            rows = json.loads(markup).get('inline_keyboard', [])
+            buttons = [button['callback_data'] for row in rows
+                       for button in row]
+            if buttons and (data := self.choose(buttons)) is not None:
+                task = asyncio.create_task(self.click(
+                    message['chat']['id'], message['message_id'], data))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return message
+
+    async def click(self, user_id: int, message_id: int, data: str) -> None:
+        await asyncio.sleep(self.rng.uniform(0, self.think))
+        if not self.stopped:
+            self.clicks += 1
+            await self.feed(user_id, message_id, data)
+
+    async def feed(self, user_id: int, message_id: int, data: str) -> None:
+        assert self.dispatcher is not None and self.bot is not None
+        update = Update.model_validate({
+            'update_id': next(self._ids),
+            'callback_query': {
+                'id': str(next(self._ids)), 'from': make_user(user_id),
+                'chat_instance': str(user_id), 'data': data,
+                'message': make_message(user_id, '', message_id)}},
+            context={'bot': self.bot})
+        await self.dispatcher.feed_update(self.bot, update)
+
+    async def settle(self) -> None:
+        '''Игроки больше не нажимают кнопок, начатые нажатия доходят'''
+        self.stopped = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Лимиты на чат сняты (таймауты игр сжаты до секунд), общий - задан
+    unlimit_outbound()
+    outbound.global_bucket = TokenBucket(args.api_rate, args.api_rate / 10)
+    GameSession.consent_timeout = args.timeout
+    GameSession.hands_timeout = args.timeout
+    GameSession.choice_timeout = args.timeout
+    api = PlayersAPI(args.think, args.refuse, args.absent)
+    await api.start()
+    bot = api.make_bot()
+    bot.session.middleware(api.count_in_flight)
+    storage = MemoryStorage()
+    dispatcher = Dispatcher(storage=storage)
+    dispatcher.include_router(user_routers.router)
+    dispatcher.include_router(other_handlers.router)
+    api.dispatcher, api.bot = dispatcher, bot
+    # Общий менеджер, как в main.py: его же использует кнопка "Турнир"
+    manager = tournaments
+    manager.registration, manager.min_players = 0, 2
+    manager.max_rounds, manager.start_timeout = args.rounds, args.timeout
+    manager.round_grace = 1
+    manager.publish_concurrency = args.publish_concurrency
+
+    # Запись: каждый игрок нажимает "Турнир" в меню выбора режима
+    start = time.perf_counter()
+    for user_id in range(1, args.entrants + 1):
+        await storage.set_state(
+            StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id),
+            FSMMenu.choice_game_mode)
+    await asyncio.gather(*(api.feed(user_id, 1, 'tournir')
+                           for user_id in range(1, args.entrants + 1)))
+    tournament = manager.close_registration()
+    assert isinstance(tournament, Tournament)
+    assert len(tournament) == args.entrants
+    print(f"entrants={args.entrants} registration "
+          f"{time.perf_counter() - start:.1f} s, "
+          f"rounds={manager.rounds_for(args.entrants)}")
+    print(f"{'round':>5} {'pairs':>6} {'pairing, ms':>12} {'round, s':>9} "
+          f"{'API calls':>10} {'calls/s':>8} {'peak in-flight':>15} "
+          f"{'forfeits':>9} {'unfinished':>11}")
+
+    play_round = manager.play_round
+
+    async def measured(*round_args: Any) -> None:
+        calls = sum(api.calls.values())
+        stats = Counter(vars(manager.stats))
+        api.peak_in_flight = 0
+        start = time.perf_counter()
+        await play_round(*round_args)
+        elapsed = time.perf_counter() - start
+        done = Counter(vars(manager.stats))
+        done.subtract(stats)
+        calls = sum(api.calls.values()) - calls
+        print(f"{tournament.round:5} {done['matches']:6} "
+              f"{done['pairing_seconds'] * 1e3:12.1f} {elapsed:9.2f} "
+              f"{calls:10} {calls / elapsed:8.0f} {api.peak_in_flight:15} "
+              f"{done['forfeits']:9} {done['unfinished']:11}")
+
+    manager.play_round = measured  # type: ignore[assignment]
+    start = time.perf_counter()
+    await manager.run(tournament, bot, storage)
+    elapsed = time.perf_counter() - start
+    leaders = tournament.standings()[:3]
+    print(f"tournament: {elapsed:.1f} s, clicks {api.clicks}, "
+          f"API calls {dict(api.calls)}")
+    print("leaders: " + ", ".join(f"{entrant.user_id} ({entrant.score:g})"
+                                  for entrant in leaders))
+    await api.settle()
+    for session in list(GameSession.sessions.values()):
+        session.evict()
+    await bot.session.close()
+    await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entrants', type=int, default=10_000)
+    parser.add_argument('--rounds', type=int, default=2,
+                        help='0 - по числу участников (log2)')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='наибольшая задержка нажатия кнопки, с')
+    parser.add_argument('--timeout', type=float, default=5,
+                        help='таймауты согласия, ходов и выбора руки, с')
+    parser.add_argument('--refuse', type=float, default=0.02)
+    parser.add_argument('--absent', type=float, default=0.02)
+    parser.add_argument('--publish-concurrency', type=int, default=100)
+    parser.add_argument('--api-rate', type=float, default=1000,
+                        help='общий лимит запросов к Bot API в секунду')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
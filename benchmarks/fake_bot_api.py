@@ -0,0 +1,154 @@
+"""
+Локальный поддельный Bot API для бенчмарков: отдает апдейты через
+getUpdates (long polling) и принимает исходящие вызовы бота. Может
+отвечать с сетевой задержкой (latency + случайная добавка до jitter) и
+отклонять часть запросов ошибкой 429 Too Many Requests (доля throttle) с
+retry_after, как делает Telegram при превышении лимитов.
+"""
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter, deque
+from typing import Any
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+BOT_ID = 42
+TOKEN = f'{BOT_ID}:FAKE-TOKEN'
+# Методы получения апдейтов и служебные: их Telegram не ограничивает
+UNTHROTTLED = frozenset({'getupdates', 'getme', 'deletewebhook',
+                         'setwebhook', 'close', 'logout'})
+
+
+def make_user(user_id: int) -> dict[str, Any]:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+
+
+def make_message(user_id: int, text: str,
+                 message_id: int = 1) -> dict[str, Any]:
+    return {'message_id': message_id, 'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': make_user(user_id), 'text': text}
+
+
+def make_bot(base_url: str, **kwargs: Any) -> Bot:
+    """Бот aiogram для поддельного Bot API по адресу base_url"""
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    return Bot(token=TOKEN, session=session, **kwargs)
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 throttle: float = 0.0, retry_after: int = 1,
+                 seed: int = 1) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle  # Доля запросов, отклоняемых с 429
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.throttled: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+        self._updates: deque[dict[str, Any]] = deque()
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def make_bot(self, **kwargs: Any) -> Bot:
+        '''Бот aiogram, который ходит в этот сервер вместо Telegram'''
+        return make_bot(self.base_url, **kwargs)
+
+    def push_update(self, **payload: Any) -> dict[str, Any]:
+        update = {'update_id': next(self._update_ids), **payload}
+        self._updates.append(update)
+        self._new_updates.set()
+        return update
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._dispatch)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _params(self, request: web.Request) -> dict[str, Any]:
+        if request.content_type == 'application/json':
+            return await request.json()
+        return dict(await request.post())
+
+    async def _dispatch(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = await self._params(request)
+        if self.latency or self.jitter:
+            await asyncio.sleep(
+                self.latency + self._rng.uniform(0, self.jitter))
+        if (self.throttle and method.lower() not in UNTHROTTLED
+                and self._rng.random() < self.throttle):
+            self.throttled[method] += 1
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': 'Too Many Requests: retry after '
+                               f'{self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}},
+                status=429)
+        handler = getattr(self, f'api_{method.lower()}', self.api_default)
+        return web.json_response({'ok': True,
+                                  'result': await handler(params)})
+
+    async def api_getme(self, params: dict[str, Any]) -> Any:
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'FakeBot',
+                'username': 'fake_bot'}
+
+    async def api_getupdates(self, params: dict[str, Any]) -> Any:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        # Подтвержденные ботом апдейты больше не отдаем. Номера апдейтов
+        # растут, так что подтвержденные всегда в начале очереди
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, limit))
+
+    def _message(self, params: dict[str, Any],
+                 message_id: int) -> dict[str, Any]:
+        chat_id = int(params['chat_id'])
+        return {'message_id': message_id, 'date': 0,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', '')}
+
+    async def api_sendmessage(self, params: dict[str, Any]) -> Any:
+        return self._message(params, next(self._message_ids))
+
+    async def api_editmessagetext(self, params: dict[str, Any]) -> Any:
+        # Правка - то же сообщение, новых сообщений в чате не появляется
+        return self._message(params, int(params['message_id']))
+
+    async def api_deletemessage(self, params: dict[str, Any]) -> Any:
+        return True
+
+    async def api_default(self, params: dict[str, Any]) -> Any:
+        return True
@@ -0,0 +1,134 @@
+"""Поддельные объекты aiogram для бенчмарков без обращения к Telegram."""
+import asyncio
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any
+
+from aiogram.fsm.context import FSMContext
+from aiogram.methods import (DeleteMessage, EditMessageText, SendMessage,
+                             TelegramMethod)
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from services.outbound import TokenBucket, outbound
+
+
+class FakeBot:
+    """Бот, который вместо запросов к Bot API считает вызовы методов."""
+
+    def __init__(self, bot_id: int = 42, delay: float = 0.0) -> None:
+        self.id = bot_id
+        self.delay = delay  # Искусственная сетевая задержка на вызов
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def send_message(self, chat_id: int, text: str = '',
+                           *args, **kwargs) -> SimpleNamespace:
+        await self._call('send_message')
+        return SimpleNamespace(message_id=next(self._message_ids),
+                               chat=SimpleNamespace(id=chat_id), text=text)
+
+    async def edit_message_text(self, *args, **kwargs) -> bool:
+        await self._call('edit_message_text')
+        return True
+
+    async def delete_message(self, *args, **kwargs) -> bool:
+        await self._call('delete_message')
+        return True
+
+    async def __call__(self, method: TelegramMethod) -> Any:
+        # Так вызывает методы планировщик исходящих сообщений
+        params = method.model_dump(exclude_none=True)
+        match method:
+            case SendMessage():
+                return await self.send_message(**params)
+            case EditMessageText():
+                return await self.edit_message_text(**params)
+            case DeleteMessage():
+                return await self.delete_message(**params)
+        await self._call(type(method).__name__)
+        return True
+
+
+def unlimit_outbound() -> None:
+    '''Снимает лимиты Telegram с планировщика исходящих сообщений'''
+    outbound.global_bucket = TokenBucket(1e9, 1e9)
+    outbound.chat_rate = outbound.chat_burst = 1e9
+    outbound.chat_buckets.clear()
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int) -> None:
+        self.bot = bot
+        self.chat = SimpleNamespace(id=chat_id)
+
+    async def answer(self, text: str = '', *args, **kwargs) -> Any:
+        return await self.bot.send_message(self.chat.id, text, **kwargs)
+
+
+class CountingStorage(MemoryStorage):
+    """MemoryStorage, считающая каждое обращение к хранилищу."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.ops: Counter[str] = Counter()
+
+    async def set_state(self, key, state=None) -> None:
+        self.ops['set_state'] += 1
+        await super().set_state(key, state)
+
+    async def get_state(self, key):
+        self.ops['get_state'] += 1
+        return await super().get_state(key)
+
+    async def set_data(self, key, data) -> None:
+        self.ops['set_data'] += 1
+        await super().set_data(key, data)
+
+    async def get_data(self, key):
+        self.ops['get_data'] += 1
+        return await super().get_data(key)
+
+
+def make_callback(bot: FakeBot, user_id: int,
+                  data: str = '') -> SimpleNamespace:
+    """Собирает подобие CallbackQuery, достаточное для игровых обработчиков."""
+    return SimpleNamespace(
+        data=data,
+        from_user=SimpleNamespace(id=user_id),
+        message=FakeMessage(bot, user_id),
+    )
+
+
+def make_context(storage: BaseStorage, bot: FakeBot,
+                 user_id: int) -> FSMContext:
+    key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+    return FSMContext(storage=storage, key=key)
+
+
+class CountingEventLoop(asyncio.SelectorEventLoop):
+    """
+    Цикл событий, считающий свои итерации (_run_once) и запланированные
+    обратные вызовы (каждый из них — пробуждение какой-то корутины).
+    """
+
+    iterations: int = 0
+    wakeups: int = 0
+
+    def _run_once(self) -> None:
+        self.iterations += 1
+        super()._run_once()  # type: ignore[misc]
+
+    def call_soon(self, *args, **kwargs):
+        self.wakeups += 1
+        return super().call_soon(*args, **kwargs)
+
+    def call_at(self, *args, **kwargs):
+        self.wakeups += 1
+        return super().call_at(*args, **kwargs)
@@ -0,0 +1,395 @@
+"""
+Нагрузочный тест без Telegram: бот собран как в main.py (роутеры,
+middleware присутствия и метрик, подборщик пар, обратный отсчет, сборщик
+сессий) и получает апдейты long polling'ом из локального поддельного
+Bot API.
+Сервер работает в отдельном процессе, и за ним стоят --users сценарных
+игроков: каждый, получив сообщение бота, через случайную паузу до
+--think секунд отвечает как человек - /start -> "Давай!" -> "Быстрая
+игра" -> "Поиск соперника" -> "Начать игру" -> ходы обеих рук -> выбор
+оставляемой руки, и так --games игр.
+Доля приглашений отклоняется (--refuse), на долю клавиатур игрок не
+отвечает вовсе (--afk). Сервер отвечает с задержкой --latency (+ до
+--jitter) и отклоняет долю запросов ошибкой 429 (--throttle).
+
+Отчет: пропускная способность (апдейты, вызовы Bot API, игры в секунду),
+перцентили задержки по шагам - от действия игрока до первого ответа бота
+(у matchmaking, second_hand и keep_hand в нее входит ожидание соперника),
+время поиска соперника и игры, доли исходов игр: доиграна, таймаут,
+отказ, соперник не найден, не закончена к --duration.
+
+Лимит запросов к Bot API - --api-rate в секунду на всех (у Telegram -
+30), лимиты на чат - как у бота.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_test --users 10000 --ramp 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import Any
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.fake_bot_api import (FakeBotAPI, make_bot, make_message,
+                                     make_user)
+from database.db import cleanup_task, online_users
+from handlers import other_handlers, user_routers
+from handlers.user_handlers.game_managers import (HANDS, GameSession,
+                                                  session_gc_task)
+from lexicon.lexicon_ru import LEXICON, LEXICON_MOVES
+from middlewares.actual_state import OnlineUserMiddleware
+from middlewares.instrumentation import register_metrics_middlewares
+from services.countdown import countdown, countdown_task
+from services.executor import game_executor
+from services.matchmaking import matchmaking_queue, matchmaking_task
+from services.outbound import TokenBucket, outbound
+
+# Сообщения бота, по которым игрок узнает исход игры
+TIMEOUT_TEXTS = frozenset(LEXICON[key] for key in (
+    'you_are_too_long', 'opponent_is_too_long',
+    'too_long_waiting_response', 'both_are_too_long'))
+RESULT_TEXTS = frozenset(LEXICON[key] for key in (
+    'you_win', 'you_lose', 'hands_draw'))
+# Клавиатуры ходов: шаг определяется по тексту приглашения
+MOVE_STEPS = {LEXICON['choose_action_for_first_hand']: 'first_hand',
+              LEXICON['choose_action_for_second_hand']: 'second_hand'}
+STEPS = ('start', 'consent', 'quick_game', 'matchmaking', 'start_game',
+         'refuse', 'first_hand', 'second_hand', 'keep_hand')
+OUTCOMES = ('played', 'timeout', 'forfeit', 'no_opponent', 'unfinished')
+
+
+@dataclass
+class Player:
+    user_id: int
+    games_left: int
+    step: str | None = None  # Действие, на которое ждем ответа бота
+    acted_at: float = 0.0
+    searching_since: float = 0.0
+    invited_at: float = 0.0
+    playing: bool = False  # Между /start и концом игры
+    outcome: str | None = None  # Исход текущей игры
+
+
+@dataclass
+class LoadReport:
+    """Итоги теста со стороны игроков (передаются из их процесса)"""
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    outcomes: Counter[str] = field(default_factory=Counter)
+    updates: int = 0
+    games: int = 0  # Игры, законченные хотя бы одним игроком
+    api_calls: int = 0  # Вызовы Bot API, кроме getUpdates
+    throttled: int = 0  # Из них отклонены с 429
+    elapsed: float = 0.0
+    cpu: float = 0.0  # Процессорное время процесса игроков, с
+
+    def record(self, step: str, seconds: float) -> None:
+        self.latencies.setdefault(step, []).append(seconds)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """values отсортированы по возрастанию"""
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+# Поддельный Bot API, за которым стоят сценарные игроки
+class SimulatedPlayers(FakeBotAPI):
+    def __init__(self, users: int, games: int, think: float, refuse: float,
+                 afk: float, seed: int = 1, **api_options: Any) -> None:
+        super().__init__(seed=seed, **api_options)
+        self.players = {user_id: Player(user_id, games)
+                        for user_id in range(1, users + 1)}
+        self.think = think
+        self.refuse = refuse
+        self.afk = afk
+        self.rng = random.Random(seed)
+        self.report = LoadReport()
+        self.finished = 0  # Игроки, сыгравшие все свои игры
+        self.done = asyncio.Event()
+        self.stopped = False
+
+    def begin(self, ramp: float) -> None:
+        '''Игроки приходят равномерно за ramp секунд'''
+        loop = asyncio.get_running_loop()
+        for player in self.players.values():
+            loop.call_later(self.rng.uniform(0, ramp), self.act, player,
+                            'start', None, '/start')
+
+    async def api_sendmessage(self, params: dict[str, Any]) -> Any:
+        message = await super().api_sendmessage(params)
+        player = self.players.get(message['chat']['id'])
+        if player is not None:
+            self.deliver(player, params, message['message_id'])
+        return message
+
+    def deliver(self, player: Player, params: dict[str, Any],
+                message_id: int) -> None:
+        '''Игрок получил сообщение бота: запоминает исход и отвечает'''
+        now = time.monotonic()
+        if player.step is not None:
+            self.report.record(player.step, now - player.acted_at)
+            player.step = None
+        if not player.playing:
+            return  # Запоздавшие сообщения уже законченной игры
+        text = params.get('text', '')
+        if text in TIMEOUT_TEXTS:
+            player.outcome = player.outcome or 'timeout'
+        elif text == LEXICON['opponent_cancelled_game']:
+            player.outcome = player.outcome or 'forfeit'
+        elif text in RESULT_TEXTS:
+            player.outcome = player.outcome or 'played'
+        elif text == LEXICON['opponent_not_found']:
+            player.outcome = player.outcome or 'no_opponent'
+            self.finish_game(player, now)
+            return
+        elif text == LEXICON['game_finished']:
+            self.finish_game(player, now)
+            return
+        if (markup := params.get('reply_markup')) is not None:
+            self.react(player, text, json.loads(markup), message_id, now)
+
+    def react(self, player: Player, text: str, markup: dict[str, Any],
+              message_id: int, now: float) -> None:
+        if 'keyboard' in markup:  # Клавиатура "Давай!" / "Не хочу!"
+            self.later(player, 'consent', None, LEXICON['yes_button'])
+            return
+        buttons = [button['callback_data']
+                   for row in markup.get('inline_keyboard', [])
+                   for button in row]
+        if 'quick_game' in buttons:
+            self.later(player, 'quick_game', message_id, 'quick_game')
+        elif 'matchmaking' in buttons:
+            self.later(player, 'matchmaking', message_id, 'matchmaking')
+        elif self.rng.random() < self.afk:
+            return  # Игрок отошел: клавиатуру игры оставляет без ответа
+        elif 'start_game' in buttons:
+            player.invited_at = now
+            self.report.record('opponent search',
+                               now - player.searching_since)
+            if self.rng.random() < self.refuse:
+                player.outcome = 'forfeit'
+                self.later(player, 'refuse', message_id, 'refuse')
+            else:
+                self.later(player, 'start_game', message_id, 'start_game')
+        elif text in MOVE_STEPS:
+            self.later(player, MOVE_STEPS[text], message_id,
+                       self.rng.choice(list(LEXICON_MOVES)))
+        elif set(buttons) == set(HANDS):
+            self.later(player, 'keep_hand', message_id,
+                       self.rng.choice(HANDS))
+
+    def later(self, player: Player, step: str, message_id: int | None,
+              data: str) -> None:
+        '''Игрок ответит через случайную паузу "на размышление"'''
+        asyncio.get_running_loop().call_later(
+            self.rng.uniform(0, self.think), self.act, player, step,
+            message_id, data)
+
+    def act(self, player: Player, step: str, message_id: int | None,
+            data: str) -> None:
+        '''Апдейт от игрока: сообщение (message_id=None) или нажатие'''
+        if self.stopped:
+            return
+        now = time.monotonic()
+        player.step, player.acted_at = step, now
+        if step == 'start':
+            player.playing = True
+        elif step == 'matchmaking':
+            player.searching_since = now
+        self.report.updates += 1
+        user_id = player.user_id
+        if message_id is None:
+            self.push_update(message=make_message(user_id, data))
+            return
+        self.push_update(callback_query={
+            'id': str(self.report.updates), 'from': make_user(user_id),
+            'chat_instance': str(user_id), 'data': data,
+            'message': make_message(user_id, '', message_id)})
+
+    def finish_game(self, player: Player, now: float) -> None:
+        self.report.outcomes[player.outcome or 'played'] += 1
+        if player.invited_at:
+            self.report.record('game', now - player.invited_at)
+            self.report.games += 1
+        player.outcome, player.invited_at = None, 0.0
+        player.playing = False
+        player.games_left -= 1
+        if player.games_left > 0:
+            self.later(player, 'start', None, '/start')
+            return
+        self.finished += 1
+        if self.finished == len(self.players):
+            self.done.set()
+
+    def summary(self, elapsed: float, cpu: float) -> LoadReport:
+        report = self.report
+        report.api_calls = sum(self.calls.values()) - self.calls['getUpdates']
+        report.throttled = sum(self.throttled.values())
+        report.outcomes['unfinished'] = sum(
+            player.games_left for player in self.players.values())
+        report.elapsed, report.cpu = elapsed, cpu
+        return report
+
+
+def serve_players(args: argparse.Namespace, conn: Connection) -> None:
+    """
+    Процесс игроков: поддельный Bot API со сценарными игроками. Сообщает
+    боту порт, по команде запускает игроков и по окончании теста
+    отправляет LoadReport, а сервер работает до команды остановки -
+    запросы бота к нему доходят и после теста.
+    """
+    asyncio.run(_serve_players(args, conn))
+
+
+async def _serve_players(args: argparse.Namespace,
+                         conn: Connection) -> None:
+    loop = asyncio.get_running_loop()
+    api = SimulatedPlayers(args.users, args.games, args.think, args.refuse,
+                           args.afk, latency=args.latency,
+                           jitter=args.jitter, throttle=args.throttle)
+    await api.start()
+    conn.send(api.port)
+    await loop.run_in_executor(None, conn.recv)
+    start, cpu = time.monotonic(), time.process_time()
+    api.begin(args.ramp)
+    try:
+        await asyncio.wait_for(api.done.wait(), args.duration)
+    except asyncio.TimeoutError:
+        pass
+    api.stopped = True
+    conn.send(api.summary(time.monotonic() - start,
+                          time.process_time() - cpu))
+    await loop.run_in_executor(None, conn.recv)
+    await api.stop()
+
+
+async def settle(timeout: float) -> None:
+    """Ждет, пока уйдут запросы к Bot API, уже принятые планировщиком"""
+    stats = outbound.stats
+    deadline = time.monotonic() + timeout
+    while (stats.submitted > stats.sent + stats.failed + stats.merged
+           and time.monotonic() < deadline):
+        await asyncio.sleep(0.05)
+
+
+def print_report(report: LoadReport, bot_cpu: float) -> None:
+    elapsed, games = report.elapsed, report.games / 2
+    print(f"{elapsed:.1f} s: updates {report.updates} "
+          f"({report.updates / elapsed:.0f}/s), API calls "
+          f"{report.api_calls} ({report.api_calls / elapsed:.0f}/s), "
+          f"429 {report.throttled}, games {games:.0f} "
+          f"({games / elapsed:.1f}/s)")
+    # Бот упирается в процессор, если его загрузка близка к 100%
+    print(f"CPU: bot {bot_cpu / elapsed:.0%}, "
+          f"players and fake API {report.cpu / elapsed:.0%}")
+    print(f"{'step':<16} {'count':>7} {'p50, ms':>9} {'p90, ms':>9} "
+          f"{'p99, ms':>9} {'max, ms':>9}")
+    for step in (*STEPS, 'opponent search', 'game'):
+        values = sorted(report.latencies.get(step, ()))
+        if not values:
+            continue
+        print(f"{step:<16} {len(values):7} " + " ".join(
+            f"{percentile(values, q) * 1e3:9.1f}"
+            for q in (0.5, 0.9, 0.99, 1.0)))
+    total = sum(report.outcomes.values())
+    print("player games: " + ", ".join(
+        f"{name} {report.outcomes[name] / total:.1%}" for name in OUTCOMES))
+    stats = outbound.stats
+    print(f"outbound: sent {stats.sent}, retries after 429 {stats.retries}, "
+          f"failed {stats.failed}, p99 queue wait "
+          f"{outbound.wait_percentile(0.99) * 1e3:.0f} ms; "
+          f"sessions: created {GameSession.stats.created}, "
+          f"peak {GameSession.stats.peak}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Игроки и поддельный Bot API - в отдельном процессе, чтобы их работа
+    # не отнимала процессор у бота
+    conn, child_conn = multiprocessing.Pipe()
+    players = multiprocessing.get_context('spawn').Process(
+        target=serve_players, args=(args, child_conn))
+    players.start()
+    loop = asyncio.get_running_loop()
+    port = await loop.run_in_executor(None, conn.recv)
+
+    # Общий лимит запросов - параметр теста, лимиты на чат - как у бота
+    outbound.global_bucket = TokenBucket(args.api_rate, args.api_rate / 10)
+    GameSession.consent_timeout = args.timeout
+    GameSession.hands_timeout = args.timeout
+    GameSession.choice_timeout = args.timeout
+    matchmaking_queue.max_wait = args.timeout
+    bot = make_bot(f'http://127.0.0.1:{port}')
+    # Диспетчер и фоновые задачи - как в main.py
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.middleware(OnlineUserMiddleware(deferred=True))
+    register_metrics_middlewares(dp, bot)
+    dp.include_router(user_routers.router)
+    dp.include_router(other_handlers.router)
+    tasks = [asyncio.create_task(job) for job in (
+        cleanup_task(online_users), session_gc_task(),
+        countdown_task(countdown),
+        matchmaking_task(matchmaking_queue, bot, dp.storage))]
+    polling = asyncio.create_task(dp.start_polling(
+        bot, handle_signals=False, close_bot_session=False,
+        tasks_concurrency_limit=args.polling_tasks))
+    print(f"users={args.users} games={args.games} think<={args.think} s "
+          f"latency={args.latency * 1e3:g}+{args.jitter * 1e3:g} ms "
+          f"throttle={args.throttle:.1%} api-rate={args.api_rate:g}/s")
+
+    conn.send('begin')
+    cpu = time.process_time()
+    report = await loop.run_in_executor(None, conn.recv)
+    print_report(report, time.process_time() - cpu)
+
+    # Остановка: новых апдейтов нет, брошенные игры удаляются, начатые
+    # обработчики дорабатывают, пока поддельный сервер еще отвечает
+    await dp.stop_polling()
+    await polling
+    for task in tasks:
+        task.cancel()
+    for session in list(GameSession.sessions.values()):
+        session.evict()
+    await game_executor.drain(timeout=10)
+    await settle(timeout=10)
+    await bot.session.close()
+    conn.send('stop')
+    await loop.run_in_executor(None, players.join)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--games', type=int, default=1,
+                        help='игр на каждого игрока')
+    parser.add_argument('--ramp', type=float, default=10,
+                        help='за сколько секунд приходят все игроки')
+    parser.add_argument('--think', type=float, default=1,
+                        help='наибольшая пауза игрока перед ответом, с')
+    parser.add_argument('--refuse', type=float, default=0.01)
+    parser.add_argument('--afk', type=float, default=0.005)
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='таймауты игры и ожидания соперника, с')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='задержка ответа Bot API, с')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--throttle', type=float, default=0.001,
+                        help='доля запросов, отклоняемых с 429')
+    parser.add_argument('--api-rate', type=float, default=3000)
+    parser.add_argument('--polling-tasks', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=600,
+                        help='наибольшая длительность теста, с')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Набор микробенчмарков горячего пути бота: middleware присутствия,
+OnlineUsers.set_online и cleanup, get_random_online_users, get_winner,
+create_inline_kb, создание GameMaster и партия целиком - обратные
+вызовы через game_handlers с поддельным ботом и MemoryStorage.
+
+Каждый замер калибруется (число повторов растет, пока один прогон не
+займет --min-time секунд) и повторяется --repeat раз; в результат идет
+медиана времени одной операции. Результаты сохраняются в JSON (--save) -
+это базовая линия, с которой сравниваются следующие прогоны: --compare
+при прогоне или отдельная команда compare. Замедление больше --threshold
+отмечается как регрессия, и команда завершается с кодом 1. Базовую
+линию стоит снимать на той же машине, что и сравниваемый прогон; при
+сравнении с ней каждый замер делает столько же повторов. На общей
+виртуальной машине медианы двух прогонов одного кода расходятся до 20% -
+поэтому порог по умолчанию 0.2.
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite run --save baseline.json
+    python -m benchmarks.suite run --compare baseline.json
+    python -m benchmarks.suite compare baseline.json current.json
+"""
+import argparse
+import asyncio
+import functools
+import gc
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from benchmarks.bench_storage_ops import play_game
+from benchmarks.fakes import FakeBot, unlimit_outbound
+from database.db import OnlineUsers, online_users
+from handlers.user_handlers.game_managers import GameMaster, GameSession
+from keyboards.keyboards import create_inline_kb
+from lexicon.lexicon_ru import LEXICON_MOVES
+from middlewares.actual_state import OnlineUserMiddleware
+from services.rules import rules
+from services.matchmaking import ONLINE_CANDIDATES
+from services.services import get_random_online_users, get_winner
+
+# Замер: выполняет операцию loops раз и возвращает затраченное время, с
+Bench = Callable[[int], Awaitable[float]]
+
+BENCHMARKS: dict[str, Bench] = {}
+
+POPULATION = 100_000  # Пользователей онлайн в замерах OnlineUsers
+UPDATE = {'update_id': 1, 'callback_query': {
+    'id': '1', 'chat_instance': '1', 'data': 'rock',
+    'from': {'id': 1001, 'is_bot': False, 'first_name': 'Player'},
+    'message': {'message_id': 1, 'date': 0,
+                'chat': {'id': 1001, 'type': 'private'}, 'text': ''}}}
+
+
+def benchmark(name: str) -> Callable[[Bench], Bench]:
+    """Регистрирует замер в наборе под именем name"""
+    def register(bench: Bench) -> Bench:
+        BENCHMARKS[name] = bench
+        return bench
+    return register
+
+
+async def _handler(event: Any, data: dict) -> None:
+    return None
+
+
+@benchmark('middleware.online_user')
+async def bench_middleware(loops: int) -> float:
+    # Как в main.py: отметка присутствия откладывается
+    middleware = OnlineUserMiddleware(deferred=True)
+    update = Update.model_validate(UPDATE)
+    data: dict = {}
+    start = time.perf_counter()
+    for step in range(loops):
+        await middleware(_handler, update, data)
+        if step % 16 == 0:  # Несколько апдейтов на итерацию цикла
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)  # Отложенные отметки тоже в счет
+    return time.perf_counter() - start
+
+
+@functools.cache
+def _population() -> OnlineUsers:
+    users = OnlineUsers(online_duration=60)
+    for user_id in range(POPULATION):
+        users.set_online(user_id)
+    return users
+
+
+@benchmark('online_users.set_online')
+async def bench_set_online(loops: int) -> float:
+    users = _population()
+    user_ids = random.Random(1).choices(range(POPULATION), k=loops)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        users.set_online(user_id)
+    return time.perf_counter() - start
+
+
+@benchmark('online_users.cleanup')
+async def bench_cleanup(loops: int) -> float:
+    '''Время на одного удаленного: loops истекших перед живыми'''
+    users = OnlineUsers(online_duration=60)
+    now = time.monotonic()
+    expired = now - 120
+    # Ссылки на id держим снаружи: освобождение памяти не в счет
+    user_ids = list(range(loops + 1000))
+    users.load(itertools.chain(
+        ((user_id, expired) for user_id in user_ids[:loops]),
+        ((user_id, now) for user_id in user_ids[loops:])))
+    start = time.perf_counter()
+    removed = users.cleanup()
+    elapsed = time.perf_counter() - start
+    assert removed == loops
+    return elapsed
+
+
+@benchmark('get_random_online_users')
+async def bench_random_online_users(loops: int) -> float:
+    '''Кандидаты в соперники для игрока, ждущего в одиночку'''
+    if not online_users.users:
+        online_users.load((user_id, time.monotonic())
+                          for user_id in range(POPULATION))
+    start = time.perf_counter()
+    for _ in range(loops):
+        get_random_online_users(0, ONLINE_CANDIDATES)
+    return time.perf_counter() - start
+
+
+@benchmark('get_winner')
+async def bench_get_winner(loops: int) -> float:
+    rng = random.Random(1)
+    pairs = [(rng.choice(rules.moves), rng.choice(rules.moves))
+             for _ in range(loops)]
+    start = time.perf_counter()
+    for user_choice, bot_choice in pairs:
+        get_winner(user_choice, bot_choice)
+    return time.perf_counter() - start
+
+
+@benchmark('create_inline_kb')
+async def bench_inline_kb(loops: int) -> float:
+    moves = tuple(LEXICON_MOVES)
+    start = time.perf_counter()
+    for _ in range(loops):
+        create_inline_kb(*moves)
+    return time.perf_counter() - start
+
+
+@benchmark('game.master')
+async def bench_game_master(loops: int) -> float:
+    session = GameSession((1, 2), FakeBot(),  # type: ignore[arg-type]
+                          MemoryStorage())
+    start = time.perf_counter()
+    for _ in range(loops):
+        GameMaster(session, 1)
+    elapsed = time.perf_counter() - start
+    session.evict()
+    return elapsed
+
+
+# Игроки партий game.round_trip - новые в каждой партии
+_player_ids = itertools.count(1_000_001)
+
+
+@benchmark('game.round_trip')
+async def bench_round_trip(loops: int) -> float:
+    '''Партия целиком: 8 нажатий, от согласия до выбора руки'''
+    unlimit_outbound()
+    bot, storage = FakeBot(), MemoryStorage()
+    start = time.perf_counter()
+    for _ in range(loops):
+        await play_game(bot, storage, next(_player_ids), next(_player_ids))
+    return time.perf_counter() - start
+
+
+async def measure(bench: Bench, repeat: int, min_time: float,
+                  loops: int | None = None) -> dict[str, float]:
+    '''loops - число повторов за прогон (None - подобрать по min_time)'''
+    if loops is None:
+        loops = 1
+        while (elapsed := await bench(loops)) < min_time:
+            loops *= 10 if elapsed < min_time / 10 else 2
+    else:
+        await bench(loops)  # Разогрев
+    samples = []
+    for _ in range(repeat):
+        gc.collect()  # Сборка мусора от прошлого прогона не в счет
+        samples.append(await bench(loops) / loops * 1e9)
+    return {'ns': statistics.median(samples), 'min': min(samples),
+            'stdev': statistics.stdev(samples) if repeat > 1 else 0.0,
+            'loops': loops}
+
+
+async def run_suite(names: list[str], repeat: int, min_time: float,
+                    loops: dict[str, int]) -> dict[str, dict[str, float]]:
+    results = {}
+    for name in names:
+        results[name] = result = await measure(
+            BENCHMARKS[name], repeat, min_time, loops.get(name))
+        print(f"{name:<26} {format_ns(result['ns']):>10} "
+              f"± {result['stdev'] / result['ns']:5.1%}  "
+              f"(loops={result['loops']})")
+    return results
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.1f} ns"
+
+
+def save(path: str, results: dict[str, dict[str, float]]) -> None:
+    meta = {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2,
+                  sort_keys=True)
+
+
+def load(path: str) -> dict[str, dict[str, float]]:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']
+
+
+def compare(baseline: dict[str, dict[str, float]],
+            current: dict[str, dict[str, float]],
+            threshold: float) -> list[str]:
+    '''Печатает изменения и возвращает имена замедлившихся замеров'''
+    regressions = []
+    print(f"{'benchmark':<26} {'baseline':>10} {'current':>10} "
+          f"{'change':>8}")
+    for name in sorted(baseline.keys() | current.keys()):
+        if name not in baseline or name not in current:
+            side = 'baseline' if name in baseline else 'current'
+            print(f"{name:<26} only in {side}")
+            continue
+        before, after = baseline[name]['ns'], current[name]['ns']
+        change = after / before - 1
+        mark = ''
+        if change > threshold:
+            mark = 'REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = 'faster'
+        print(f"{name:<26} {format_ns(before):>10} {format_ns(after):>10} "
+              f"{change:+8.1%}  {mark}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='прогнать замеры')
+    run.add_argument('--filter', default='',
+                     help='только замеры, в имени которых есть строка')
+    run.add_argument('--repeat', type=int, default=7)
+    run.add_argument('--min-time', type=float, default=0.1,
+                     help='наименьшая длительность одного прогона, с')
+    run.add_argument('--save', help='записать результаты в JSON')
+    run.add_argument('--compare', help='сравнить с базовой линией')
+    compare_command = commands.add_parser(
+        'compare', help='сравнить два сохраненных прогона')
+    compare_command.add_argument('baseline')
+    compare_command.add_argument('current')
+    for command in (run, compare_command):
+        command.add_argument('--threshold', type=float, default=0.2,
+                             help='допустимое замедление, доля')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        current = load(args.current)
+        baseline = load(args.baseline)
+    else:
+        names = [name for name in BENCHMARKS if args.filter in name]
+        baseline = load(args.compare) if args.compare else {}
+        # Повторов за прогон - как в базовой линии: работа та же самая
+        loops = {name: int(result['loops'])
+                 for name, result in baseline.items()}
+        current = asyncio.run(run_suite(names, args.repeat, args.min_time,
+                                        loops))
+        if args.save:
+            save(args.save, current)
+        if not args.compare:
+            return
+        # С --filter сравниваем только прогнанные замеры
+        baseline = {name: result for name, result in baseline.items()
+                    if name in current}
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over "
+              f"{args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+
 from environs import Env
 from dataclasses import dataclass
 
@@ -7,12 +8,179 @@ class TgBot:
     token: str  # Токен для доступа к телеграм-боту
 
 
+@dataclass
+class StorageConfig:
+    backend: str  # Хранилище FSM и общих данных: memory или redis
+    url: str | None  # Адрес сервера для redis, например redis://host:6379/0
+
+
+@dataclass
+class WebhookConfig:
+    mode: str  # Способ получения апдейтов: polling или webhook
+    url: str | None  # Публичный адрес, который регистрируется в Telegram
+    secret: str | None  # Секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+    host: str  # Где слушает HTTP-сервер
+    port: int
+    path: str
+    queue_size: int  # Емкость очереди принятых апдейтов
+    workers: int  # Число обработчиков очереди
+    polling_tasks: int  # Сколько апдейтов polling обрабатывает одновременно
+
+
+@dataclass
+class ExecutorConfig:
+    workers: int  # Сколько сценариев игры выполняется одновременно
+    queue_size: int  # Сверх стольких ожидающих новые игры не начинаются
+    drain_timeout: float  # Сколько ждать начатые сценарии при остановке, с
+
+
+@dataclass
+class PresenceConfig:
+    name: str | None  # Блок общей памяти с онлайном; None - у процесса свой
+    capacity: int  # Слотов в таблице: степень двойки, вдвое больше онлайна
+    owner: bool  # Создает таблицу и чистит ее: ровно один процесс машины
+
+
+@dataclass
+class SessionConfig:
+    ttl: float  # Через сколько секунд без событий сессия удаляется
+    max_sessions: int  # Сверх этого вытесняются самые давние сессии
+
+
+@dataclass
+class SnapshotConfig:
+    path: str | None  # Каталог снапшотов; None - снапшоты не ведутся
+    interval: float  # Как часто дописывать журнал изменений, с
+    compact_interval: float  # Как часто сжимать журнал в полный снимок, с
+
+
+@dataclass
+class HistoryConfig:
+    path: str | None  # Файл SQLite с историей игр; None - история не пишется
+    batch_size: int  # Сколько итогов игр писать одной транзакцией
+
+
+@dataclass
+class RatingConfig:
+    initial: float  # Рейтинг Эло нового игрока
+    k_factor: float  # Наибольшее изменение рейтинга за одну игру
+
+
+@dataclass
+class TournamentConfig:
+    registration: float  # Сколько длится запись на турнир, с
+    min_players: int  # Меньше участников - турнир не проводится
+    max_rounds: int  # 0 - число раундов по числу участников (log2)
+    start_timeout: float  # Сколько ждать согласия на игру раунда, с
+    publish_concurrency: int  # Сколько пар приглашается одновременно
+
+
+@dataclass
+class MetricsConfig:
+    host: str  # Где слушает HTTP-сервер метрик (по умолчанию локально)
+    port: int  # 0 - не отдаются; у каждого процесса бота свой порт
+
+
+@dataclass
+class LoggingConfig:
+    level: str  # Уровень логов по умолчанию
+    levels: dict[str, str]  # Уровни отдельных логгеров: имя -> уровень
+    sampling: dict[str, float]  # Доля записей ниже WARNING: логгер -> доля
+    format: str  # text или json (по объекту JSON на строку)
+    queue_size: int  # Сверх стольких ждущих вывода записи отбрасываются
+
+
 @dataclass
 class Config:
     tg_bot: TgBot
+    storage: StorageConfig
+    webhook: WebhookConfig
+    executor: ExecutorConfig
+    presence: PresenceConfig
+    sessions: SessionConfig
+    snapshot: SnapshotConfig
+    history: HistoryConfig
+    rating: RatingConfig
+    tournament: TournamentConfig
+    metrics: MetricsConfig
+    logging: LoggingConfig
+
+
+def webhook_secret(env: Env) -> str | None:
+    """
+    Секрет вебхука: без него апдейты мог бы присылать любой, кто знает
+    адрес. В режиме webhook он обязателен и задается явно: все процессы
+    бота за одним адресом должны проверять один и тот же секрет.
+    """
+    secret = env.str('WEBHOOK_SECRET', None)
+    if secret is None and env.str('UPDATES_MODE', 'polling') == 'webhook':
+        raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+    return secret
 
 
 def load_config(path: str | None = None) -> Config:
     env = Env()
     env.read_env(path)
-    return Config(tg_bot=TgBot(token=env('BOT_TOKEN')))
+    return Config(
+        tg_bot=TgBot(token=env('BOT_TOKEN')),
+        storage=StorageConfig(
+            backend=env.str('STORAGE_BACKEND', 'memory'),
+            url=env.str('STORAGE_URL', None)
+        ),
+        webhook=WebhookConfig(
+            mode=env.str('UPDATES_MODE', 'polling'),
+            url=env.str('WEBHOOK_URL', None),
+            secret=webhook_secret(env),
+            host=env.str('WEBHOOK_HOST', '0.0.0.0'),
+            port=env.int('WEBHOOK_PORT', 8080),
+            path=env.str('WEBHOOK_PATH', '/webhook'),
+            queue_size=env.int('WEBHOOK_QUEUE_SIZE', 10000),
+            workers=env.int('WEBHOOK_WORKERS', 64),
+            polling_tasks=env.int('POLLING_TASKS', 1000)
+        ),
+        executor=ExecutorConfig(
+            workers=env.int('GAME_WORKERS', 256),
+            queue_size=env.int('GAME_QUEUE_SIZE', 10000),
+            drain_timeout=env.float('GAME_DRAIN_TIMEOUT', 30)
+        ),
+        presence=PresenceConfig(
+            name=env.str('PRESENCE_SHM', None),
+            capacity=env.int('PRESENCE_CAPACITY', 1 << 18),
+            owner=env.bool('PRESENCE_OWNER', False)
+        ),
+        sessions=SessionConfig(
+            ttl=env.float('SESSION_TTL', 300),
+            max_sessions=env.int('MAX_SESSIONS', 100000)
+        ),
+        snapshot=SnapshotConfig(
+            path=env.str('SNAPSHOT_DIR', None),
+            interval=env.float('SNAPSHOT_INTERVAL', 1),
+            compact_interval=env.float('SNAPSHOT_COMPACT_INTERVAL', 60)
+        ),
+        history=HistoryConfig(
+            path=env.str('HISTORY_DB', None),
+            batch_size=env.int('HISTORY_BATCH_SIZE', 1000)
+        ),
+        rating=RatingConfig(
+            initial=env.float('RATING_INITIAL', 1000),
+            k_factor=env.float('RATING_K_FACTOR', 32)
+        ),
+        tournament=TournamentConfig(
+            registration=env.float('TOURNAMENT_REGISTRATION', 60),
+            min_players=env.int('TOURNAMENT_MIN_PLAYERS', 4),
+            max_rounds=env.int('TOURNAMENT_MAX_ROUNDS', 0),
+            start_timeout=env.float('TOURNAMENT_START_TIMEOUT', 30),
+            publish_concurrency=env.int('TOURNAMENT_PUBLISH_CONCURRENCY', 100)
+        ),
+        metrics=MetricsConfig(
+            host=env.str('METRICS_HOST', '127.0.0.1'),
+            port=env.int('METRICS_PORT', 0)
+        ),
+        logging=LoggingConfig(
+            level=env.str('LOG_LEVEL', 'INFO'),
+            levels=env.dict('LOG_LEVELS', {}),
+            sampling=env.dict('LOG_SAMPLING', {}, subcast_values=float),
+            format=env.str('LOG_FORMAT', 'text'),
+            queue_size=env.int('LOG_QUEUE_SIZE', 10000)
+        )
+    )
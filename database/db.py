@@ -1,6 +1,16 @@
 import asyncio
+import random
 import time
-from typing import TypeAlias
+from collections import OrderedDict
+from typing import Iterable, TypeAlias
+
+from database.presence import PresenceTable
+from services.logs import get_logger
+from services.metrics import metrics
+
+
+logger = get_logger(__name__)
+
 
 # Определяем тип для хранения времени активности
 activity_time: TypeAlias = float
@@ -10,34 +20,150 @@ activity_time: TypeAlias = float
 class OnlineUsers:
     def __init__(self, online_duration: int) -> None:
         self.online_duration = online_duration
-        self.users: dict[int, activity_time] = {}
-
-    def set_online(self, user_id: int) -> None:
-        # Записываем время последней активности
-        self.users[user_id] = time.monotonic()
-        print(f"User {user_id} set online. Current users: {self.users}")
-
-    def cleanup(self) -> None:
-        # Удаляем пользователей, у которых время активности истекло
-        now = time.monotonic()
-        to_remove = [
-            user_id for user_id, last_seen in self.users.items()
-            if now - last_seen >= self.online_duration
+        # Пользователи упорядочены по времени последней активности:
+        # в начале - самые давние, в конце - самые свежие
+        self.users: OrderedDict[int, activity_time] = OrderedDict()
+        # Плотный массив id и позиции в нем - для случайной выборки за O(1)
+        self._ids: list[int] = []
+        self._positions: dict[int, int] = {}
+        # Id, отмеченные с прошлой синхронизации с общим хранилищем
+        # (None - процесс работает без общего хранилища)
+        self.journal: set[int] | None = None
+        # Таблица присутствия всех процессов бота на этой машине (если
+        # задана): отметки дублируются в нее, а выборка идет из нее
+        self.table: PresenceTable | None = None
+
+    def set_online(self, user_id: int, replicate: bool = True) -> None:
+        # Записываем время последней активности и переносим в конец, O(1)
+        self.users[user_id] = now = time.monotonic()
+        self.users.move_to_end(user_id)
+        if replicate and self.journal is not None:
+            self.journal.add(user_id)
+        if self.table is not None:
+            self.table.touch(user_id, now)
+        if user_id not in self._positions:
+            self._positions[user_id] = len(self._ids)
+            self._ids.append(user_id)
+
+    def load(self, users: Iterable[tuple[int, activity_time]]) -> None:
+        '''
+        Заполняет пустой реестр парами (id, время активности по
+        time.monotonic) от давних к свежим - при восстановлении из снимка
+        '''
+        self.users.update(users)
+        if self.table is not None:
+            for user_id, seen in self.users.items():
+                self.table.touch(user_id, seen)
+        self._ids = list(self.users)
+        self._positions = {
+            user_id: position for position, user_id in enumerate(self._ids)}
+
+    def _discard(self, user_id: int) -> None:
+        # Удаление из массива обменом с последним элементом, O(1)
+        position = self._positions.pop(user_id)
+        last_id = self._ids.pop()
+        if last_id != user_id:
+            self._ids[position] = last_id
+            self._positions[last_id] = position
+
+    def _available(self, except_user_id: int) -> tuple[int, int]:
+        # Число кандидатов и позиция исключаемого (или -1, если его нет)
+        except_position = self._positions.get(except_user_id, -1)
+        return (len(self._ids) - (except_position >= 0), except_position)
+
+    def _deadline(self) -> float:
+        return time.monotonic() - self.online_duration
+
+    def sample_many(self, k: int, except_user_id: int) -> list[int]:
+        '''
+        До k различных случайных онлайн-пользователей, кроме
+        except_user_id, за O(k). Если онлайн меньше k - вернет всех.
+        '''
+        if self.table is None:
+            return self._sample_local(k, except_user_id)
+        found = self.table.sample_many(k, except_user_id, self._deadline())
+        if len(found) < k:
+            # Индекс таблицы строит очистка владельца: пришедших после нее
+            # добираем из онлайна этого процесса
+            found.extend(user_id for user_id
+                         in self._sample_local(k, except_user_id)
+                         if user_id not in found)
+        return found[:k]
+
+    def _sample_local(self, k: int, except_user_id: int) -> list[int]:
+        available, except_position = self._available(except_user_id)
+        indexes = random.sample(range(available), min(k, available))
+        return [
+            self._ids[index + (0 <= except_position <= index)]
+            for index in indexes
         ]
-        for user_id in to_remove:
-            del self.users[user_id]
+
+    def cleanup(self, budget: int | None = None) -> int:
+        """
+        Удаляет пользователей, у которых время активности истекло.
+        Просматривает только истекшие записи с начала очереди и не более
+        budget штук за вызов. Возвращает число удаленных пользователей.
+        """
+        deadline = self._deadline()
+        users = self.users
+        removed = 0
+        while users and (budget is None or removed < budget):
+            if users[next(iter(users))] > deadline:
+                break  # Дальше только живые пользователи
+            self._discard(users.popitem(last=False)[0])
+            removed += 1
+        return removed
 
 
 # Глобальный объект для отслеживания онлайн-пользователей
 online_users = OnlineUsers(online_duration=60)
 
+metrics.collect('bot_online_users', 'Users seen within online_duration',
+                lambda: len(online_users.users))
+metrics.collect('bot_online_users_shared',
+                'Users in the shared presence table of this host '
+                '(as of the last cleanup)',
+                lambda: (online_users.table.live
+                         if online_users.table is not None else 0))
+
 
-async def cleanup_task(online_users: OnlineUsers) -> None:
-    """Периодически очищает список онлайн пользователей."""
+async def cleanup_task(online_users: OnlineUsers, interval: float = 10,
+                       sweep_budget: int = 1000) -> None:
+    """
+    Периодически очищает список онлайн пользователей.
+    За один шаг удаляет не более sweep_budget записей и отдает управление
+    циклу событий, чтобы всплеск истечений не блокировал бота.
+    """
     while True:
-        await asyncio.sleep(10)
-        online_users.cleanup()
-        print("Online users:", online_users.users)
+        await asyncio.sleep(interval)
+        removed = 0
+        while (swept := online_users.cleanup(sweep_budget)) == sweep_budget:
+            removed += swept
+            await asyncio.sleep(0)
+        removed += swept
+        logger.debug('Online users cleaned up',
+                     online=len(online_users.users), removed=removed)
+        table = online_users.table
+        if table is not None and table.owner:
+            await sweep_presence(table, online_users.online_duration)
+
 
-# Сообщаем, что модуль успешно импортирован
-print("Модуль database.db импортирован")
+async def sweep_presence(table: PresenceTable, online_duration: float,
+                         chunk: int = 4096) -> None:
+    """
+    Удаляет истекшие записи общей таблицы присутствия (только владелец)
+    кусками по chunk слотов - от конца таблицы к началу, отдавая
+    управление циклу событий между кусками. Затем публикует индекс живых
+    слотов, по которому процессы выбирают случайный онлайн.
+    """
+    removed = 0
+    live: list[int] = []
+    for stop in range(table.capacity, 0, -chunk):
+        deadline = time.monotonic() - online_duration
+        swept, alive = table.sweep(max(stop - chunk, 0), stop, deadline)
+        removed += swept
+        live.extend(alive)
+        await asyncio.sleep(0)
+    table.publish(live)
+    logger.debug('Shared presence cleaned up', online=len(live),
+                 removed=removed)
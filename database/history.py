@@ -0,0 +1,211 @@
+import asyncio
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Any, Callable, TypeVar
+
+from services.logs import get_logger
+from utils.enums import MatchOutcome
+
+
+logger = get_logger(__name__)
+
+
+T = TypeVar('T')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    player1 INTEGER NOT NULL,
+    player2 INTEGER NOT NULL,
+    first_hand1 TEXT,
+    second_hand1 TEXT,
+    first_hand2 TEXT,
+    second_hand2 TEXT,
+    winner INTEGER,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_player1 ON matches (player1, id);
+CREATE INDEX IF NOT EXISTS matches_player2 ON matches (player2, id);
+'''
+
+
+# Итог одной игры. Ходы не выбранных вовремя рук - None
+@dataclass(frozen=True)
+class MatchRecord:
+    finished_at: float  # time.time() окончания игры
+    player1: int
+    player2: int
+    first_hand1: str | None
+    second_hand1: str | None
+    first_hand2: str | None
+    second_hand2: str | None
+    winner: int | None  # При REFUSED и NO_CONSENT - соперник неявки
+    outcome: MatchOutcome
+
+
+COLUMNS = ', '.join(field.name for field in fields(MatchRecord))
+
+
+def _row(match: MatchRecord) -> tuple:
+    return (match.finished_at, match.player1, match.player2,
+            match.first_hand1, match.second_hand1, match.first_hand2,
+            match.second_hand2, match.winner, match.outcome.name)
+
+
+@dataclass
+class HistoryStats:
+    recorded: int = 0
+    dropped: int = 0  # Не записаны: очередь записи переполнена
+    written: int = 0
+    batches: int = 0
+    max_batch: int = 0
+    max_queued: int = 0
+    write_seconds: float = 0.0  # Суммарное время записи пачек в потоке
+
+
+# История игр в локальной SQLite. Запись отложенная: record кладет итог
+# в очередь и сразу возвращается, а history_task пишет накопившееся
+# пачками, по транзакции на пачку. Все обращения к базе идут в одном
+# отдельном потоке, так что диск не задерживает цикл событий
+class MatchHistory:
+    def __init__(self, path: str, batch_size: int = 1000,
+                 queue_size: int = 100_000) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stats = HistoryStats()
+        self._queue: deque[MatchRecord] = deque()
+        self._pending = asyncio.Event()
+        self._thread = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='match-history')
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение живет в потоке истории и создается в нем же
+        if self._connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # В режиме WAL commit без fsync на каждую транзакцию: при
+            # сбое питания теряются лишь последние пачки, база цела
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _call(self, function: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread, function, *args)
+
+    def record(self, match: MatchRecord) -> None:
+        '''Ставит итог игры в очередь записи, не дожидаясь диска'''
+        if len(self._queue) >= self.queue_size:
+            self.stats.dropped += 1
+            return
+        self._queue.append(match)
+        self.stats.recorded += 1
+        self.stats.max_queued = max(self.stats.max_queued, len(self._queue))
+        self._pending.set()
+
+    def _write(self, rows: list[tuple]) -> float:
+        start = time.perf_counter()
+        connection = self._connect()
+        with connection:  # Одна транзакция на пачку
+            connection.executemany(
+                f'INSERT INTO matches ({COLUMNS}) '
+                f'VALUES ({", ".join("?" * len(rows[0]))})', rows)
+        return time.perf_counter() - start
+
+    async def flush(self) -> int:
+        '''
+        Пишет все, что накопилось в очереди. Возвращает число записей.
+        При ошибке базы незаписанная пачка остается в очереди.
+        '''
+        written = 0
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(
+                min(self.batch_size, len(self._queue)))]
+            rows = [_row(match) for match in batch]
+            try:
+                seconds = await self._call(self._write, rows)
+            except sqlite3.Error:
+                # Пачка не записана: возвращаем ее в начало очереди, ее
+                # повторит следующий flush
+                self._queue.extendleft(reversed(batch))
+                raise
+            self.stats.write_seconds += seconds
+            self.stats.written += len(rows)
+            self.stats.batches += 1
+            self.stats.max_batch = max(self.stats.max_batch, len(rows))
+            written += len(rows)
+        return written
+
+    async def wait_pending(self) -> None:
+        await self._pending.wait()
+        self._pending.clear()
+
+    def _fetch(self, query: str, *params: Any) -> list[MatchRecord]:
+        rows = self._connect().execute(query, params).fetchall()
+        return [MatchRecord(finished_at, player1, player2, first_hand1,
+                            second_hand1, first_hand2, second_hand2, winner,
+                            MatchOutcome[outcome])
+                for (finished_at, player1, player2, first_hand1,
+                     second_hand1, first_hand2, second_hand2, winner,
+                     outcome) in rows]
+
+    async def user_history(self, user_id: int,
+                           limit: int = 20) -> list[MatchRecord]:
+        '''Последние игры пользователя, от свежих к давним'''
+        # Каждая половина объединения идет по своему индексу и берет не
+        # больше limit строк - сортируются только они
+        query = f'''
+            SELECT {COLUMNS} FROM (
+                SELECT * FROM (SELECT * FROM matches WHERE player1 = ?
+                               ORDER BY id DESC LIMIT ?)
+                UNION ALL
+                SELECT * FROM (SELECT * FROM matches WHERE player2 = ?
+                               ORDER BY id DESC LIMIT ?)
+            ) ORDER BY id DESC LIMIT ?'''
+        return await self._call(self._fetch, query,
+                                user_id, limit, user_id, limit, limit)
+
+    async def recent(self, limit: int = 20) -> list[MatchRecord]:
+        '''Последние игры всех пользователей, от свежих к давним'''
+        return await self._call(
+            self._fetch,
+            f'SELECT {COLUMNS} FROM matches ORDER BY id DESC LIMIT ?', limit)
+
+    async def matches(self, *outcomes: MatchOutcome) -> list[MatchRecord]:
+        '''Все игры с данными итогами в порядке окончания'''
+        return await self._call(
+            self._fetch,
+            f'SELECT {COLUMNS} FROM matches '
+            f'WHERE outcome IN ({", ".join("?" * len(outcomes))}) '
+            f'ORDER BY id', *(outcome.name for outcome in outcomes))
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def close(self) -> None:
+        '''Дописывает очередь и закрывает базу (при остановке бота)'''
+        await self.flush()
+        await self._call(self._close)
+        self._thread.shutdown()
+
+
+async def history_task(history: MatchHistory) -> None:
+    """
+    Пишет итоги игр в базу по мере поступления. Пока идет запись пачки,
+    следующая копится в очереди - чем выше нагрузка, тем крупнее пачки.
+    """
+    while True:
+        await history.wait_pending()
+        try:
+            await history.flush()
+        except sqlite3.Error as error:
+            logger.error('Match history write failed', error=error)
@@ -0,0 +1,248 @@
+import random
+import time
+from array import array
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterable
+
+# Ключ пустого слота и слота, откуда удалили запись (надгробие)
+EMPTY = 0
+TOMBSTONE = -1
+
+MAGIC = 0x50524553454e4332  # 'PRESENC2'
+# Заголовок - слова по 8 байт: метка, число слотов, живых записей на
+# момент последней очистки. За ним ключи, время активности и индекс
+# живых слотов - по capacity слов
+HEADER_WORDS = 4
+HEADER_MAGIC, HEADER_CAPACITY, HEADER_LIVE = 0, 1, 2
+
+# Сколько случайных позиций индекса пробовать на один выбираемый id
+SAMPLE_ATTEMPTS = 16
+
+# Множитель Фибоначчи: перемешивает биты id, близкие id - в разные слоты
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+@dataclass
+class PresenceStats:
+    full: int = 0  # Отметки, не нашедшие слота: таблица переполнена
+    short: int = 0  # Выборки, нашедшие в индексе меньше k живых
+    merged: int = 0  # Задвоенные гонкой вставки id, слитые очисткой
+
+
+def _open_block(name: str, size: int, create: bool
+                ) -> shared_memory.SharedMemory:
+    block = shared_memory.SharedMemory(name, create=create, size=size)
+    # Блок общий для всех процессов: не даем resource_tracker удалить
+    # его, когда завершится открывший процесс
+    resource_tracker.unregister(block._name,  # type: ignore[attr-defined]
+                                'shared_memory')
+    return block
+
+
+# Таблица присутствия в общей памяти для всех процессов бота на машине:
+# открытая адресация с линейным пробированием, слот - (user_id, время
+# активности по time.monotonic, общему для процессов). Блокировок нет:
+# запись слова в 8 байт атомарна, так что читатель видит или старое,
+# или новое значение. Вставки без блокировок теряют данные при гонке:
+# - два процесса заняли один пустой слот разными id - выживет одна
+#   отметка, второй пользователь пропадет до своей следующей отметки;
+# - два процесса вставили один id в разные слоты - лишнюю копию найдет и
+#   сольет с первой очистка владельца.
+# Присутствие и так приблизительно, а гонка требует попадания в одно окно
+# в несколько инструкций. Удаляет истекшие записи только процесс-владелец;
+# он же после очистки пишет индекс живых слотов, по которому выборка
+# работает за O(k), не просматривая таблицу
+class PresenceTable:
+    def __init__(self, block: shared_memory.SharedMemory,
+                 owner: bool) -> None:
+        self.block = block
+        self.owner = owner
+        buf = block.buf
+        assert buf is not None
+        words = buf.cast('q')
+        if words[HEADER_MAGIC] != MAGIC:
+            raise ValueError(f"{block.name} is not a presence table")
+        self.capacity = words[HEADER_CAPACITY]
+        self._mask = self.capacity - 1
+        self._shift = 64 - self.capacity.bit_length() + 1
+        self._header = words[:HEADER_WORDS]
+        self._keys = words[HEADER_WORDS:HEADER_WORDS + self.capacity]
+        self._seen = buf[(HEADER_WORDS + self.capacity) * 8:
+                         (HEADER_WORDS + 2 * self.capacity) * 8].cast('d')
+        self._index = buf[(HEADER_WORDS + 2 * self.capacity) * 8:
+                          (HEADER_WORDS + 3 * self.capacity) * 8].cast('q')
+        words.release()
+        self.stats = PresenceStats()
+
+    @classmethod
+    def open(cls, name: str, capacity: int = 1 << 18,
+             owner: bool = False) -> 'PresenceTable':
+        '''
+        Владелец создает блок name на capacity слотов (степень двойки,
+        стоит брать вдвое больше наибольшего онлайна) или подключается к
+        оставшемуся от прошлого запуска. Остальные процессы подключаются
+        к созданному: владельца нужно запустить первым.
+        '''
+        if capacity < 2 or capacity & (capacity - 1):
+            raise ValueError("Capacity must be a power of two")
+        size = (HEADER_WORDS + 3 * capacity) * 8
+        if owner:
+            try:
+                block = _open_block(name, size, create=True)
+            except FileExistsError:
+                block = _open_block(name, size, create=False)
+            else:
+                buf = block.buf
+                assert buf is not None
+                words = buf.cast('q')
+                words[HEADER_CAPACITY] = capacity
+                words[HEADER_MAGIC] = MAGIC  # Последним: блок готов
+                words.release()
+        else:
+            try:
+                block = _open_block(name, size, create=False)
+            except FileNotFoundError:
+                raise FileNotFoundError(
+                    f"Presence table {name!r} does not exist: start the "
+                    f"owner process (PRESENCE_OWNER=true) first") from None
+        return cls(block, owner)
+
+    def close(self) -> None:
+        for view in (self._header, self._keys, self._seen, self._index):
+            view.release()
+        self.block.close()
+
+    def unlink(self) -> None:
+        '''Удаляет блок из системы (процессы, открывшие его, не мешают)'''
+        # unlink снимает блок с учета resource_tracker - вернем его туда
+        resource_tracker.register(self.block._name,  # type: ignore
+                                  'shared_memory')
+        self.block.unlink()
+
+    @property
+    def live(self) -> int:
+        '''Живых записей на момент последней очистки владельцем'''
+        return self._header[HEADER_LIVE]
+
+    def _home(self, user_id: int) -> int:
+        return ((user_id * _GOLDEN) & _MASK64) >> self._shift
+
+    def touch(self, user_id: int, seen: float | None = None) -> None:
+        '''Отмечает активность user_id (по умолчанию - сейчас)'''
+        if seen is None:
+            seen = time.monotonic()
+        keys, mask = self._keys, self._mask
+        slot = self._home(user_id)
+        free = -1
+        for _ in range(self.capacity):
+            key = keys[slot]
+            if key == user_id:
+                self._seen[slot] = seen
+                return
+            if key == EMPTY:
+                break
+            if key == TOMBSTONE and free < 0:
+                free = slot
+            slot = (slot + 1) & mask
+        else:
+            if free < 0:
+                self.stats.full += 1
+                return
+        if free >= 0:
+            slot = free
+        # Сначала время, потом ключ: кто увидит ключ, увидит и его время
+        self._seen[slot] = seen
+        keys[slot] = user_id
+
+    def _find(self, user_id: int) -> int:
+        # Первый слот user_id по цепочке проб (его видят touch и
+        # last_seen) или -1
+        keys, mask = self._keys, self._mask
+        slot = self._home(user_id)
+        for _ in range(self.capacity):
+            key = keys[slot]
+            if key == user_id:
+                return slot
+            if key == EMPTY:
+                return -1
+            slot = (slot + 1) & mask
+        return -1
+
+    def last_seen(self, user_id: int) -> float | None:
+        slot = self._find(user_id)
+        return self._seen[slot] if slot >= 0 else None
+
+    def sample_many(self, k: int, except_user_id: int,
+                    deadline: float) -> list[int]:
+        '''
+        До k различных пользователей, активных после deadline, из индекса
+        последней очистки. Не больше k * SAMPLE_ATTEMPTS проб: если живых
+        в индексе мало, вернет меньше k.
+        '''
+        keys, seen, index = self._keys, self._seen, self._index
+        live = min(self._header[HEADER_LIVE], self.capacity)
+        found: dict[int, None] = {}  # Без повторов, в порядке выбора
+        positions: Iterable[int]
+        if live <= k * SAMPLE_ATTEMPTS:
+            # Индекс короче бюджета проб - обходим его целиком
+            positions = random.sample(range(live), live)
+        else:
+            positions = (random.randrange(live)
+                         for _ in range(k * SAMPLE_ATTEMPTS))
+        for position in positions:
+            # Индекс мог устареть: проверяем слот, на который он указывает
+            slot = index[position]
+            key = keys[slot]
+            if key > 0 and key != except_user_id and seen[slot] > deadline:
+                found[key] = None
+                if len(found) >= k:
+                    return list(found)
+        self.stats.short += 1
+        return list(found)
+
+    def sweep(self, start: int, stop: int,
+              deadline: float) -> tuple[int, list[int]]:
+        '''
+        Удаляет записи, истекшие к deadline, и задвоенные гонкой копии id
+        в слотах [start, stop) - от конца к началу. Вызывает только
+        владелец. Возвращает число удаленных записей и живые слоты.
+        '''
+        keys, seen, mask = self._keys, self._seen, self._mask
+        removed = 0
+        live: list[int] = []
+        for slot in range(stop - 1, start - 1, -1):
+            key = keys[slot]
+            if key == EMPTY:
+                continue
+            if key > 0:
+                first = self._find(key)
+                if 0 <= first != slot:
+                    # Копия после первого слота id: отметки идут в первый,
+                    # переносим туда более позднее время и удаляем копию
+                    seen[first] = max(seen[first], seen[slot])
+                    self.stats.merged += 1
+                elif seen[slot] > deadline:
+                    live.append(slot)
+                    continue
+                removed += 1
+            # Перед пустым слотом цепочка проб и так кончается - ставим
+            # пустой слот, иначе надгробие. Идем от конца, поэтому
+            # надгробия перед освободившимся слотом тоже уходят
+            following = keys[(slot + 1) & mask]
+            keys[slot] = EMPTY if following == EMPTY else TOMBSTONE
+            if key > 0 and first == slot and seen[slot] > deadline:
+                # Пока удаляли, пользователь отметился снова
+                keys[slot] = key
+                removed -= 1
+                live.append(slot)
+        return removed, live
+
+    def publish(self, slots: list[int]) -> None:
+        '''Записывает индекс живых слотов после очистки (только владелец)'''
+        live = min(len(slots), self.capacity)
+        self._index[:live] = memoryview(array('q', slots[:live]))
+        # Число - последним: читатель со старым числом увидит в хвосте
+        # устаревшие слоты, а их выборка проверяет
+        self._header[HEADER_LIVE] = live
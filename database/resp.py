@@ -0,0 +1,384 @@
+"""
+Минимальный клиент протокола Redis (RESP2) и заменитель сервера,
+работающий в том же процессе - для разработки и бенчмарков без Redis.
+"""
+import asyncio
+import fnmatch
+import math
+import random
+from collections import deque
+from typing import Any
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """Ошибка, которую вернул сервер (ответ вида -ERR ...)"""
+
+
+# Команда протокола: имя и аргументы
+Command = tuple[Any, ...]
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+def encode_command(command: Command) -> bytes:
+    parts = [_to_bytes(arg) for arg in command]
+    chunks = [b'*%d\r\n' % len(parts)]
+    for part in parts:
+        chunks.append(b'$%d\r\n%s\r\n' % (len(part), part))
+    return b''.join(chunks)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('Connection closed by server')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        return RespError(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f'Unknown reply type: {line!r}')
+
+
+class RespClient:
+    """
+    Клиент с одним соединением и автоматической конвейеризацией:
+    команды всех корутин пишутся в сокет сразу, а ответы разбираются
+    фоновой задачей по порядку отправки.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379,
+                 username: str | None = None, password: str | None = None,
+                 db: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.db = db
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self._reader_task: asyncio.Task | None = None
+        self._connecting = asyncio.Lock()
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RespClient':
+        '''redis://[[user]:password@]host[:port][/db]'''
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported scheme: {parsed.scheme!r}")
+        path = parsed.path.strip('/')
+        if path and not path.isdigit():
+            raise ValueError(f"Invalid database number: {path!r}")
+        return cls(host=parsed.hostname or 'localhost',
+                   port=parsed.port or 6379,
+                   username=(unquote(parsed.username)
+                             if parsed.username else None),
+                   password=(unquote(parsed.password)
+                             if parsed.password is not None else None),
+                   db=int(path or 0))
+
+    def _handshake(self) -> list[Command]:
+        '''Команды, с которых начинается каждое соединение'''
+        commands: list[Command] = []
+        if self.password is not None:
+            commands.append(('AUTH', self.username, self.password)
+                            if self.username else ('AUTH', self.password))
+        if self.db:
+            commands.append(('SELECT', self.db))
+        return commands
+
+    async def connect(self) -> None:
+        async with self._connecting:
+            if self._writer is not None:
+                return
+            reader, writer = await asyncio.open_connection(
+                self.host, self.port)
+            # AUTH и SELECT пишутся до того, как соединение увидят другие
+            # корутины: их команды уйдут уже после
+            loop = asyncio.get_running_loop()
+            handshake = self._handshake()
+            futures = [loop.create_future() for _ in handshake]
+            writer.write(b''.join(encode_command(c) for c in handshake))
+            self._waiters.extend(futures)
+            self._reader, self._writer = reader, writer
+            self._reader_task = asyncio.create_task(self._read_replies())
+            try:
+                await asyncio.gather(*futures)
+            except Exception:
+                await self.close()
+                raise
+
+    async def _read_replies(self) -> None:
+        assert self._reader is not None
+        try:
+            while True:
+                reply = await read_reply(self._reader)
+                waiter = self._waiters.popleft()
+                if waiter.done():
+                    continue
+                if isinstance(reply, RespError):
+                    waiter.set_exception(reply)
+                else:
+                    waiter.set_result(reply)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            self._fail_waiters(ConnectionError(str(error)))
+            self._writer = None
+
+    def _fail_waiters(self, error: Exception) -> None:
+        while self._waiters:
+            if not (waiter := self._waiters.popleft()).done():
+                waiter.set_exception(error)
+
+    async def _send(self, commands: list[Command]) -> list[asyncio.Future]:
+        if self._writer is None:
+            await self.connect()
+        assert self._writer is not None
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+        # Запись и постановка ожидающих без await между ними сохраняет
+        # соответствие порядка команд и порядка ответов
+        self._writer.write(b''.join(encode_command(c) for c in commands))
+        self._waiters.extend(futures)
+        return futures
+
+    async def execute(self, *command: Any) -> Any:
+        (future,) = await self._send([command])
+        return await future
+
+    async def pipeline(self, commands: list[Command]) -> list[Any]:
+        '''Отправляет пачку команд одной записью и ждет все ответы'''
+        if not commands:
+            return []
+        return list(await asyncio.gather(*await self._send(commands)))
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._fail_waiters(ConnectionError('Client closed'))
+
+
+# ----------------- Заменитель сервера для разработки -----------------
+
+def _encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RespError):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, bool):
+        return b':%d\r\n' % int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str) and value == 'OK':
+        return b'+OK\r\n'
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(
+            _encode_reply(item) for item in value)
+    data = _to_bytes(value)
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class RespServer:
+    """
+    Хранилище в памяти, понимающее подмножество команд Redis, которое
+    использует бот: строки, хэши и упорядоченные множества.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.strings: dict[bytes, bytes] = {}
+        self.hashes: dict[bytes, dict[bytes, bytes]] = {}
+        self.zsets: dict[bytes, dict[bytes, float]] = {}
+        self.commands_served = 0
+        self._server: asyncio.Server | None = None
+        # Открытые соединения и обслуживающие их задачи
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    @property
+    def url(self) -> str:
+        return f'redis://{self.host}:{self.port}/0'
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(),
+                                 return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = asyncio.current_task()  # type: ignore
+        try:
+            while True:
+                command = await read_reply(reader)
+                writer.write(_encode_reply(self.handle(command)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def handle(self, command: list[bytes]) -> Any:
+        self.commands_served += 1
+        name, args = command[0].decode().upper(), command[1:]
+        method = getattr(self, f'cmd_{name.lower()}', None)
+        if method is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return method(*args)
+        except (TypeError, ValueError) as error:
+            return RespError(f'ERR {error}')
+
+    def _delete(self, key: bytes) -> bool:
+        found = False
+        for space in (self.strings, self.hashes, self.zsets):
+            if space.pop(key, None) is not None:  # type: ignore[attr-defined]
+                found = True
+        return found
+
+    def cmd_ping(self, *args: bytes) -> Any:
+        return args[0] if args else 'PONG'
+
+    def cmd_select(self, db: bytes) -> Any:
+        # База у заменителя одна
+        if int(db) != 0:
+            return RespError('ERR DB index is out of range')
+        return 'OK'
+
+    def cmd_get(self, key: bytes) -> bytes | None:
+        return self.strings.get(key)
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes) -> str:
+        self.strings[key] = value
+        return 'OK'
+
+    def cmd_mget(self, *keys: bytes) -> list[bytes | None]:
+        return [self.strings.get(key) for key in keys]
+
+    def cmd_mset(self, *pairs: bytes) -> str:
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            self.strings[key] = value
+        return 'OK'
+
+    def cmd_del(self, *keys: bytes) -> int:
+        return sum(self._delete(key) for key in keys)
+
+    def cmd_exists(self, *keys: bytes) -> int:
+        return sum(key in self.strings or key in self.hashes
+                   or key in self.zsets for key in keys)
+
+    def cmd_keys(self, pattern: bytes) -> list[bytes]:
+        keys = [*self.strings, *self.hashes, *self.zsets]
+        return [key for key in keys
+                if fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+
+    def cmd_hset(self, key: bytes, *pairs: bytes) -> int:
+        fields = self.hashes.setdefault(key, {})
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+
+    def cmd_hget(self, key: bytes, field: bytes) -> bytes | None:
+        return self.hashes.get(key, {}).get(field)
+
+    def cmd_hmget(self, key: bytes, *fields: bytes) -> list[bytes | None]:
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def cmd_hdel(self, key: bytes, *fields: bytes) -> int:
+        values = self.hashes.get(key, {})
+        return sum(values.pop(field, None) is not None for field in fields)
+
+    def cmd_hgetall(self, key: bytes) -> list[bytes]:
+        return [item for pair in self.hashes.get(key, {}).items()
+                for item in pair]
+
+    def cmd_hlen(self, key: bytes) -> int:
+        return len(self.hashes.get(key, {}))
+
+    def cmd_zadd(self, key: bytes, *pairs: bytes) -> int:
+        members = self.zsets.setdefault(key, {})
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key: bytes, *members: bytes) -> int:
+        scores = self.zsets.get(key, {})
+        return sum(scores.pop(member, None) is not None
+                   for member in members)
+
+    def cmd_zcard(self, key: bytes) -> int:
+        return len(self.zsets.get(key, {}))
+
+    @staticmethod
+    def _bound(value: bytes, low: bool) -> float:
+        # Границы вида '(1.5' в Redis исключают само значение
+        if value.startswith(b'('):
+            bound = float(value[1:])
+            return math.nextafter(bound, math.inf if low else -math.inf)
+        return float(value)
+
+    def cmd_zrangebyscore(self, key: bytes, low: bytes, high: bytes,
+                          *options: bytes) -> list[bytes]:
+        low_value = self._bound(low, low=True)
+        high_value = self._bound(high, low=False)
+        members = sorted(
+            (score, member)
+            for member, score in self.zsets.get(key, {}).items()
+            if low_value <= score <= high_value)
+        if b'WITHSCORES' in (option.upper() for option in options):
+            return [item for score, member in members
+                    for item in (member, repr(score).encode())]
+        return [member for score, member in members]
+
+    def cmd_zremrangebyscore(self, key: bytes, low: bytes,
+                             high: bytes) -> int:
+        scores = self.zsets.get(key, {})
+        low_value = self._bound(low, low=True)
+        high_value = self._bound(high, low=False)
+        expired = [member for member, score in scores.items()
+                   if low_value <= score <= high_value]
+        for member in expired:
+            del scores[member]
+        return len(expired)
+
+    def cmd_zrandmember(self, key: bytes, count: bytes = b'1') -> Any:
+        members = list(self.zsets.get(key, {}))
+        return random.sample(members, min(int(count), len(members)))
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, Iterator, Mapping, Sequence
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (BaseStorage, DefaultKeyBuilder,
+                                      StateType, StorageKey)
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+
+from config_data.config import StorageConfig
+from database.db import OnlineUsers
+from database.resp import Command, RespClient, RespError
+from services.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# Запись FSM одного пользователя: (ключ, состояние, данные)
+FSMRecord = tuple[StorageKey, str | None, dict[str, Any]]
+# Поля StorageKey в порядке конструктора - компактная форма ключа в снимках
+KeyFields = tuple[Any, ...]
+
+
+class RespStorage(BaseStorage):
+    """
+    FSM-хранилище поверх протокола Redis. Ключи совпадают по формату с
+    aiogram.fsm.storage.redis.RedisStorage, поэтому несколько процессов
+    бота видят одно и то же состояние игроков.
+    """
+
+    def __init__(self, client: RespClient) -> None:
+        self.client = client
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True)
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RespStorage':
+        return cls(RespClient.from_url(url))
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    @staticmethod
+    def _state_name(state: StateType) -> str | None:
+        return state.state if isinstance(state, State) else state
+
+    def _set_state_command(self, key: StorageKey,
+                           state: StateType) -> Command:
+        state_name = self._state_name(state)
+        if state_name is None:
+            return ('DEL', self.key_builder.build(key, 'state'))
+        return ('SET', self.key_builder.build(key, 'state'), state_name)
+
+    def _set_data_command(self, key: StorageKey,
+                          data: Mapping[str, Any]) -> Command:
+        if not data:
+            return ('DEL', self.key_builder.build(key, 'data'))
+        return ('SET', self.key_builder.build(key, 'data'), json.dumps(data))
+
+    async def set_state(self, key: StorageKey,
+                        state: StateType = None) -> None:
+        await self.client.execute(*self._set_state_command(key, state))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        value = await self.client.execute(
+            'GET', self.key_builder.build(key, 'state'))
+        return value.decode() if value is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.client.execute(*self._set_data_command(key, data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        value = await self.client.execute(
+            'GET', self.key_builder.build(key, 'data'))
+        return json.loads(value) if value is not None else {}
+
+    async def get_many(self, keys: list[StorageKey]
+                       ) -> list[tuple[str | None, dict[str, Any]]]:
+        '''Состояния и данные нескольких игроков одним запросом MGET'''
+        names = [self.key_builder.build(key, part)
+                 for key in keys for part in ('state', 'data')]
+        values = await self.client.execute('MGET', *names)
+        return [
+            (state.decode() if state is not None else None,
+             json.loads(data) if data is not None else {})
+            for state, data in zip(values[::2], values[1::2])
+        ]
+
+    async def set_many(self, records: list[FSMRecord]) -> None:
+        '''Записывает состояния и данные нескольких игроков одной пачкой'''
+        await self.update_many(
+            states=[(key, state) for key, state, _ in records],
+            data=[(key, data) for key, _, data in records])
+
+    async def update_many(
+            self, states: Sequence[tuple[StorageKey, StateType]],
+            data: Sequence[tuple[StorageKey, Mapping[str, Any]]]) -> None:
+        '''Как set_many, но состояние и данные записываются по отдельности'''
+        commands = [self._set_state_command(key, state)
+                    for key, state in states]
+        commands += [self._set_data_command(key, value)
+                     for key, value in data]
+        if commands:
+            await self.client.pipeline(commands)
+
+
+def key_fields(key: StorageKey) -> KeyFields:
+    return (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+            key.business_connection_id, key.destiny)
+
+
+class LazyRecords(defaultdict[StorageKey, MemoryStorageRecord]):
+    """
+    Записи MemoryStorage. Восстановленные из снимка лежат в restored как
+    поля ключа -> (состояние, данные) и становятся MemoryStorageRecord при
+    первом обращении: сотни тысяч StorageKey при запуске создавались бы
+    дольше, чем читается весь снимок.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(MemoryStorageRecord)
+        self.restored: dict[KeyFields, tuple[str | None, dict[str, Any]]] = {}
+
+    def __missing__(self, key: StorageKey) -> MemoryStorageRecord:
+        if self.restored and (
+                item := self.restored.pop(key_fields(key), None)):
+            state, data = item
+            record = self[key] = MemoryStorageRecord(data=data, state=state)
+            return record
+        return super().__missing__(key)
+
+    def records(self) -> Iterator[tuple[KeyFields, str | None, dict]]:
+        '''Непустые записи, включая еще не тронутые восстановленные'''
+        for key, record in self.items():
+            if record.state is not None or record.data:
+                yield key_fields(key), record.state, record.data
+        for fields, (state, data) in self.restored.items():
+            yield fields, state, data
+
+
+class JournaledMemoryStorage(MemoryStorage):
+    """
+    MemoryStorage, отмечающая измененные ключи в journal: по нему снапшоты
+    дописывают в журнал только то, что поменялось с прошлой записи.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.storage: LazyRecords = LazyRecords()
+        self.journal: set[StorageKey] = set()
+
+    async def set_state(self, key: StorageKey,
+                        state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self.journal.add(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await super().set_data(key, data)
+        self.journal.add(key)
+
+
+def create_storage(config: StorageConfig,
+                   journaled: bool = False) -> BaseStorage:
+    '''
+    Создает FSM-хранилище, выбранное в конфиге. journaled - память с
+    журналом изменений для снапшотов (на redis не влияет).
+    '''
+    match config.backend:
+        case 'memory':
+            return JournaledMemoryStorage() if journaled else MemoryStorage()
+        case 'redis':
+            if not config.url:
+                raise ValueError('STORAGE_URL is required for redis backend')
+            return RespStorage.from_url(config.url)
+    raise ValueError(f'Unknown storage backend: {config.backend!r}')
+
+
+class SharedState:
+    """
+    Синхронизация данных процесса с общим хранилищем: онлайн-присутствие
+    (упорядоченное множество id по времени) и метаданные игровых сессий
+    (хэши sessions и players). Изменения копятся и отправляются одной
+    конвейерной пачкой раз в interval секунд.
+    """
+
+    PRESENCE_KEY = 'presence'
+    SESSIONS_KEY = 'sessions'
+    PLAYERS_KEY = 'players'
+    # Перекрытие окон чтения присутствия - на случай, если запись другого
+    # процесса с меньшей меткой времени дошла до сервера позже нашей
+    PULL_OVERLAP = 0.25
+
+    def __init__(self, client: RespClient, online_users: OnlineUsers,
+                 interval: float = 0.05) -> None:
+        self.client = client
+        self.online_users = online_users
+        self.interval = interval
+        self.sessions_started: dict[tuple[int, int], float] = {}
+        self.sessions_finished: set[tuple[int, int]] = set()
+        self._last_pull = time.time()
+        # Журнал изменений присутствия ведет сам OnlineUsers
+        online_users.journal = set()
+
+    def session_started(self, session_id: tuple[int, int]) -> None:
+        self.sessions_finished.discard(session_id)
+        self.sessions_started[session_id] = time.time()
+
+    def session_finished(self, session_id: tuple[int, int]) -> None:
+        self.sessions_started.pop(session_id, None)
+        self.sessions_finished.add(session_id)
+
+    def _collect(self, now: float) -> list[Command]:
+        commands: list[Command] = []
+        journal = self.online_users.journal
+        if journal:
+            commands.append(('ZADD', self.PRESENCE_KEY, *(
+                item for user_id in journal for item in (now, user_id))))
+            journal.clear()
+        # Сначала удаления: игрок мог завершить одну игру и начать другую
+        for session_id in self.sessions_finished:
+            name = f'{session_id[0]}:{session_id[1]}'
+            commands.append(('HDEL', self.SESSIONS_KEY, name))
+            commands.append(('HDEL', self.PLAYERS_KEY, *session_id))
+        for session_id, started in self.sessions_started.items():
+            name = f'{session_id[0]}:{session_id[1]}'
+            commands.append(('HSET', self.SESSIONS_KEY, name,
+                             json.dumps({'started': started})))
+            commands.append(('HSET', self.PLAYERS_KEY,
+                             session_id[0], name, session_id[1], name))
+        self.sessions_started.clear()
+        self.sessions_finished.clear()
+        # Истекшее присутствие убирает любой процесс, это идемпотентно
+        commands.append(('ZREMRANGEBYSCORE', self.PRESENCE_KEY, '-inf',
+                         now - self.online_users.online_duration))
+        # Кто был активен в других процессах с прошлой синхронизации
+        commands.append(('ZRANGEBYSCORE', self.PRESENCE_KEY,
+                         f'({self._last_pull}', '+inf'))
+        return commands
+
+    async def sync(self) -> None:
+        now = time.time()
+        replies = await self.client.pipeline(self._collect(now))
+        self._last_pull = now - self.PULL_OVERLAP
+        for user_id in replies[-1]:
+            self.online_users.set_online(int(user_id), replicate=False)
+
+    async def is_playing(self, user_ids: list[int]) -> list[bool]:
+        '''Находятся ли игроки в сессии в каком-либо процессе'''
+        if not user_ids:
+            return []
+        sessions = await self.client.execute('HMGET', self.PLAYERS_KEY,
+                                             *user_ids)
+        return [session is not None for session in sessions]
+
+
+async def shared_state_task(shared_state: SharedState) -> None:
+    """Периодически синхронизирует процесс с общим хранилищем."""
+    while True:
+        await asyncio.sleep(shared_state.interval)
+        try:
+            await shared_state.sync()
+        except ConnectionError as error:
+            logger.warning('Shared state sync failed', error=error)
+        except RespError as error:
+            # Сервер отклонил команду пачки - повторим со следующей
+            logger.error('Shared state sync rejected', error=error)
@@ -1,6 +1,7 @@
 from aiogram import Router
 from aiogram.types import Message
 from lexicon.lexicon_ru import LEXICON
+from services.outbound import outbound
 
 router = Router()
 
@@ -8,4 +9,4 @@ router = Router()
 # Хэндлер для сообщений, которые не попали в другие хэндлеры
 @router.message()
 async def send_answer(message: Message):
-    await message.answer(text=LEXICON["other_answer"])
+    await outbound.answer(message, text=LEXICON["other_answer"])
@@ -1,106 +1,85 @@
-import asyncio
 from aiogram import F, Router
-from aiogram.types import CallbackQuery
+from aiogram.types import CallbackQuery, Message
 from lexicon.lexicon_ru import LEXICON, LEXICON_MOVES
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
+from services.outbound import outbound
 from states.states import FSMPlay
-from .game_managers import GameMaster
-from utils.enums import PlayerCode
+from .game_managers import HANDS, Consent, GameSession, Keep, Move
 
 
 router = Router()
 
 
+# Обработчики только передают нажатия в почтовый ящик игровой сессии и
+# сразу возвращаются: ожидания, таймауты и ход игры ведет GameSession
+
+
 @router.callback_query(F.data == "start_game",
                        StateFilter(FSMPlay.waiting_game_start))
 async def process_start_game(callback: CallbackQuery, state: FSMContext):
     try:
-        opponent_id = await GameMaster.get_opponent_id(callback, state)
+        session = await GameSession.from_callback(callback, state)
     except KeyError:
         return  # Если соперник не найден, выходим из функции
-
-    game_master = GameMaster(callback, state, opponent_id)
-
-    # Обновляем данные пользователя о готовности к игре
-    await game_master.update_date(whom=PlayerCode.USER, ready_to_play=True)
-
-    # Если задача на ожидание согласия соперника уже запущена соперником, то...
-    if game_master.session.running_tasks.get('wait_opponent_consent_task'):
-        await game_master.start_first_hand_round()  # Запускаем первый раунд
-        return  # Выходим из функции, так как соперник уже запустил задачу
-
-    try:  # Запускаем задачу на ожидание согласия соперника (с таймаутом)
-        await game_master.run_waiting_opponent_consent_task(timeout=10)
-    except asyncio.CancelledError:  # Соперник отменил игру
-        pass  # Ничего не делаем, так как игра уже завершена противником
-    except asyncio.TimeoutError:  # Слишком долго ждем ответа от соперника
-        await game_master.react_to_timeout(who_timeout=PlayerCode.OPPONENT)
-    else:  # Соперник согласился на игру, запускаем первый раунд игры
-        await game_master.start_first_hand_round()
-        # Паралелльно запускаем задачу ожидающую выбора обеих рук (с таймаутом)
-        # Если игрок не успевает сделать выбор, то он проигрывает раунд
-        # Если оба игрока сделали выбор, то запускаем раунд выбора руки
-        await game_master.run_delayed_start_hand_choice_round_task(timeout=10)
-    finally:  # Убиваем задачу ожидания согласия соперника, если она не умерла
-        game_master.session.kill_task('wait_opponent_consent_task')
+    # Сообщаем о готовности к игре. Первый согласившийся ждет соперника,
+    # второй запускает первый раунд
+    if not session.post(Consent(callback.from_user.id, accepted=True)):
+        # Исполнитель перегружен: игра не начата, кнопку можно нажать снова
+        message: Message = callback.message  # type: ignore[assignment]
+        await outbound.answer(message, text=LEXICON['server_busy'])
 
 
 @router.callback_query(F.data == "refuse",
                        StateFilter(FSMPlay.waiting_game_start))
 async def process_refuse_game(callback: CallbackQuery, state: FSMContext):
     try:
-        opponent_id = await GameMaster.get_opponent_id(callback, state)
+        session = await GameSession.from_callback(callback, state)
     except KeyError:
         return  # Если соперник не найден, выходим из функции
-
-    game_master = GameMaster(callback, state, opponent_id)
     # Пользователь отказался от игры
-    await game_master.react_to_cancellation(who_cancelled=PlayerCode.USER)
+    session.post(Consent(callback.from_user.id, accepted=False))
 
 
 @router.callback_query(F.data.in_(LEXICON_MOVES.keys()),
                        StateFilter(FSMPlay.choice_action_for_first_hand))
 async def process_first_hand(callback: CallbackQuery, state: FSMContext):
     try:
-        opponent_id = await GameMaster.get_opponent_id(callback, state)
+        session = await GameSession.from_callback(callback, state,
+                                                  create=False)
     except KeyError:
-        return  # Если соперник не найден, выходим из функции
-
-    game_master = GameMaster(callback, state, opponent_id)
-    # Обработка первого хода
-    await game_master.process_first_hand()
-    # Запускаем второй раунд (выбор действия у второй руки)
-    await game_master.start_second_hand_round()
+        return  # Если игра уже закончилась, выходим из функции
+    # Сессия запомнит ход и запустит второй раунд
+    session.post(Move(callback.from_user.id, 'first_hand',
+                      str(callback.data)))
 
 
 @router.callback_query(F.data.in_(LEXICON_MOVES.keys()),
                        StateFilter(FSMPlay.choice_action_for_second_hand))
 async def process_second_hand(callback: CallbackQuery, state: FSMContext):
     try:
-        opponent_id = await GameMaster.get_opponent_id(callback, state)
+        session = await GameSession.from_callback(callback, state,
+                                                  create=False)
     except KeyError:
-        return  # Если соперник не найден, выходим из функции
-
-    game_master = GameMaster(callback, state, opponent_id)
-    # Обработка второго хода
-    await game_master.process_second_hand()
+        return  # Если игра уже закончилась, выходим из функции
+    session.post(Move(callback.from_user.id, 'second_hand',
+                      str(callback.data)))
 
     # А третий раунд запускается автоматически только после того,
     # как оба игрока сделают ходы (либо конец игры с выводом победителя)
-    # Вся логика таймера в .game_managers: GameMaster.wait_for_hands_completion
-
+    # Вся логика таймера в .game_managers: GameSession._on_move
 
-# @router.callback_query(F.data.in_('first_hand', 'second_hand'),
-#                        StateFilter(FSMPlay.choice_hand))
-# async def process_hand_choice(callback: CallbackQuery, state: FSMContext):
-#     try:
-#         opponent_id = await GameMaster.get_opponent_id(callback, state)
-#     except KeyError:
-#         return  # Если соперник не найден, выходим из функции
-
-#     game_master = GameMaster(callback, state, opponent_id)
 
+@router.callback_query(F.data.in_(HANDS),
+                       StateFilter(FSMPlay.choice_hand))
+async def process_hand_choice(callback: CallbackQuery, state: FSMContext):
+    try:
+        session = await GameSession.from_callback(callback, state,
+                                                  create=False)
+    except KeyError:
+        return  # Если игра уже закончилась, выходим из функции
+    # Когда руки оставят оба, сессия сравнит их и объявит итог
+    session.post(Keep(callback.from_user.id, str(callback.data)))
 
 
 # # Этот хэндлер срабатывает на любую из игровых кнопок
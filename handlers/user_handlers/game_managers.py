@@ -1,37 +1,536 @@
 import asyncio
+import sys
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from dataclasses import asdict, dataclass, field
 from aiogram import Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import default_state
-from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
 from lexicon.lexicon_ru import LEXICON, LEXICON_MOVES
+from database.history import MatchHistory, MatchRecord
+from database.storage import RespStorage, SharedState
 from keyboards.keyboards import create_inline_kb
+from services.countdown import countdown
+from services.executor import game_executor
+from services.logs import get_logger, lazy
+from services.metrics import metrics
+from services.outbound import Priority, outbound
+from services.rating import ratings
+from services.rules import rules
+from services.timers import Timer, timer_wheel
 from states.states import FSMPlay
-from utils.enums import PlayerCode
-from typing import TypeAlias
+from utils.enums import GamePhase, MatchOutcome, PlayerCode, RoundResult
+from typing import Any, Awaitable, Callable, Iterable, TypeAlias
 
 
+logger = get_logger(__name__)
+
+
+# Действие над одним из игроков для GameMaster.batch: (адресат, операция)
+PlayerAction: TypeAlias = tuple[PlayerCode, Awaitable[Any]]
+
+# Руки в порядке выбора ходов
+HANDS = ('first_hand', 'second_hand')
+
+
+@dataclass(frozen=True)
+class Consent:
+    '''Игрок согласился на игру (accepted) или отказался от нее'''
+    user_id: int
+    accepted: bool
+
+
+@dataclass(frozen=True)
+class Move:
+    '''Игрок выбрал ход для одной из рук'''
+    user_id: int
+    hand: str  # Одна из HANDS
+    move: str  # Ключ LEXICON_MOVES
+
+
+@dataclass(frozen=True)
+class Keep:
+    '''Игрок выбрал руку, которую оставляет'''
+    user_id: int
+    hand: str  # Одна из HANDS
+
+
+@dataclass(frozen=True)
+class Timeout:
+    '''Истекло ожидание name ('consent', 'hands' или 'choice')'''
+    name: str
+
+
+# События, которые обрабатывает GameSession
+GameEvent: TypeAlias = Consent | Move | Keep | Timeout
+
+# Типы событий по имени - для восстановления почтового ящика из снапшота
+EVENT_TYPES: dict[str, type[GameEvent]] = {
+    event_type.__name__: event_type
+    for event_type in (Consent, Move, Keep, Timeout)}
+
+# Время обработки событий сессией, по типам событий
+EVENT_SECONDS = metrics.histogram(
+    'bot_game_event_seconds', 'Game session event handling time, seconds',
+    labels=('event',))
+_event_seconds = {event_type: EVENT_SECONDS.labels(name)
+                  for name, event_type in EVENT_TYPES.items()}
+TIMEOUTS = metrics.counter('bot_game_timeouts_total',
+                           'Expired game waits by type', labels=('name',))
+
+# Сообщения ожидания согласия: у того, кто ждет, и у того, кого ждут
+WAITING_TEMPLATE = LEXICON['waiting_opponent'] + "\n" + LEXICON['seconds_left']
+WAITED_TEMPLATE = (LEXICON['user_wait_you'] + "\n" +
+                   LEXICON['game_will_cancel'])
+
+
+@dataclass
+class PlayerRecord:
+    '''Еще не записанные в хранилище изменения FSM игрока'''
+    key: StorageKey
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    # Состояние и данные пишутся по отдельности, чтобы не затереть то,
+    # что мы не меняли
+    state_dirty: bool = False
+    data_dirty: bool = False
+
+
+@dataclass
+class SessionStats:
+    created: int = 0
+    expired: int = 0  # Удалены сборщиком: давно не было событий
+    evicted: int = 0  # Вытеснены самыми давними при достижении лимита
+    peak: int = 0  # Наибольшее число живых сессий
+
+
+# Игровая сессия - актор: события обоих игроков попадают в почтовый ящик
+# и обрабатываются строго по одному, так что состояние игры меняет только
+# задача сессии. Обработчики лишь кладут события и сразу возвращаются
 class GameSession:
 
     # Уникальный идентификатор сессии (tuple из двух id)
     SessionId: TypeAlias = tuple[int, int]
 
-    # Хранилище сеансов по уникальному идентификатору (tuple из двух id)
-    sessions: dict[SessionId, 'GameSession'] = {}
+    # Хранилище сеансов по уникальному идентификатору (tuple из двух id).
+    # Упорядочено по последней активности: в начале - самые давние
+    sessions: OrderedDict[SessionId, 'GameSession'] = OrderedDict()
+
+    # Индекс игроков, находящихся в сессии: user_id -> id сессии
+    players: dict[int, SessionId] = {}
+
+    # Общее хранилище, куда публикуются метаданные сессий (если задано)
+    shared_state: SharedState | None = None
+
+    # Сессии, изменившиеся с прошлой записи снапшота (None - снапшоты
+    # не ведутся)
+    journal: set[SessionId] | None = None
+
+    # История игр, куда пишутся итоги удаляемых сессий (если задана)
+    history: MatchHistory | None = None
+
+    # Обращения к хранилищу по типам событий: имя -> счетчик операций
+    storage_ops: dict[str, Counter[str]] = defaultdict(Counter)
+
+    # Сколько ждать согласия соперника, ходов обеих рук и выбора
+    # оставляемой руки, с
+    consent_timeout: float = 10
+    hands_timeout: float = 10
+    choice_timeout: float = 10
+
+    # Через сколько секунд без событий сессия считается брошенной и
+    # сколько сессий может жить одновременно
+    session_ttl: float = 300
+    max_sessions: int = 100_000
+    stats = SessionStats()
 
-    def __init__(self, session_id: SessionId):
+    # Сессии, чей почтовый ящик сейчас разбирается
+    running: int = 0
+
+    def __init__(self, session_id: SessionId, bot: Bot,
+                 storage: BaseStorage):
         self.session_id = session_id
-        self.lock = asyncio.Lock()  # Блокировка для атомарных операций
-        self.__class__.sessions[session_id] = self
-        self.running_tasks: dict[str, asyncio.Task] = {}
+        self.bot = bot
+        self.storage = storage
+        self.last_activity = time.monotonic()
+        sessions = self.__class__.sessions
+        if len(sessions) >= self.max_sessions:
+            # Лимит достигнут - вытесняем самую давно неактивную сессию
+            next(iter(sessions.values())).evict()
+            self.stats.evicted += 1
+        sessions[session_id] = self
+        self.stats.created += 1
+        self.stats.peak = max(self.stats.peak, len(sessions))
+        for user_id in session_id:
+            self.__class__.players[user_id] = session_id
+        if self.shared_state is not None:
+            self.shared_state.session_started(session_id)
+        # Почтовый ящик и задание исполнителя, которое его разбирает
+        self.mailbox: deque[GameEvent] = deque()
+        self._runner: asyncio.Future | None = None
+        # Состояние игры живет здесь. FSM игроков только повторяет фазу,
+        # чтобы фильтры обработчиков пропускали нужные кнопки
+        self.phase = GamePhase.NEW
+        self.initiator: int = session_id[0]  # Кто первым согласился
+        self.moves: dict[int, dict[str, str]] = {
+            user_id: {} for user_id in session_id}
+        self.kept: dict[int, str] = {}  # user_id -> оставленная рука
+        # Сообщения с обратным отсчетом: user_id -> message_id
+        self.countdown_messages: dict[int, int] = {}
+        # Идущие ожидания с таймаутом: имя -> таймер в общем колесе
+        self.timers: dict[str, Timer] = {}
+        # Итог игры; None при удалении сессии означает, что ее бросили
+        self.outcome: MatchOutcome | None = None
+        self.winner: int | None = None  # Также выигравший из-за неявки
+        # Кого известить об итоге при удалении сессии (например, турнир)
+        self.on_finish: Callable[[MatchRecord], None] | None = None
+
+    @classmethod
+    async def from_callback(cls, callback: CallbackQuery,
+                            context: FSMContext,
+                            create: bool = True) -> 'GameSession':
+        '''
+        Сессия игрока, нажавшего кнопку. Если он еще не в сессии и create,
+        сессия создается с соперником из его данных FSM. Если соперника
+        нет - сообщает об этом и поднимает KeyError.
+        '''
+        user_id = callback.from_user.id
+        if (session_id := cls.players.get(user_id)) is not None:
+            return cls.sessions[session_id]
+        opponent_id = None
+        if create:
+            ops = cls.storage_ops['from_callback']
+            ops.update(get_data=1, events=1)
+            opponent_id = (await context.get_data()).get('opponent_id')
+        message: Message = callback.message  # type: ignore[assignment]
+        if opponent_id is None:
+            await outbound.answer(message, text=LEXICON['opponent_not_found'])
+            await context.clear()
+            raise KeyError('opponent_id')
+        return cls(cls.generate_session_id(user_id, opponent_id),
+                   message.bot, context.storage)  # type: ignore[arg-type]
+
+    def post(self, event: GameEvent) -> bool:
+        '''
+        Кладет событие в почтовый ящик сессии. Ящик разбирает общий
+        исполнитель game_executor. Если он перегружен, новая игра не
+        начинается: событие отбрасывается и возвращается False.
+        '''
+        self.mailbox.append(event)
+        self.touch()
+        if self._runner is None or self._runner.done():
+            # Начатые игры доигрываем при любой нагрузке
+            critical = not (isinstance(event, Consent) and event.accepted
+                            and self.phase is GamePhase.NEW)
+            runner = game_executor.submit(self._drain, critical)
+            if runner is None:
+                self.mailbox.pop()
+                return False
+            self._runner = runner
+        return True
+
+    async def join(self) -> None:
+        '''Дожидается, пока сессия обработает все полученные события'''
+        while self._runner is not None and not self._runner.done():
+            await self._runner
+
+    async def _drain(self) -> None:
+        GameSession.running += 1
+        try:
+            while self.mailbox:
+                event = self.mailbox.popleft()
+                start = time.perf_counter()
+                try:
+                    await self.handle(event)
+                except Exception:
+                    logger.exception('Game session failed',
+                                     session=self.session_id,
+                                     game_event=event)
+                _event_seconds[type(event)].observe(
+                    time.perf_counter() - start)
+        finally:
+            GameSession.running -= 1
+
+    async def handle(self, event: GameEvent) -> None:
+        '''Обрабатывает одно событие (вызывается только из _drain)'''
+        if self.phase is GamePhase.FINISHED:
+            return  # Поздние нажатия и таймеры уже закончившейся игры
+        # Таймауты обрабатываются со стороны того, кто ждал соперника
+        user_id = (self.initiator if isinstance(event, Timeout)
+                   else event.user_id)
+        master = GameMaster(self, user_id)
+        try:
+            match event:
+                case Consent(accepted=True):
+                    await self._on_consent(master)
+                case Consent(accepted=False):
+                    await self._on_refuse(master)
+                case Move():
+                    await self._on_move(master, event)
+                case Keep():
+                    await self._on_keep(master, event)
+                case Timeout(name=name):
+                    await self._on_timeout(master, name)
+        finally:
+            await master.flush()
+            if self.journal is not None:
+                self.journal.add(self.session_id)
+            ops = self.storage_ops[type(event).__name__]
+            ops.update(master.ops)
+            ops['events'] += 1
+
+    async def _on_consent(self, master: 'GameMaster') -> None:
+        match self.phase:
+            case GamePhase.NEW:  # Первый согласившийся ждет соперника
+                self.initiator = master.user_id
+                self.phase = GamePhase.CONSENT
+                self._arm('consent', self.consent_timeout)
+                await master.start_consent_wait(self.consent_timeout)
+            case GamePhase.CONSENT if master.user_id != self.initiator:
+                # Согласились оба - начинается выбор ходов
+                self._stop_consent_wait()
+                self.phase = GamePhase.MOVES
+                self._arm('hands', self.hands_timeout)
+                await master.start_first_hand_round(whom=PlayerCode.BOTH)
+
+    async def _on_refuse(self, master: 'GameMaster') -> None:
+        self._stop_consent_wait()
+        await master.react_to_cancellation(who_cancelled=PlayerCode.USER)
+
+    async def _on_move(self, master: 'GameMaster', event: Move) -> None:
+        hands = self.moves[master.user_id]
+        # Руки выбираются по очереди и только пока идет выбор ходов
+        if (self.phase is not GamePhase.MOVES or len(hands) == len(HANDS)
+                or event.hand != HANDS[len(hands)]):
+            return  # Повторное или запоздавшее нажатие
+        hands[event.hand] = event.move
+        if event.hand == 'first_hand':
+            await master.start_second_hand_round()
+            return
+        await master.set_state(whom=PlayerCode.USER,
+                               state_type=FSMPlay.both_hands_ready)
+        if all(len(moves) == len(HANDS) for moves in self.moves.values()):
+            self._cancel('hands')
+            await self._end_moves(master)
+
+    async def _on_keep(self, master: 'GameMaster', event: Keep) -> None:
+        if (self.phase is not GamePhase.HAND_CHOICE
+                or master.user_id in self.kept or event.hand not in HANDS):
+            return  # Повторное или запоздавшее нажатие
+        self.kept[master.user_id] = event.hand
+        if len(self.kept) == len(self.session_id):
+            self._cancel('choice')
+            await master.resolve_hand_choice(PlayerCode.BOTH)
+
+    async def _on_timeout(self, master: 'GameMaster', name: str) -> None:
+        if name == 'consent' and self.phase is GamePhase.NEW:
+            # Игра назначена (см. expect_start), но никто не согласился
+            await master.react_to_timeout(who_timeout=PlayerCode.BOTH)
+        elif name == 'consent' and self.phase is GamePhase.CONSENT:
+            # Соперник того, кто согласился первым, не ответил
+            self._stop_consent_wait()
+            await master.react_to_timeout(who_timeout=PlayerCode.OPPONENT)
+        elif name == 'hands' and self.phase is GamePhase.MOVES:
+            await self._end_moves(master)
+        elif name == 'choice' and self.phase is GamePhase.HAND_CHOICE:
+            await master.resolve_hand_choice(master.players_kept())
+
+    async def _end_moves(self, master: 'GameMaster') -> None:
+        '''Оба игрока выбрали ходы или время вышло: ведет игру дальше'''
+        players_ready = master.players_ready()
+        if players_ready is PlayerCode.BOTH:
+            self.phase = GamePhase.HAND_CHOICE
+            self._arm('choice', self.choice_timeout)
+        await master.resolve_hands_round(players_ready)
+
+    def _arm(self, name: str, timeout: float) -> None:
+        '''Через timeout секунд в почтовый ящик придет Timeout(name)'''
+        self._cancel(name)  # Прежнее ожидание с тем же именем заменяется
+        self.timers[name] = timer_wheel.schedule(timeout, self._expire, name)
+
+    def expect_start(self, timeout: float) -> None:
+        '''
+        Игра назначена, а не выбрана игроками: если за timeout секунд
+        никто не согласится, оба получат поражение из-за неявки.
+        '''
+        if self.phase is GamePhase.NEW:
+            self._arm('consent', timeout)
+
+    def _expire(self, name: str) -> None:
+        self.timers.pop(name, None)
+        TIMEOUTS.labels(name).inc()
+        self.post(Timeout(name))
+
+    def _cancel(self, name: str) -> None:
+        if (timer := self.timers.pop(name, None)) is not None:
+            timer_wheel.cancel(timer)
+
+    def _register_countdown(self, deadline: float) -> None:
+        '''Отдает сообщения ожидания согласия сервису обратного отсчета'''
+        for user_id, message_id in self.countdown_messages.items():
+            template = (WAITING_TEMPLATE if user_id == self.initiator
+                        else WAITED_TEMPLATE)
+            countdown.register(self.bot, user_id, message_id, template,
+                               deadline)
+
+    def _stop_consent_wait(self) -> None:
+        self._cancel('consent')
+        # Сообщения остаются (их удаляет react_to_timeout), но секунды в
+        # них больше не обновляются
+        for user_id, message_id in self.countdown_messages.items():
+            countdown.unregister(user_id, message_id)
+
+    def opponent_of(self, user_id: int) -> int:
+        first, second = self.session_id
+        return second if user_id == first else first
+
+    def touch(self) -> None:
+        '''Отмечает активность: сессия переезжает в конец очереди, O(1)'''
+        self.last_activity = time.monotonic()
+        if self.session_id in self.sessions:
+            self.sessions.move_to_end(self.session_id)
+        if self.journal is not None:
+            self.journal.add(self.session_id)
+
+    def evict(self) -> None:
+        '''
+        Удаляет сессию без сообщений игрокам. Их FSM не трогаем: кнопки
+        брошенной игры ответят "соперник не найден" и сбросят состояние.
+        '''
+        self.mailbox.clear()  # Задание, разбирающее ящик, сразу закончится
+        self.delete()
+
+    @classmethod
+    def sweep(cls, budget: int | None = None) -> int:
+        '''
+        Удаляет сессии без событий дольше session_ttl. Просматривает
+        только истекшие с начала очереди и не более budget за вызов.
+        Возвращает число удаленных сессий.
+        '''
+        deadline = time.monotonic() - cls.session_ttl
+        sessions = cls.sessions
+        removed = 0
+        while sessions and (budget is None or removed < budget):
+            session = next(iter(sessions.values()))
+            if session.last_activity > deadline:
+                break  # Дальше только активные сессии
+            session.evict()
+            removed += 1
+        cls.stats.expired += removed
+        return removed
+
+    def memory_size(self) -> int:
+        '''Примерный объем памяти сессии в байтах'''
+        containers = (self.__dict__, self.mailbox, self.moves, self.kept,
+                      self.countdown_messages, self.timers,
+                      *self.moves.values())
+        return (sys.getsizeof(self)
+                + sum(sys.getsizeof(item) for item in containers)
+                + sum(sys.getsizeof(timer) for timer in self.timers.values()))
+
+    @classmethod
+    def metrics(cls) -> dict[str, int]:
+        '''
+        Счетчики реестра сессий и примерный объем занятой им памяти.
+        Обходит все живые сессии, поэтому для частых вызовов не годится.
+        '''
+        sessions = list(cls.sessions.values())
+        memory = (sys.getsizeof(cls.sessions) + sys.getsizeof(cls.players)
+                  + sum(session.memory_size() for session in sessions))
+        return {
+            'live': len(sessions),
+            'players': len(cls.players),
+            'mailbox': sum(len(session.mailbox) for session in sessions),
+            'timers': sum(len(session.timers) for session in sessions),
+            'memory_bytes': memory,
+            **asdict(cls.stats),
+        }
 
-    def kill_task(self, task_name: str) -> None:
-        if task := self.running_tasks.get(task_name):
-            task.cancel()
-            del self.running_tasks[task_name]
+    def to_dict(self) -> dict[str, Any]:
+        '''Состояние сессии для снапшота; моменты времени - по time.time'''
+        now = time.time()
+        return {
+            'id': list(self.session_id),
+            'phase': self.phase.name,
+            'initiator': self.initiator,
+            # Копии: снимок сериализуется в другом потоке
+            'moves': [[user_id, dict(moves)]
+                      for user_id, moves in self.moves.items()],
+            'kept': list(self.kept.items()),
+            'countdown': list(self.countdown_messages.items()),
+            'timers': {name: now + timer_wheel.remaining(timer)
+                       for name, timer in self.timers.items()},
+            'mailbox': [[type(event).__name__, asdict(event)]
+                        for event in self.mailbox],
+            'active': now - (time.monotonic() - self.last_activity),
+        }
 
-    async def delete(self) -> None:
-        del self.__class__.sessions[self.session_id]
+    @classmethod
+    def from_dict(cls, value: dict[str, Any], bot: Bot,
+                  storage: BaseStorage) -> 'GameSession':
+        '''
+        Восстанавливает сессию из снапшота: таймеры заводятся на
+        оставшееся время (истекшие сработают на ближайшем тике), а
+        непрочитанные события снова попадают в почтовый ящик.
+        '''
+        session = cls(tuple(value['id']),  # type: ignore[arg-type]
+                      bot, storage)
+        session.phase = GamePhase[value['phase']]
+        session.initiator = value['initiator']
+        session.moves = dict(value['moves'])
+        session.kept = dict(value.get('kept', ()))
+        session.countdown_messages = dict(value['countdown'])
+        now, monotonic_now = time.time(), time.monotonic()
+        session.last_activity = monotonic_now - (now - value['active'])
+        for name, deadline in value['timers'].items():
+            session._arm(name, max(deadline - now, 0))
+            if name == 'consent':
+                session._register_countdown(monotonic_now + deadline - now)
+        for name, fields in value['mailbox']:
+            session.post(EVENT_TYPES[name](**fields))
+        return session
+
+    def match_record(self) -> MatchRecord:
+        player1, player2 = self.session_id
+        moves1, moves2 = self.moves[player1], self.moves[player2]
+        return MatchRecord(
+            finished_at=time.time(), player1=player1, player2=player2,
+            first_hand1=moves1.get('first_hand'),
+            second_hand1=moves1.get('second_hand'),
+            first_hand2=moves2.get('first_hand'),
+            second_hand2=moves2.get('second_hand'),
+            winner=self.winner,
+            outcome=(self.outcome if self.outcome is not None
+                     else MatchOutcome.ABANDONED))
+
+    def delete(self) -> None:
+        if self.phase is not GamePhase.FINISHED:
+            match = self.match_record()
+            # Сессию, в которой никто ничего не успел, в итоги не пишем
+            if self.outcome is not None or self.phase is not GamePhase.NEW:
+                ratings.apply(match)
+                if self.history is not None:
+                    self.history.record(match)
+            if self.on_finish is not None:
+                self.on_finish(match)
+        if self.journal is not None:
+            self.journal.add(self.session_id)
+        self.phase = GamePhase.FINISHED
+        for name in list(self.timers):
+            self._cancel(name)
+        self._stop_consent_wait()
+        self.__class__.sessions.pop(self.session_id, None)
+        for user_id in self.session_id:
+            if self.__class__.players.get(user_id) == self.session_id:
+                del self.__class__.players[user_id]
+        if self.shared_state is not None:
+            self.shared_state.session_finished(self.session_id)
+
+    @classmethod
+    def is_playing(cls, user_id: int) -> bool:
+        return user_id in cls.players
 
     @staticmethod
     def generate_session_id(user_id: int, opponent_id: int) -> SessionId:
@@ -40,276 +539,353 @@ class GameSession:
         return (ids[0], ids[1])
 
 
+metrics.collect('bot_game_sessions', 'Live game sessions',
+                lambda: len(GameSession.sessions))
+metrics.collect('bot_game_sessions_running',
+                'Game sessions with a running mailbox task',
+                lambda: GameSession.running)
+# Обходит все сессии - считается только при опросе
+metrics.collect('bot_game_mailbox_events',
+                'Events waiting in game session mailboxes',
+                lambda: sum(len(session.mailbox)
+                            for session in GameSession.sessions.values()))
+metrics.collect('bot_game_sessions_removed_total',
+                'Game sessions removed before finishing, by reason',
+                lambda: {('expired',): GameSession.stats.expired,
+                         ('evicted',): GameSession.stats.evicted},
+                kind='counter', labels=('reason',))
+
+
+async def session_gc_task(interval: float = 10,
+                          sweep_budget: int = 1000) -> None:
+    """
+    Периодически удаляет брошенные игровые сессии (см. GameSession.sweep).
+    За один шаг удаляет не более sweep_budget сессий и отдает управление
+    циклу событий.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        removed = 0
+        while (swept := GameSession.sweep(sweep_budget)) == sweep_budget:
+            removed += swept
+            await asyncio.sleep(0)
+        removed += swept
+        if removed:
+            # Метрики обходят все сессии - только если запись попадет в лог
+            logger.debug('Game sessions expired', removed=removed,
+                         sessions=lazy(GameSession.metrics))
+
+
+# Действия игры со стороны одного игрока (USER) против соперника
+# (OPPONENT): сообщения и запись состояний FSM. Что и когда делать,
+# решает GameSession
 class GameMaster:
-    def __init__(self,
-                 callback: CallbackQuery,
-                 context: FSMContext,
-                 opponent_id: int):
-        self.callback: CallbackQuery = callback
-        self.message: Message = callback.message  # type: ignore[assignment]
-        self.bot: Bot = self.message.bot  # type: ignore[assignment]
-        self.user_context: FSMContext = context
-        self.user_id: int = self._get_user_id()
-        self.opponent_id: int = opponent_id
-        self.opponent_context: FSMContext = self._get_context(opponent_id)
-
-        self.session_id = GameSession.generate_session_id(self.user_id,
-                                                          self.opponent_id)
-        # Получаем или создаем игровую сессию
-        if session := GameSession.sessions.get(self.session_id):
-            self.session = session
-        else:  # Если сессии нет, создаем новую сессию
-            self.session = GameSession(session_id=self.session_id)
-
-    def _get_user_id(self) -> int:
-        return self.callback.from_user.id
-
-    def _get_context(self, user_id: int) -> FSMContext:
-        user_key = StorageKey(
-            bot_id=self.bot.id,
-            chat_id=user_id,
-            user_id=user_id
-        )
-        return FSMContext(storage=self.user_context.storage, key=user_key)
-
-    async def send_message(self, chat_id: int, *args, **kwargs) -> Message:
-        return await self.bot.send_message(chat_id, *args, **kwargs)
+
+    def __init__(self, session: GameSession, user_id: int):
+        self.session = session
+        self.bot: Bot = session.bot
+        self.storage: BaseStorage = session.storage
+        self.user_id: int = user_id
+        self.opponent_id: int = session.opponent_of(user_id)
+        self.session_id = session.session_id
+        # Изменения FSM копятся в памяти и пишутся одной пачкой в flush()
+        self.records: dict[int, PlayerRecord] = {
+            self.user_id: PlayerRecord(key=self._key(self.user_id)),
+            self.opponent_id: PlayerRecord(key=self._key(self.opponent_id))}
+        self.ops: Counter[str] = Counter()  # Обращения к хранилищу
+
+    def _key(self, user_id: int) -> StorageKey:
+        return StorageKey(bot_id=self.bot.id, chat_id=user_id,
+                          user_id=user_id)
+
+    def _player_id(self, whom: PlayerCode) -> int:
+        return self.user_id if whom is PlayerCode.USER else self.opponent_id
+
+    def _player_ids(self, whom: PlayerCode) -> tuple[int, ...]:
+        if whom is PlayerCode.BOTH:
+            return (self.user_id, self.opponent_id)
+        return (self._player_id(whom),)
+
+    async def flush(self) -> None:
+        '''Записывает все накопленные изменения одной пачкой'''
+        records = self.records.values()
+        states = [(record.key, record.state)
+                  for record in records if record.state_dirty]
+        data = [(record.key, dict(record.data))
+                for record in records if record.data_dirty]
+        if not states and not data:
+            return
+        for record in records:
+            record.state_dirty = record.data_dirty = False
+        if isinstance(self.storage, RespStorage):
+            self.ops['set_many'] += 1
+            await self.storage.update_many(states, data)
+            return
+        self.ops['set_state'] += len(states)
+        self.ops['set_data'] += len(data)
+        await self._fan_out(
+            *(self.storage.set_state(key, state) for key, state in states),
+            *(self.storage.set_data(key, value) for key, value in data))
+
+    @staticmethod
+    async def _fan_out(*aws: Awaitable[Any]) -> list[Any]:
+        '''
+        Выполняет операции одновременно. Ошибка одной операции не
+        прерывает остальные: все доводятся до конца, затем поднимается
+        первая ошибка.
+        '''
+        results = await asyncio.gather(*aws, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def batch(self, actions: Iterable[PlayerAction]) -> list[Any]:
+        '''
+        Выполняет пачку действий над игроками: действия разных адресатов
+        идут одновременно, одного адресата - по порядку, чтобы сообщения
+        в чате не перемешались (BOTH считается отдельным адресатом).
+        После ошибки оставшиеся действия того же адресата не выполняются.
+        Возвращает результаты в порядке actions.
+        '''
+        actions = list(actions)
+        lanes: dict[PlayerCode, list[int]] = {}
+        for index, (whom, _) in enumerate(actions):
+            lanes.setdefault(whom, []).append(index)
+        results: list[Any] = [None] * len(actions)
+
+        async def run_lane(indexes: list[int]) -> None:
+            for position, index in enumerate(indexes):
+                try:
+                    results[index] = await actions[index][1]
+                except BaseException:
+                    for rest in indexes[position + 1:]:
+                        if asyncio.iscoroutine(aw := actions[rest][1]):
+                            aw.close()  # Не будет запущена
+                    raise
+
+        await self._fan_out(*(run_lane(lane) for lane in lanes.values()))
+        return results
+
+    async def send_message(self, chat_id: int, text: str,
+                           priority: Priority = Priority.CRITICAL,
+                           **kwargs) -> Message:
+        # Все сообщения игры идут через планировщик исходящих запросов
+        return await outbound.send_message(self.bot, chat_id, text,
+                                           priority, **kwargs)
 
     async def answer(self, whom: PlayerCode, *args, **kwargs) -> int:
         match whom:
             case PlayerCode.USER:
-                message = await self.message.answer(*args, **kwargs)
+                message = await self.send_message(
+                    self.user_id, *args, **kwargs)
             case PlayerCode.OPPONENT:
                 message = await self.send_message(
                     self.opponent_id, *args, **kwargs)
             case PlayerCode.BOTH:
-                message = await self.message.answer(*args, **kwargs)
-                message = await self.send_message(
-                    self.opponent_id, *args, **kwargs)
+                _, message = await self._fan_out(
+                    self.send_message(self.user_id, *args, **kwargs),
+                    self.send_message(self.opponent_id, *args, **kwargs))
         return message.message_id
 
-    async def update_date(self, whom: PlayerCode, **kwargs) -> None:
-        match whom:
-            case PlayerCode.USER:
-                await self.user_context.update_data(**kwargs)
-            case PlayerCode.OPPONENT:
-                await self.opponent_context.update_data(**kwargs)
-            case PlayerCode.BOTH:
-                await self.user_context.update_data(**kwargs)
-                await self.opponent_context.update_data(**kwargs)
-
-    async def get_data(self, whom: PlayerCode) -> dict:
-        match whom:
-            case PlayerCode.USER:
-                return await self.user_context.get_data()
-            case PlayerCode.OPPONENT:
-                return await self.opponent_context.get_data()
-            case _: return {}
-
-    async def get_data_both(self) -> tuple[dict, dict]:
-        return (await self.get_data(PlayerCode.USER),
-                await self.get_data(PlayerCode.OPPONENT))
-
     async def set_state(self, whom: PlayerCode, state_type: StateType) -> None:
-        match whom:
-            case PlayerCode.USER:
-                await self.user_context.set_state(state_type)
-            case PlayerCode.OPPONENT:
-                await self.opponent_context.set_state(state_type)
-            case PlayerCode.BOTH:
-                await self.user_context.set_state(state_type)
-                await self.opponent_context.set_state(state_type)
-
-    async def get_state(self, whom: PlayerCode) -> StateType:
-        match whom:
-            case PlayerCode.USER:
-                return await self.user_context.get_state()
-            case PlayerCode.OPPONENT:
-                return await self.opponent_context.get_state()
-            case _: return default_state
-
-    async def get_state_both(self) -> tuple[StateType, StateType]:
-        return (await self.get_state(PlayerCode.USER),
-                await self.get_state(PlayerCode.OPPONENT))
-
-    async def delete_message(self, whom: PlayerCode,
-                             key: str = 'message_id') -> None:
-        match whom:
-            case PlayerCode.USER:
-                whom_chat_id = ((PlayerCode.USER, self.user_id),)
-            case PlayerCode.OPPONENT:
-                whom_chat_id = ((PlayerCode.OPPONENT, self.opponent_id),)
-            case PlayerCode.BOTH:
-                whom_chat_id: tuple[tuple[PlayerCode, int]] = (
-                    (PlayerCode.USER, self.user_id),
-                    (PlayerCode.OPPONENT, self.opponent_id))
-        # Удаляем сообщение
-        for whom, chat_id in whom_chat_id:
-            message_id = (
-                await self.get_data(whom=whom)
-            ).get(key)
-            await self.bot.delete_message(
-                chat_id=chat_id,
-                message_id=message_id if type(message_id) is int else 0
-            )
-            await self.update_date(whom=whom, message_edited_id=None)
+        if whom is PlayerCode.NOBODY:
+            return
+        state = state_type.state if isinstance(
+            state_type, State) else state_type
+        # Запись состояния обходится без чтения
+        for user_id in self._player_ids(whom):
+            record = self.records[user_id]
+            record.state = state
+            record.state_dirty = True
+
+    async def delete_countdown(self, whom: PlayerCode) -> None:
+        '''Удаляет сообщения с обратным отсчетом (у обоих - одновременно)'''
+        messages = self.session.countdown_messages
+        await self._fan_out(*(
+            outbound.delete_message(self.bot, chat_id=user_id,
+                                    message_id=messages.pop(user_id),
+                                    priority=Priority.CRITICAL)
+            for user_id in self._player_ids(whom) if user_id in messages))
 
     async def announce_winner(self, winner_id: int) -> None:
-        await self.send_message(winner_id, LEXICON['you_win'])
-        winner_context = self._get_context(winner_id)
-        winner_data = await winner_context.get_data()
-        winner_opponent_id = winner_data.get('opponent_id')
-        if winner_opponent_id:
-            await self.send_message(winner_opponent_id, LEXICON['you_lose'])
-        await winner_context.set_state(FSMPlay.winner)
+        self.session.outcome = MatchOutcome.WIN
+        self.session.winner = winner_id
+        winner = (PlayerCode.USER if winner_id == self.user_id
+                  else PlayerCode.OPPONENT)
+        await self.set_state(winner, FSMPlay.winner)
+        await self._fan_out(
+            self.send_message(winner_id, LEXICON['you_win']),
+            self.send_message(self.session.opponent_of(winner_id),
+                              LEXICON['you_lose']))
 
     async def show_players_hands(self) -> None:
-        user_data = await self.get_data(PlayerCode.USER)
-        opponent_data = await self.get_data(PlayerCode.OPPONENT)
+        moves = self.session.moves
         user_hands = {
-            'hand1': LEXICON[user_data['first_hand']],
-            'hand2': LEXICON[user_data['second_hand']]
+            'hand1': LEXICON[moves[self.user_id]['first_hand']],
+            'hand2': LEXICON[moves[self.user_id]['second_hand']]
         }
         opponent_hands = {
-            'hand1': LEXICON[opponent_data['first_hand']],
-            'hand2': LEXICON[opponent_data['second_hand']]
+            'hand1': LEXICON[moves[self.opponent_id]['first_hand']],
+            'hand2': LEXICON[moves[self.opponent_id]['second_hand']]
         }
-        await self.answer(whom=PlayerCode.USER,
-                          text=LEXICON['your_hands'].format(**user_hands))
-        await self.answer(whom=PlayerCode.USER,
-                          text=LEXICON['opponent_hands'].format(
-                              **opponent_hands))
-        await self.answer(whom=PlayerCode.OPPONENT,
-                          text=LEXICON['your_hands'].format(**opponent_hands))
-        await self.answer(whom=PlayerCode.OPPONENT,
-                          text=LEXICON['opponent_hands'].format(**user_hands))
-
-    async def wait_for_hands_completion(self, timeout: int = 10,
-                                        check_interval: float = 0.1
-                                        ) -> PlayerCode:
+        await self.batch([
+            (PlayerCode.USER, self.answer(
+                whom=PlayerCode.USER,
+                text=LEXICON['your_hands'].format(**user_hands))),
+            (PlayerCode.USER, self.answer(
+                whom=PlayerCode.USER,
+                text=LEXICON['opponent_hands'].format(**opponent_hands))),
+            (PlayerCode.OPPONENT, self.answer(
+                whom=PlayerCode.OPPONENT,
+                text=LEXICON['your_hands'].format(**opponent_hands))),
+            (PlayerCode.OPPONENT, self.answer(
+                whom=PlayerCode.OPPONENT,
+                text=LEXICON['opponent_hands'].format(**user_hands))),
+        ])
+
+    @staticmethod
+    def _who(user_complete: bool, opp_complete: bool) -> PlayerCode:
+        if user_complete and opp_complete:
+            return PlayerCode.BOTH
+        elif user_complete:
+            return PlayerCode.USER
+        elif opp_complete:
+            return PlayerCode.OPPONENT
+        return PlayerCode.NOBODY
+
+    def players_ready(self) -> PlayerCode:
+        '''
+        Кто успел выбрать ходы обеих рук: BOTH, USER, OPPONENT или NOBODY
+        '''
+        moves = self.session.moves
+        return self._who(len(moves[self.user_id]) == len(HANDS),
+                         len(moves[self.opponent_id]) == len(HANDS))
+
+    def players_kept(self) -> PlayerCode:
+        '''Кто успел выбрать оставляемую руку'''
+        kept = self.session.kept
+        return self._who(self.user_id in kept, self.opponent_id in kept)
+
+    async def resolve_hands_round(self, players_ready: PlayerCode) -> None:
+        """Ведет игру дальше по итогам выбора ходов обеих рук"""
+        if players_ready is PlayerCode.BOTH:
+            # Оба игрока выбрали обе руки вовремя
+            await self.show_players_hands()
+            await self.start_hand_choice_round()
+            return  # Игра продолжается
+        await self.resolve_late(players_ready)
+        await self.finish_game()  # Игра завершается
+
+    async def resolve_hand_choice(self, players_ready: PlayerCode) -> None:
         """
-        Ожидает, пока оба игрока выберут два хода (first_hand и second_hand)
-        в течение timeout секунд. Если оба выбрали – возвращает BOTH.
-        Если только один – возвращает USER или OPPONENT того, кто успел.
+        Завершает игру по итогам выбора оставляемой руки: оставленные
+        руки сравниваются по правилам игры
         """
-        start_time = asyncio.get_event_loop().time()
-        while True:
-            user_state, opp_state = await self.get_state_both()
-
-            user_complete = (user_state == FSMPlay.both_hands_ready)
-            opp_complete = (opp_state == FSMPlay.both_hands_ready)
-
-            if user_complete and opp_complete:
-                return PlayerCode.BOTH
-
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed >= timeout:
-                if user_complete and not opp_complete:
-                    return PlayerCode.USER
-                elif opp_complete and not user_complete:
-                    return PlayerCode.OPPONENT
-                else:
-                    return PlayerCode.NOBODY
-            await asyncio.sleep(check_interval)
-
-    async def run_delayed_start_hand_choice_round_task(
-            self, timeout: int = 10,
-            check_interval: float = 0.1) -> None:
-        """Запускает задачу на ожидание выбора хода соперником"""
-        if 'wait_for_hands_completion_task' in self.session.running_tasks:
-            print('--- Задача уже запущена другим игроком ---')
-            return  # Если задача уже запущена, выходим из функции
-        wait_for_hands_completion_task = asyncio.create_task(
-            self.wait_for_hands_completion(timeout, check_interval)
-        )
-        self.session.running_tasks[
-            'wait_for_hands_completion_task'
-        ] = wait_for_hands_completion_task
-        players_ready = await wait_for_hands_completion_task
-        self.session.kill_task('wait_for_hands_completion_task')
+        if players_ready is not PlayerCode.BOTH:
+            await self.resolve_late(players_ready)
+            await self.finish_game()
+            return
+        moves, kept = self.session.moves, self.session.kept
+        user_move = moves[self.user_id][kept[self.user_id]]
+        opponent_move = moves[self.opponent_id][kept[self.opponent_id]]
+        await self._fan_out(
+            self.answer(whom=PlayerCode.USER, text=LEXICON[
+                'opponent_kept'].format(move=LEXICON[opponent_move])),
+            self.answer(whom=PlayerCode.OPPONENT, text=LEXICON[
+                'opponent_kept'].format(move=LEXICON[user_move])))
+        match rules.resolve(user_move, opponent_move):
+            case RoundResult.FIRST:
+                await self.announce_winner(winner_id=self.user_id)
+            case RoundResult.SECOND:
+                await self.announce_winner(winner_id=self.opponent_id)
+            case RoundResult.DRAW:
+                self.session.outcome = MatchOutcome.DRAW
+                await self.answer(whom=PlayerCode.BOTH,
+                                  text=LEXICON['hands_draw'])
+        await self.finish_game()
+
+    async def resolve_late(self, players_ready: PlayerCode) -> None:
+        '''
+        Кто-то не успел сделать выбор вовремя: успевший побеждает, а если
+        не успели оба - ничья
+        '''
         match players_ready:
-            case PlayerCode.BOTH:  # Оба игрока выбрали обе руки вовремя
-                await self.show_players_hands()
-                await self.start_hand_choice_round()
-                return  # Игра продолжается
             case PlayerCode.USER:  # Пользователь успел, а соперник не нет
-                await self.answer(whom=PlayerCode.OPPONENT,
-                                  text=LEXICON['you_are_too_long'])
-                await self.answer(whom=PlayerCode.USER,
-                                  text=LEXICON['opponent_is_too_long'])
+                await self._fan_out(
+                    self.answer(whom=PlayerCode.OPPONENT,
+                                text=LEXICON['you_are_too_long']),
+                    self.answer(whom=PlayerCode.USER,
+                                text=LEXICON['opponent_is_too_long']))
                 await self.announce_winner(winner_id=self.user_id)
             case PlayerCode.OPPONENT:  # Соперник успел, а пользователь нет
-                await self.answer(whom=PlayerCode.USER,
-                                  text=LEXICON['you_are_too_long'])
-                await self.answer(whom=PlayerCode.OPPONENT,
-                                  text=LEXICON['opponent_is_too_long'])
+                await self._fan_out(
+                    self.answer(whom=PlayerCode.USER,
+                                text=LEXICON['you_are_too_long']),
+                    self.answer(whom=PlayerCode.OPPONENT,
+                                text=LEXICON['opponent_is_too_long']))
                 await self.announce_winner(winner_id=self.opponent_id)
             case PlayerCode.NOBODY:  # Никто не успел — игра отменяется
+                self.session.outcome = MatchOutcome.NO_MOVES
                 await self.answer(whom=PlayerCode.BOTH,
                                   text=LEXICON['both_are_too_long'])
-        await self.finish_game()  # Игра завершается
 
-    async def start_first_hand_round(self) -> None:
+    async def start_first_hand_round(
+            self, whom: PlayerCode = PlayerCode.USER) -> None:
+        # Сначала состояние, чтобы кнопки работали сразу после отправки
+        await self.set_state(whom=whom,
+                             state_type=FSMPlay.choice_action_for_first_hand)
+        await self.flush()
         # Создаем клавиатуру для выбора действия у первой руки
         game_kb = create_inline_kb(*LEXICON_MOVES.keys())
-        await self.answer(whom=PlayerCode.USER,
+        await self.answer(whom=whom,
                           text=LEXICON['choose_action_for_first_hand'],
                           reply_markup=game_kb)
-        await self.set_state(whom=PlayerCode.USER,
-                             state_type=FSMPlay.choice_action_for_first_hand)
 
     async def start_second_hand_round(self) -> None:
+        await self.set_state(whom=PlayerCode.USER,
+                             state_type=FSMPlay.choice_action_for_second_hand)
+        await self.flush()
         # Создаем клавиатуру для выбора действия у второй руки
         game_kb = create_inline_kb(*LEXICON_MOVES.keys())
         await self.answer(whom=PlayerCode.USER,
                           text=LEXICON['choose_action_for_second_hand'],
                           reply_markup=game_kb)
-        await self.set_state(whom=PlayerCode.USER,
-                             state_type=FSMPlay.choice_action_for_second_hand)
 
     async def start_hand_choice_round(self) -> None:
+        await self.set_state(whom=PlayerCode.BOTH,
+                             state_type=FSMPlay.choice_hand)
+        await self.flush()
         # Создаем клавиатуру для выбора оставшейся руки
         game_kb = create_inline_kb('first_hand', 'second_hand')
         await self.answer(whom=PlayerCode.BOTH,
                           text=LEXICON['invitation_choose_remaining_hand'],
                           reply_markup=game_kb)
-        await self.set_state(whom=PlayerCode.BOTH,
-                             state_type=FSMPlay.choice_hand)
-
-    async def process_first_hand(self) -> None:
-        '''Обработка хода первой руки'''
-        first_hand: str = str(self.callback.data)
-        await self.update_date(whom=PlayerCode.USER,
-                               first_hand=first_hand)
-
-    async def process_second_hand(self) -> None:
-        '''Обработка хода второй руки'''
-        second_hand: str = str(self.callback.data)
-        await self.update_date(whom=PlayerCode.USER,
-                               second_hand=second_hand)
-        await self.set_state(whom=PlayerCode.USER,
-                             state_type=FSMPlay.both_hands_ready)
 
     async def clear_states(self) -> None:
         '''Очистка состояний игроков'''
-        await self.user_context.clear()
-        await self.opponent_context.clear()
+        for record in self.records.values():
+            record.state, record.data = None, {}
+            record.state_dirty = record.data_dirty = True
 
     async def finish_game(self) -> None:
-        """Завершает игру атомарно"""
-        async with self.session.lock:
-            # Проверяем, что игра еще не была завершена
-            if self.session_id not in GameSession.sessions:
-                return  # Значит игра уже была завершена оппонентом
-
-            # Завершаем игру для обоих игроков (т.к. она еще не завершена)
-            await self.answer(whom=PlayerCode.BOTH,
-                              text=LEXICON['game_finished'])
-            await self.clear_states()
-            await self.session.delete()
+        """Завершает игру для обоих игроков"""
+        # Блокировка не нужна: события сессии обрабатываются по одному
+        if self.session.phase is GamePhase.FINISHED:
+            return
+        await self.answer(whom=PlayerCode.BOTH,
+                          text=LEXICON['game_finished'])
+        await self.clear_states()
+        await self.flush()  # Очищенные состояния пишем до удаления
+        self.session.delete()
 
     async def react_to_cancellation(self, who_cancelled: PlayerCode) -> None:
         '''Реакция на отмену игры'''
+        self.session.outcome = MatchOutcome.REFUSED
+        # Отказавшийся проигрывает из-за неявки
+        self.session.winner = (self.opponent_id
+                               if who_cancelled is PlayerCode.USER
+                               else self.user_id)
         match who_cancelled:
             case PlayerCode.OPPONENT:
                 await self.answer(whom=PlayerCode.USER,
@@ -321,96 +897,50 @@ class GameMaster:
 
     async def react_to_timeout(self, who_timeout: PlayerCode) -> None:
         '''Реакция на таймаут'''
+        self.session.outcome = MatchOutcome.NO_CONSENT
+        # Не ответивший вовремя проигрывает из-за неявки (оба - без победы)
+        if who_timeout is not PlayerCode.BOTH:
+            self.session.winner = (self.opponent_id
+                                   if who_timeout is PlayerCode.USER
+                                   else self.user_id)
         # Удаляем сообщения с таймером для обоих игроков
-        await self.delete_message(whom=PlayerCode.BOTH, key='message_edited_id')
+        await self.delete_countdown(whom=PlayerCode.BOTH)
 
         match who_timeout:
             case PlayerCode.OPPONENT:
-                await self.answer(whom=PlayerCode.USER,
-                                  text=LEXICON['too_long_waiting_response'])
-                await self.answer(whom=PlayerCode.OPPONENT,
-                                  text=LEXICON['you_are_too_long'])
+                await self._fan_out(
+                    self.answer(whom=PlayerCode.USER,
+                                text=LEXICON['too_long_waiting_response']),
+                    self.answer(whom=PlayerCode.OPPONENT,
+                                text=LEXICON['you_are_too_long']))
             case PlayerCode.USER:
-                await self.answer(whom=PlayerCode.OPPONENT,
-                                  text=LEXICON['too_long_waiting_response'])
-                await self.answer(whom=PlayerCode.USER,
+                await self._fan_out(
+                    self.answer(whom=PlayerCode.OPPONENT,
+                                text=LEXICON['too_long_waiting_response']),
+                    self.answer(whom=PlayerCode.USER,
+                                text=LEXICON['you_are_too_long']))
+            case PlayerCode.BOTH:
+                await self.answer(whom=PlayerCode.BOTH,
                                   text=LEXICON['you_are_too_long'])
         await self.finish_game()
 
-    async def wait_opponent_consent(self, send_every_n_seconds: int = 1,
-                                    check_interval: float = 0.1,
-                                    timeout: int = 10) -> None:
-        """Ожидание ответа соперника с обновлениями статуса"""
-        steps: int = 0
-        send_every_step: int = int(send_every_n_seconds / check_interval)
-        start_time: float = asyncio.get_event_loop().time()
-        first_message: bool = True
-        while True:
-            opponent_data = await self.get_data(PlayerCode.OPPONENT)
-            decision: bool | None = opponent_data.get('ready_to_play')
-
-            # Проверяем не отменил ли соперник игру
-            if decision is False or 'opponent_id' not in opponent_data:
-                raise asyncio.CancelledError  # Вызываем отмену задачи
-
-            if decision is True:  # Если соперник готов к игре
-                return  # Выходим из функции и завершаем задачу
-
-            if steps % send_every_step == 0:
-                now_time = asyncio.get_event_loop().time()
-                left: int = timeout - int(now_time - start_time)
-                if first_message:  # Если это первое сообщение,
-                    # то отправляем его (обоим игрокам)
-                    message_id_user = await self.answer(
-                        whom=PlayerCode.USER,
-                        text=LEXICON['waiting_opponent'] + "\n" +
-                        LEXICON['seconds_left'].format(seconds=left))
-                    message_id_opp = await self.answer(
-                        whom=PlayerCode.OPPONENT,
-                        text=LEXICON['user_wait_you'] + "\n" +
-                        LEXICON['game_will_cancel'].format(seconds=left))
-                    # Сохраняем id сообщения для последующего удаления
-                    await self.update_date(whom=PlayerCode.USER,
-                                           message_edited_id=message_id_user)
-                    await self.update_date(whom=PlayerCode.OPPONENT,
-                                           message_edited_id=message_id_opp)
-                    first_message = False
-                else:  # Если это не первое сообщение, то редактируем его
-                    await self.bot.edit_message_text(
-                        chat_id=self.user_id, message_id=message_id_user,
-                        text=LEXICON['waiting_opponent'] + "\n" +
-                        LEXICON['seconds_left'].format(seconds=left))
-                    await self.bot.edit_message_text(
-                        chat_id=self.opponent_id, message_id=message_id_opp,
-                        text=LEXICON['user_wait_you'] + "\n" +
-                        LEXICON['game_will_cancel'].format(seconds=left))
-
-            await asyncio.sleep(check_interval)
-            steps += 1
-
-    async def run_waiting_opponent_consent_task(self,
-                                                timeout: int = 10) -> None:
-        '''Запуск задачи на ожидание согласия соперника с таймаутом'''
-        wait_opponent_consent_task = asyncio.create_task(
-            self.wait_opponent_consent(timeout=timeout)
-        )
-        if 'wait_opponent_consent_task' in self.session.running_tasks:
-            return  # Если задача уже запущена, то выходим из функции
-        self.session.running_tasks[
-            'wait_opponent_consent_task'
-        ] = wait_opponent_consent_task
-        await asyncio.wait_for(wait_opponent_consent_task, timeout=timeout)
-
-    @staticmethod
-    async def get_opponent_id(callback: CallbackQuery,
-                              context: FSMContext) -> int:
-        message: Message = callback.message  # type: ignore[assignment]
-        user_data = await context.get_data()
-
-        try:
-            opponent_id: int = user_data['opponent_id']
-            return opponent_id
-        except KeyError:
-            await message.answer(text=LEXICON['opponent_not_found'])
-            await context.clear()
-            raise KeyError
+    async def start_consent_wait(self, timeout: float) -> None:
+        """
+        Сообщает обоим игрокам, что пользователь ждет согласия соперника.
+        Секунды в сообщениях обновляет общий сервис countdown, а таймаут
+        ожидания отсчитывает GameSession.
+        """
+        deadline = time.monotonic() + timeout
+        now = time.monotonic()
+        # Отправляем первое сообщение обоим игрокам
+        message_id_user, message_id_opp = await self._fan_out(
+            self.answer(whom=PlayerCode.USER, text=countdown.render(
+                WAITING_TEMPLATE, deadline, now)),
+            self.answer(whom=PlayerCode.OPPONENT, text=countdown.render(
+                WAITED_TEMPLATE, deadline, now)))
+        # Сохраняем id сообщений для последующего удаления
+        self.session.countdown_messages.update({
+            self.user_id: message_id_user,
+            self.opponent_id: message_id_opp})
+        # Дальше сообщения редактирует сервис обратного отсчета
+        self.session._register_countdown(deadline)
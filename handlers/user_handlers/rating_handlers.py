@@ -0,0 +1,41 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from lexicon.lexicon_ru import LEXICON
+from services.outbound import outbound
+from services.rating import Entry, ratings
+
+
+router = Router()
+
+
+def format_entries(entries: list[Entry], user_id: int) -> str:
+    return '\n'.join(
+        LEXICON['leaderboard_you' if entry_id == user_id
+                else 'leaderboard_line'].format(
+            place=place, user_id=entry_id, rating=rating)
+        for place, entry_id, rating in entries)
+
+
+# Этот хэндлер срабатывает на команду /top
+@router.message(Command(commands='top'))
+async def process_top_command(message: Message):
+    user_id: int = message.from_user.id  # type: ignore[union-attr]
+    entries = ratings.leaderboard.top(10)
+    if not entries:
+        await outbound.answer(message, text=LEXICON['leaderboard_empty'])
+        return
+    await outbound.answer(message, text=LEXICON['/top'] + '\n\n'
+                          + format_entries(entries, user_id))
+
+
+# Этот хэндлер срабатывает на команду /rank: место игрока и его соседи
+@router.message(Command(commands='rank'))
+async def process_rank_command(message: Message):
+    user_id: int = message.from_user.id  # type: ignore[union-attr]
+    entries = ratings.leaderboard.around(user_id, radius=2)
+    if not entries:
+        await outbound.answer(message, text=LEXICON['not_rated'])
+        return
+    await outbound.answer(message, text=LEXICON['/rank'] + '\n\n'
+                          + format_entries(entries, user_id))
@@ -1,9 +1,10 @@
 from aiogram import Router
-from .user_handlers import menu_handlers, game_handlers
+from .user_handlers import menu_handlers, game_handlers, rating_handlers
 
 
 router = Router()
 router.include_routers(
     menu_handlers.router,  # Подключаем роутер с меню
-    game_handlers.router  # Подключаем роутер с игрой
+    game_handlers.router,  # Подключаем роутер с игрой
+    rating_handlers.router  # Подключаем роутер с рейтингом
 )
@@ -12,6 +12,8 @@ LEXICON_COMMANDS: dict[str, str] = {
              'совпадает - ничья, а в остальных случаях камень '
              'побеждает ножницы, ножницы побеждают бумагу, '
              'а бумага побеждает камень.\n\n<b>Играем?</b>',
+    '/top': '<b>Лучшие игроки</b>',
+    '/rank': '<b>Твое место в рейтинге</b>',
 }
 
 LEXICON_MOVES: dict[str, str] = {
@@ -49,6 +51,7 @@ LEXICON_ANSWERS: dict[str, str] = {
     'user_choice': 'Твой выбор',
     'choice_game_mode': 'Выбери режим игры',
     'choice_user_search': 'Выбери способ поиска соперника',
+    'searching_opponent': 'Ищем тебе соперника...',
     'your_opponent': 'Твой <a href="tg://user?id={opponent_id}">соперник</a>',
     'you_are_chosen': '<a href="tg://user?id={user_id}">Игрок</a> '
                       'бросает тебе вызов! '
@@ -69,6 +72,24 @@ LEXICON_ANSWERS: dict[str, str] = {
     'you_lose': 'Ты проиграл!',
     'your_hands': 'Твои ходы:\n\n✋ {hand1}       {hand2} 🤚',
     'opponent_hands': 'Ходы соперника:\n\n✋ {hand1}       {hand2} 🤚',
+    'opponent_kept': 'Соперник оставил {move}',
+    'hands_draw': 'Ничья!',
+    'leaderboard_line': '{place}. <a href="tg://user?id={user_id}">Игрок</a>'
+                        ' — {rating}',
+    'leaderboard_you': '{place}. <b>Ты</b> — {rating}',
+    'leaderboard_empty': 'Пока никто не играл на рейтинг',
+    'not_rated': 'У тебя пока нет рейтинга — сыграй партию!',
+    'tournament_registered': 'Ты записан на турнир! Участников: {players}.'
+                             '\nНачало через {seconds} секунд',
+    'tournament_already': 'Ты уже участвуешь в турнире',
+    'tournament_cancelled': 'Турнир не состоялся: не набралось участников',
+    'tournament_round': '<b>Турнир, раунд {round}</b> (очков: {score})\n'
+                        'Твой <a href="tg://user?id={opponent_id}">'
+                        'соперник</a> ждет! Начинаем?',
+    'tournament_bye': '<b>Турнир, раунд {round}</b>\nТебе не хватило '
+                      'соперника - засчитана победа',
+    'tournament_finished': '<b>Турнир окончен!</b>\nТвое место: {place} '
+                           'из {players}, очков: {score}',
 }
 
 LEXICON_WARNINGS: dict[str, str] = {
@@ -76,6 +97,8 @@ LEXICON_WARNINGS: dict[str, str] = {
                            'выбери что-то из предложенного!',
     'no_online_users': 'Нет онлайн пользователей',
     'opponent_not_found': 'Соперник не найден',
+    'server_busy': 'Сейчас идет слишком много игр, '
+                   'попробуй начать чуть позже',
 }
 
 LEXICON: Mapping[str, str] = ChainMap(
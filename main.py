@@ -1,5 +1,5 @@
 import asyncio
-import logging
+import atexit
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -7,46 +7,149 @@ from aiogram.enums import ParseMode
 from config_data.config import Config, load_config
 from handlers import other_handlers, user_routers
 from middlewares.actual_state import OnlineUserMiddleware
+from middlewares.instrumentation import register_metrics_middlewares
 from database.db import cleanup_task, online_users
+from database.presence import PresenceTable
+from database.history import MatchHistory, history_task
+from database.storage import (RespStorage, SharedState, create_storage,
+                              shared_state_task)
+from handlers.user_handlers.game_managers import GameSession, session_gc_task
+from services.countdown import countdown, countdown_task
+from services.executor import game_executor
+from services.logs import get_logger, setup_logging
+from services.matchmaking import matchmaking_queue, matchmaking_task
+from services.metrics import metrics, start_metrics_server
+from services.outbound import outbound
+from services.rating import RATED_OUTCOMES, ratings
+from services.snapshot import SnapshotManager, snapshot_task
+from services.tournament import tournament_task, tournaments
+from services.webhook import run_webhook
 
 
 # Инициализируем логгер
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
 # Функция конфигурирования и запуска бота
 async def main():
-    # Конфигурируем логирование
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(filename)s:%(lineno)d #%(levelname)-8s '
-               '[%(asctime)s] - %(name)s - %(message)s')
+    # Загружаем конфиг в переменную config
+    config: Config = load_config()
+
+    # Конфигурируем логирование: записи форматируются и выводятся в
+    # отдельном потоке, остаток очереди дописывается при выходе
+    atexit.register(setup_logging(config.logging).stop)
 
     # Выводим в консоль информацию о начале запуска бота
     logger.info('Starting bot')
 
-    # Загружаем конфиг в переменную config
-    config: Config = load_config()
-
     # Инициализируем бот и диспетчер
     bot = Bot(
         token=config.tg_bot.token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher()
+    storage = create_storage(
+        config.storage, journaled=config.snapshot.path is not None)
+    dp = Dispatcher(storage=storage)
+
+    # С общим хранилищем несколько процессов видят присутствие и сессии
+    if isinstance(storage, RespStorage):
+        GameSession.shared_state = SharedState(storage.client, online_users)
+        asyncio.create_task(shared_state_task(GameSession.shared_state))
 
+    # Процессы бота на одной машине видят общий онлайн через общую
+    # память. Таблицу создает и чистит владелец - единственный процесс с
+    # PRESENCE_OWNER=true, его запускают первым
+    if config.presence.name is not None:
+        online_users.table = PresenceTable.open(
+            config.presence.name, config.presence.capacity,
+            owner=config.presence.owner)
     asyncio.create_task(cleanup_task(online_users))
+    # Брошенные игровые сессии удаляются по TTL, их число ограничено
+    GameSession.session_ttl = config.sessions.ttl
+    GameSession.max_sessions = config.sessions.max_sessions
+    asyncio.create_task(session_gc_task())
+    asyncio.create_task(countdown_task(countdown))
+    asyncio.create_task(
+        matchmaking_task(matchmaking_queue, bot, dp.storage))
+    # Турниры: запись по кнопке, раунды - обычные игровые сессии
+    tournaments.registration = config.tournament.registration
+    tournaments.min_players = config.tournament.min_players
+    tournaments.max_rounds = config.tournament.max_rounds
+    tournaments.start_timeout = config.tournament.start_timeout
+    tournaments.publish_concurrency = config.tournament.publish_concurrency
+    asyncio.create_task(tournament_task(tournaments, bot, dp.storage))
+
+    # События игр обрабатываются в фоне ограниченным числом воркеров, а
+    # при остановке принятые события дорабатываются до закрытия бота
+    game_executor.workers = config.executor.workers
+    game_executor.queue_size = config.executor.queue_size
+
+    async def drain_games() -> None:
+        await game_executor.drain(config.executor.drain_timeout)
+
+    dp.shutdown.register(drain_games)
+    # Сообщения доигранных игр уходят до закрытия сессии бота, а
+    # обратный отсчет уже никому не нужен
+    dp.shutdown.register(countdown.close)
+    dp.shutdown.register(outbound.close)
+
+    # Итоги игр пишутся в историю в фоне, пачками; остаток очереди -
+    # при остановке, после того как игры доработали. Рейтинги
+    # пересчитываются до восстановления сессий: те могут сразу закончиться
+    ratings.initial = config.rating.initial
+    ratings.k_factor = config.rating.k_factor
+    if config.history.path is not None:
+        GameSession.history = MatchHistory(
+            config.history.path, batch_size=config.history.batch_size)
+        # Рейтинги и таблица лидеров пересчитываются по истории разом
+        ratings.rebuild(await GameSession.history.matches(*RATED_OUTCOMES))
+        logger.info('Ratings rebuilt from match history',
+                    players=len(ratings.ratings))
+        asyncio.create_task(history_task(GameSession.history))
+        dp.shutdown.register(GameSession.history.close)
+
+    # Состояние переживает перезапуск: FSM, сессии с их таймерами и
+    # онлайн восстанавливаются из снапшота
+    restored = False
+    if config.snapshot.path is not None:
+        snapshots = SnapshotManager(
+            config.snapshot.path, bot, storage, online_users,
+            compact_interval=config.snapshot.compact_interval)
+        restored = snapshots.restore()
+        logger.info('State restored from snapshot',
+                    fsm_records=snapshots.stats.restored_fsm,
+                    sessions=snapshots.stats.restored_sessions,
+                    seconds=round(snapshots.stats.restore_seconds, 3))
+        asyncio.create_task(
+            snapshot_task(snapshots, config.snapshot.interval))
+        # Последний снимок - после того, как игры доработали
+        dp.shutdown.register(snapshots.compact)
 
     # Регистрация middleware
-    dp.update.middleware(OnlineUserMiddleware())
+    dp.update.middleware(OnlineUserMiddleware(deferred=True))
+    # Время хэндлеров и запросов к Bot API
+    register_metrics_middlewares(dp, bot)
+
+    # Метрики отдаются в формате Prometheus из того же цикла событий
+    if config.metrics.port:
+        metrics_server = await start_metrics_server(
+            metrics, config.metrics.host, config.metrics.port)
+        dp.shutdown.register(metrics_server.cleanup)
 
     # Регистриуем роутеры в диспетчере
     dp.include_router(user_routers.router)
     dp.include_router(other_handlers.router)
 
-    # Пропускаем накопившиеся апдейты и запускаем polling
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # Апдейты принимаем по вебхуку, если он выбран в конфиге
+    if config.webhook.mode == 'webhook':
+        await run_webhook(dp, bot, config.webhook)
+        return
+
+    # Накопившиеся апдейты обрабатываем, если состояние восстановлено,
+    # иначе пропускаем их. Запускаем polling
+    await bot.delete_webhook(drop_pending_updates=not restored)
+    await dp.start_polling(
+        bot, tasks_concurrency_limit=config.webhook.polling_tasks)
 
 
 asyncio.run(main())
@@ -1,36 +1,76 @@
+import asyncio
 from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
-from aiogram.types import Update, Message, CallbackQuery, TelegramObject
+from aiogram.types import Update, TelegramObject
 from database.db import online_users
+from services.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# Таблица: поле Update -> атрибут с пользователем внутри этого события.
+# Оставляем только поля, которые есть в установленной версии aiogram
+USER_FIELDS: tuple[tuple[str, str], ...] = tuple(
+    (update_field, user_attr) for update_field, user_attr in (
+        ('message', 'from_user'),
+        ('callback_query', 'from_user'),
+        ('edited_message', 'from_user'),
+        ('inline_query', 'from_user'),
+        ('chosen_inline_result', 'from_user'),
+        ('poll_answer', 'user'),
+        ('message_reaction', 'user'),
+        ('business_connection', 'user'),
+        ('business_message', 'from_user'),
+        ('edited_business_message', 'from_user'),
+        ('shipping_query', 'from_user'),
+        ('pre_checkout_query', 'from_user'),
+        ('purchased_paid_media', 'from_user'),
+        ('my_chat_member', 'from_user'),
+        ('chat_member', 'from_user'),
+        ('chat_join_request', 'from_user'),
+    ) if update_field in Update.model_fields
+)
+
+
+def extract_user_id(update: Update) -> Optional[int]:
+    # Первое непустое поле Update и есть событие (остальные - None)
+    for update_field, user_attr in USER_FIELDS:
+        if (update_event := getattr(update, update_field)) is not None:
+            user = getattr(update_event, user_attr)
+            return user.id if user is not None else None
+    return None
 
 
 class OnlineUserMiddleware(BaseMiddleware):
+    def __init__(self, deferred: bool = False) -> None:
+        # deferred=True - отмечаем присутствие после передачи апдейта
+        # хэндлеру, вне критического пути его обработки: id копятся
+        # и записываются одной пачкой на следующей итерации цикла событий
+        self.deferred = deferred
+        self._pending: list[int] = []
+
+    def _flush_pending(self) -> None:
+        for user_id in self._pending:
+            online_users.set_online(user_id)
+        self._pending.clear()
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        def extract_user_id(update: Update) -> Optional[int]:
-            # Извлекаем событие из Update
-            if update.message:
-                if update.message.from_user:
-                    return update.message.from_user.id
-            elif update.callback_query:
-                return update.callback_query.from_user.id
-            elif update.poll_answer:
-                if update.poll_answer.user:
-                    return update.poll_answer.user.id
-            # Добавьте обработку других типов событий при необходимости
-            return None
-
-        # Приводим event к типу Update
-        update_event = Update.model_validate(event, from_attributes=True)
-
-        user_id = extract_user_id(update_event)
-        if user_id is not None:
-            online_users.set_online(user_id)
+        # event уже разобран диспетчером - читаем id без повторной валидации
+        user_id = extract_user_id(event)  # type: ignore[arg-type]
+        if user_id is None:
+            logger.debug('No user info in update',
+                         update_id=event.update_id)  # type: ignore
+        elif self.deferred:
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._flush_pending)
+            self._pending.append(user_id)
         else:
-            print(f"No user info in event: {event}")
+            online_users.set_online(user_id)
 
         return await handler(event, data)
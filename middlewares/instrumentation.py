@@ -0,0 +1,102 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware, NextRequestMiddlewareType)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from services.metrics import CounterChild, HistogramChild, metrics
+
+
+HANDLER_SECONDS = metrics.histogram(
+    'bot_handler_seconds', 'Handler latency, seconds',
+    labels=('router', 'handler'))
+HANDLER_ERRORS = metrics.counter(
+    'bot_handler_errors_total', 'Exceptions raised by handlers',
+    labels=('router', 'handler'))
+
+API_SECONDS = metrics.histogram(
+    'bot_api_request_seconds', 'Bot API call latency, seconds',
+    labels=('method',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+API_ERRORS = metrics.counter(
+    'bot_api_errors_total', 'Failed Bot API calls',
+    labels=('method', 'error'))
+
+
+# Время работы хэндлеров. Регистрируется внутренним middleware на
+# наблюдателях диспетчера - так оно действует и во всех дочерних роутерах.
+# Роутер в метке - модуль хэндлера (у роутеров бота нет имен)
+class HandlerMetricsMiddleware(BaseMiddleware):
+    def __init__(self) -> None:
+        # id(HandlerObject) -> его гистограмма и счетчик ошибок. Хэндлеры
+        # живут все время работы бота, так что id не переиспользуются
+        self._series: dict[int, tuple[HistogramChild, CounterChild]] = {}
+
+    def _series_of(self, handler: Any) -> tuple[HistogramChild,
+                                                CounterChild]:
+        callback = handler.callback
+        labels = (callback.__module__.rsplit('.', 1)[-1],
+                  getattr(callback, '__name__', type(callback).__name__))
+        series = self._series[id(handler)] = (
+            HANDLER_SECONDS.labels(*labels), HANDLER_ERRORS.labels(*labels))
+        return series
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data['handler']
+        series = self._series.get(id(handler_object))
+        if series is None:
+            series = self._series_of(handler_object)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            series[1].inc()
+            raise
+        finally:
+            series[0].observe(time.perf_counter() - start)
+
+
+# Время и ошибки запросов к Bot API по методам. Регистрируется в сессии
+# бота: bot.session.middleware(BotApiMetricsMiddleware())
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    def __init__(self) -> None:
+        self._latency: dict[str, HistogramChild] = {}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        latency = self._latency.get(name)
+        if latency is None:
+            latency = self._latency[name] = API_SECONDS.labels(name)
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as error:
+            API_ERRORS.labels(name, type(error).__name__).inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+
+def register_metrics_middlewares(dispatcher: Dispatcher, bot: Bot) -> None:
+    """
+    Время хэндлеров - на всех наблюдателях диспетчера, кроме update (там
+    не хэндлеры, а разбор апдейта), время запросов - в сессии бота.
+    """
+    middleware = HandlerMetricsMiddleware()
+    for name, observer in dispatcher.observers.items():
+        if name != 'update':
+            observer.middleware(middleware)
+    bot.session.middleware(BotApiMetricsMiddleware())
@@ -0,0 +1,139 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from services.outbound import Priority, outbound
+
+
+# Ключ живого сообщения с обратным отсчетом: (chat_id, message_id)
+CountdownKey = tuple[int, int]
+
+
+@dataclass
+class CountdownEntry:
+    bot: Bot
+    template: str  # Текст сообщения с подстановкой {seconds}
+    deadline: float  # Момент (time.monotonic) окончания отсчета
+    last_text: str = ''  # Последний отправленный в Telegram текст
+
+
+@dataclass
+class CountdownStats:
+    ticks: int = 0
+    edits: int = 0  # Отправленные редактирования
+    skipped: int = 0  # Пропущенные, т.к. текст не изменился
+    deferred: int = 0  # Отложенные из-за насыщения очереди
+    failed: int = 0
+    rate_limited: int = 0  # Ответы 429 Too Many Requests
+    interval: float = 0.0  # Текущий период обновления
+    in_flight: int = 0
+    live: int = 0
+
+
+# Общий сервис, владеющий всеми сообщениями "осталось N секунд"
+class CountdownRenderer:
+    def __init__(self, base_interval: float = 0.5,
+                 max_interval: float = 5.0,
+                 max_in_flight: int = 25,
+                 max_outbound_depth: int = 100) -> None:
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.max_in_flight = max_in_flight  # Порог насыщения очереди
+        # Очередь исходящих сообщений, при которой отсчет уступает место
+        self.max_outbound_depth = max_outbound_depth
+        self.interval = base_interval
+        self.entries: dict[CountdownKey, CountdownEntry] = {}
+        self.stats = CountdownStats(interval=base_interval)
+        # Идущие правки: цикл событий держит задачи только по слабой ссылке
+        self._tasks: set[asyncio.Task] = set()
+        self._retry_until = 0.0
+
+    @staticmethod
+    def render(template: str, deadline: float, now: float) -> str:
+        seconds = max(math.ceil(deadline - now), 0)
+        return template.format(seconds=seconds)
+
+    def register(self, bot: Bot, chat_id: int, message_id: int,
+                 template: str, deadline: float) -> None:
+        '''Берет уже отправленное сообщение под управление сервиса'''
+        entry = CountdownEntry(bot=bot, template=template, deadline=deadline)
+        # Текст первого сообщения отправил сам вызывающий
+        entry.last_text = self.render(template, deadline, time.monotonic())
+        self.entries[(chat_id, message_id)] = entry
+
+    def unregister(self, chat_id: int, message_id: int) -> None:
+        self.entries.pop((chat_id, message_id), None)
+
+    @property
+    def saturated(self) -> bool:
+        return (len(self._tasks) >= self.max_in_flight
+                or outbound.depth >= self.max_outbound_depth
+                or time.monotonic() < self._retry_until)
+
+    def _adapt_interval(self) -> None:
+        # При насыщении реже обновляем отсчет, иначе возвращаемся к базе
+        if self.saturated:
+            self.interval = min(self.interval * 2, self.max_interval)
+        else:
+            self.interval = max(self.interval / 2, self.base_interval)
+        self.stats.interval = self.interval
+
+    async def _edit(self, key: CountdownKey, entry: CountdownEntry,
+                    text: str) -> None:
+        chat_id, message_id = key
+        try:
+            await outbound.edit_message_text(
+                entry.bot, chat_id=chat_id, message_id=message_id,
+                text=text, priority=Priority.COUNTDOWN)
+            self.stats.edits += 1
+        except TelegramRetryAfter as error:
+            # Telegram просит подождать — считаем очередь насыщенной
+            self._retry_until = time.monotonic() + error.retry_after
+            entry.last_text = ''  # Повторим на следующем тике
+            self.stats.rate_limited += 1
+        except TelegramAPIError:
+            # Сообщение удалено или уже не изменить — отпускаем его
+            self.stats.failed += 1
+            self.entries.pop(key, None)
+
+    def tick(self) -> None:
+        '''Один общий проход по всем живым сообщениям'''
+        now = time.monotonic()
+        self.stats.ticks += 1
+        for key, entry in list(self.entries.items()):
+            if self.saturated:
+                self.stats.deferred += 1
+                continue
+            text = self.render(entry.template, entry.deadline, now)
+            if text == entry.last_text:
+                self.stats.skipped += 1
+                continue
+            entry.last_text = text
+            task = asyncio.create_task(self._edit(key, entry, text))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.stats.in_flight = len(self._tasks)
+        self.stats.live = len(self.entries)
+        self._adapt_interval()
+
+    async def close(self) -> None:
+        '''Отменяет идущие правки и дожидается их (при остановке бота)'''
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Глобальный сервис обратного отсчета
+countdown = CountdownRenderer()
+
+
+async def countdown_task(countdown: CountdownRenderer) -> None:
+    """Обновляет все сообщения с обратным отсчетом на общем тике."""
+    while True:
+        await asyncio.sleep(countdown.interval)
+        countdown.tick()
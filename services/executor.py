@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from services.logs import get_logger
+from services.metrics import metrics
+
+
+logger = get_logger(__name__)
+
+
+# Задание исполнителя: функция без аргументов, возвращающая корутину
+Job = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class ExecutorStats:
+    submitted: int = 0
+    rejected: int = 0  # Не приняты: очередь полна или идет остановка
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0  # Не успели до конца таймаута остановки
+    max_queued: int = 0
+    wait_max: float = 0.0  # Дольше всего задание ждало в очереди, с
+
+
+# Фоновый исполнитель сценариев игры: одновременно выполняется не больше
+# workers заданий, остальные ждут в очереди. Воркеры создаются по мере
+# надобности и завершаются, когда очередь пуста
+class BackgroundExecutor:
+    def __init__(self, workers: int = 256, queue_size: int = 10000) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self.closing = False  # Идет остановка - новые задания не принимаем
+        self.stats = ExecutorStats()
+        # Ожидающие: (задание, future с его результатом, момент постановки)
+        self._queue: deque[tuple[Job, asyncio.Future, float]] = deque()
+        self._tasks: set[asyncio.Task] = set()
+        self._active = 0  # Воркеры, еще не вышедшие из цикла
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return self._active
+
+    def submit(self, job: Job,
+               critical: bool = False) -> asyncio.Future | None:
+        '''
+        Ставит задание в очередь и возвращает future с его результатом.
+        Обычное задание не принимается (None), если очередь полна или
+        исполнитель останавливается. critical - продолжение уже идущего
+        сценария - принимается всегда: иначе начатые игры зависнут.
+        '''
+        if not critical and (self.closing
+                             or len(self._queue) >= self.queue_size):
+            self.stats.rejected += 1
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((job, future, time.monotonic()))
+        self.stats.submitted += 1
+        self.stats.max_queued = max(self.stats.max_queued, len(self._queue))
+        if self._active < self.workers:
+            self._active += 1
+            task = loop.create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return future
+
+    async def _work(self) -> None:
+        try:
+            while self._queue:
+                job, future, enqueued_at = self._queue.popleft()
+                self.stats.wait_max = max(self.stats.wait_max,
+                                          time.monotonic() - enqueued_at)
+                try:
+                    result = await job()
+                except asyncio.CancelledError:
+                    self.stats.cancelled += 1
+                    future.cancel()
+                    raise
+                except Exception as error:
+                    self.stats.failed += 1
+                    logger.exception('Background job failed')
+                    future.set_exception(error)
+                else:
+                    self.stats.completed += 1
+                    future.set_result(result)
+        finally:
+            # Счетчик уменьшаем сразу, а не в done-callback задачи: иначе
+            # submit может успеть решить, что свободных воркеров нет
+            self._active -= 1
+
+    async def drain(self, timeout: float = 30) -> None:
+        '''
+        Перестает принимать новые задания и дожидается принятых. Что не
+        успело выполниться за timeout секунд, отменяется.
+        '''
+        self.closing = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Продолжения идущих игр принимаются и во время остановки
+        while self._tasks and (left := deadline - loop.time()) > 0:
+            await asyncio.wait(set(self._tasks), timeout=left)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while self._queue:
+            _, future, _ = self._queue.popleft()
+            future.cancel()
+            self.stats.cancelled += 1
+
+
+# Общий исполнитель игровых сессий (настраивается в main.py)
+game_executor = BackgroundExecutor()
+
+metrics.collect('bot_game_executor_running', 'Game jobs being executed',
+                lambda: game_executor.running)
+metrics.collect('bot_game_executor_queued', 'Game jobs waiting for a worker',
+                lambda: game_executor.queued)
+metrics.collect('bot_game_executor_jobs_total', 'Game jobs by result',
+                lambda: {(result,): getattr(game_executor.stats, result)
+                         for result in ('completed', 'failed', 'cancelled',
+                                        'rejected')},
+                kind='counter', labels=('result',))
@@ -0,0 +1,243 @@
+import json
+import logging
+import queue
+import random
+import sys
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable
+
+from config_data.config import LoggingConfig
+
+
+TEXT_FORMAT = ('%(filename)s:%(lineno)d #%(levelname)-8s '
+               '[%(asctime)s] - %(name)s - %(message)s')
+
+# Значения полей, которые можно отдать потоку записи как есть
+PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+@dataclass
+class LogStats:
+    sampled_out: int = 0  # Отброшены выборкой
+    dropped: int = 0  # Очередь полна: поток записи не успевает
+
+
+class lazy:
+    """
+    Поле записи, которое вычисляется, только если запись действительно
+    попадет в лог: logger.debug('...', users=lazy(len, online_users.users))
+    """
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function: Callable[..., Any], *args: Any) -> None:
+        self.function = function
+        self.args = args
+
+    def __call__(self) -> Any:
+        return self.function(*self.args)
+
+
+def _resolve(value: Any) -> Any:
+    if isinstance(value, lazy):
+        try:
+            value = value()
+        except Exception as error:
+            return f'<lazy field failed: {error!r}>'
+    return value if isinstance(value, PLAIN_TYPES) else repr(value)
+
+
+# Выборка записей по модулям: из записей ниже WARNING логгера name (и
+# его потомков) в лог попадает доля rates[name]. Предупреждения и ошибки
+# пишутся всегда
+class SamplingFilter(logging.Filter):
+    def __init__(self, stats: LogStats) -> None:
+        super().__init__()
+        self.stats = stats
+        self.rates: dict[str, float] = {}
+        self._rate_of: dict[str, float] = {}  # Имя логгера -> его доля
+
+    def configure(self, rates: dict[str, float]) -> None:
+        self.rates = rates
+        self._rate_of.clear()
+
+    def rate(self, name: str) -> float:
+        rate = self._rate_of.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._rate_of[name] = rate
+        return rate
+
+    def keep(self, name: str) -> bool:
+        rate = self.rate(name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        self.stats.sampled_out += 1
+        return False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Записи StructLogger проходят выборку еще до создания
+        if record.levelno >= logging.WARNING or hasattr(record, 'fields'):
+            return True
+        return self.keep(record.name)
+
+
+# Отброшенные выборкой и из-за переполненной очереди записи
+log_stats = LogStats()
+sampling = SamplingFilter(log_stats)
+
+
+# Логгер со структурированными полями: logger.info('Game finished',
+# winner=user_id). Выключенный уровень и выборка отсекают строку до
+# создания записи - она стоит одного сравнения, а lazy-поля не
+# вычисляются вовсе
+class StructLogger:
+    __slots__ = ('logger',)
+
+    def __init__(self, name: str) -> None:
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: dict[str, Any],
+             exc_info: Any = None) -> None:
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        elif isinstance(exc_info, BaseException):
+            exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+        # Место вызова - кадр того, кто вызвал debug, info и т.д.: так
+        # дешевле, чем поиск по стеку в Logger.findCaller
+        frame = sys._getframe(2)
+        record = self.logger.makeRecord(
+            self.logger.name, level, frame.f_code.co_filename,
+            frame.f_lineno, event, (), exc_info, frame.f_code.co_name,
+            {'fields': fields})
+        self.logger.handle(record)
+
+    def debug(self, event: str, /, **fields: Any) -> None:
+        if (self.logger.isEnabledFor(logging.DEBUG)
+                and sampling.keep(self.logger.name)):
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, /, **fields: Any) -> None:
+        if (self.logger.isEnabledFor(logging.INFO)
+                and sampling.keep(self.logger.name)):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, /, exc_info: Any = None,
+                **fields: Any) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields, exc_info)
+
+    def error(self, event: str, /, exc_info: Any = None,
+              **fields: Any) -> None:
+        '''exc_info - исключение, чей traceback приложить к записи'''
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, exc_info)
+
+    def exception(self, event: str, /, **fields: Any) -> None:
+        '''Ошибка с traceback обрабатываемого исключения'''
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, True)
+
+
+def get_logger(name: str) -> StructLogger:
+    """Структурированный логгер модуля: get_logger(__name__)"""
+    return StructLogger(name)
+
+
+# Обработчик цикла событий: запись только кладется в очередь, а
+# форматирует и пишет ее QueueListener в своем потоке. Если поток не
+# успевает и очередь полна, запись отбрасывается - бот не ждет вывода
+class AsyncQueueHandler(QueueHandler):
+    def __init__(self, records: queue.SimpleQueue, stats: LogStats,
+                 queue_size: int = 10000) -> None:
+        # SimpleQueue без блокировок Queue в разы дешевле; предел
+        # очереди проверяем сами
+        super().__init__(records)  # type: ignore[arg-type]
+        self.records = records
+        self.stats = stats
+        self.queue_size = queue_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Все, что зависит от изменяемого состояния бота, вычисляется
+        # здесь, в потоке цикла событий: поток записи видит только строки
+        # и числа. Traceback форматируется уже в потоке записи
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = {name: _resolve(value)
+                             for name, value in fields.items()}
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.records.qsize() >= self.queue_size:
+            self.stats.dropped += 1
+        else:
+            self.records.put_nowait(record)
+
+
+def _format_field(value: Any) -> str:
+    if isinstance(value, str):
+        if value and not any(char.isspace() or char in '"='
+                             for char in value):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_lines: bool = False) -> None:
+        '''json_lines - по объекту JSON на запись, иначе текст и key=value'''
+        super().__init__(TEXT_FORMAT)
+        self.json_lines = json_lines
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ''.join(f' {name}={_format_field(value)}'
+                            for name, value in fields.items())
+        return line
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not self.json_lines:
+            return super().format(record)
+        entry = {'time': self.formatTime(record), 'level': record.levelname,
+                 'logger': record.name, 'event': record.getMessage(),
+                 'source': f'{record.filename}:{record.lineno}',
+                 **(getattr(record, 'fields', None) or {})}
+        if record.exc_info:
+            entry['traceback'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=repr)
+
+
+def setup_logging(config: LoggingConfig) -> QueueListener:
+    """
+    Направляет все логгеры (и библиотек тоже) через очередь в поток
+    записи, настраивает уровни и выборку по модулям. Возвращает
+    запущенный QueueListener: его stop() дописывает очередь.
+    """
+    # Процесс и поток в формате не выводятся - не собираем их в записи
+    logging.logProcesses = logging.logMultiprocessing = False
+    logging.logThreads = False
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(StructuredFormatter(config.format == 'json'))
+    handler = AsyncQueueHandler(records, log_stats, config.queue_size)
+    sampling.configure(config.sampling)
+    handler.addFilter(sampling)
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+    root.addHandler(handler)
+    root.setLevel(config.level.upper())
+    for name, level in config.levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+    listener = QueueListener(records, output)
+    listener.start()
+    return listener
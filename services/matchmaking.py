@@ -0,0 +1,280 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from itertools import islice
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from database.resp import RespError
+from handlers.user_handlers.game_managers import GameSession
+from keyboards.keyboards import create_inline_kb
+from lexicon.lexicon_ru import LEXICON
+from services.logs import get_logger
+from services.metrics import metrics
+from services.outbound import Priority, outbound
+from services.services import get_random_online_users
+from services.tournament import tournaments
+from states.states import FSMPlay
+
+
+logger = get_logger(__name__)
+
+
+# Пара игроков, найденная подборщиком
+Pair = tuple[int, int]
+
+# Сколько случайных игроков онлайн рассматривать для ждущего в одиночку
+ONLINE_CANDIDATES = 5
+
+WAIT_SECONDS = metrics.histogram(
+    'bot_matchmaking_wait_seconds',
+    'Time from joining the queue to getting an opponent, seconds',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+
+@dataclass
+class MatchmakingStats:
+    enqueued: int = 0
+    matched: int = 0  # Сколько игроков получили соперника
+    skipped_busy: int = 0  # Выброшены из очереди, т.к. уже в игре
+    busy_check_failed: int = 0  # Общее хранилище не ответило о занятости
+    expired: int = 0  # Не дождались соперника за max_wait
+    invited: int = 0  # Соперник - приглашенный игрок онлайн, не из очереди
+    failed: int = 0  # Пары, которые не удалось опубликовать
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    # Время ожидания последних подобранных игроков для перцентилей
+    recent_waits: deque[float] = field(
+        default_factory=lambda: deque(maxlen=1000))
+
+
+# Очередь игроков, ищущих соперника
+class MatchmakingQueue:
+    def __init__(self, pair_interval: float = 0.005,
+                 batch_size: int = 500, max_wait: float = 60,
+                 invite_after: float = 5) -> None:
+        self.pair_interval = pair_interval  # Пауза для накопления пачки
+        self.batch_size = batch_size  # Максимум пар за один проход
+        self.max_wait = max_wait
+        # Через сколько секунд одиночного ожидания звать в соперники
+        # случайного игрока онлайн - и из других процессов бота, если
+        # онлайн общий (0 - не звать)
+        self.invite_after = invite_after
+        # user_id -> момент постановки в очередь, в порядке постановки
+        self.waiting: OrderedDict[int, float] = OrderedDict()
+        # Приглашенные из онлайна: user_id -> когда. Повторно их не зовем,
+        # пока не пройдет max_wait
+        self.invited: OrderedDict[int, float] = OrderedDict()
+        self.ready = asyncio.Event()  # В очереди есть хотя бы пара
+        self.stats = MatchmakingStats()
+
+    @property
+    def depth(self) -> int:
+        return len(self.waiting)
+
+    def enqueue(self, user_id: int) -> bool:
+        '''Ставит игрока в очередь, False - если он уже в ней'''
+        if user_id in self.waiting:
+            return False
+        self.waiting[user_id] = time.monotonic()
+        self.stats.enqueued += 1
+        if len(self.waiting) >= 2:
+            self.ready.set()
+        return True
+
+    def discard(self, user_id: int) -> None:
+        self.waiting.pop(user_id, None)
+
+    def wait_percentile(self, q: float) -> float:
+        waits = sorted(self.stats.recent_waits)
+        if not waits:
+            return 0.0
+        return waits[min(int(len(waits) * q), len(waits) - 1)]
+
+    def _record_wait(self, enqueued_at: float, now: float) -> None:
+        wait = now - enqueued_at
+        self.stats.matched += 1
+        self.stats.wait_total += wait
+        self.stats.wait_max = max(self.stats.wait_max, wait)
+        self.stats.recent_waits.append(wait)
+        WAIT_SECONDS.observe(wait)
+
+    def pop_expired(self) -> list[int]:
+        '''Забирает из начала очереди тех, кто ждет дольше max_wait'''
+        deadline = time.monotonic() - self.max_wait
+        expired: list[int] = []
+        while self.waiting and self.waiting[
+                next(iter(self.waiting))] <= deadline:
+            expired.append(self.waiting.popitem(last=False)[0])
+        self.stats.expired += len(expired)
+        return expired
+
+    async def _playing_elsewhere(self, user_ids: list[int]) -> set[int]:
+        '''Кто из user_ids играет в других процессах бота'''
+        shared_state = GameSession.shared_state
+        if shared_state is None or not user_ids:
+            return set()
+        try:
+            playing = await shared_state.is_playing(user_ids)
+        except (ConnectionError, RespError) as error:
+            # Без общего хранилища полагаемся на проверку своего процесса
+            self.stats.busy_check_failed += 1
+            logger.warning('Matchmaking busy check failed', error=error)
+            return set()
+        return {user_id for user_id, busy in zip(user_ids, playing) if busy}
+
+    def _invitable(self, user_id: int) -> bool:
+        return not (user_id in self.waiting or user_id in self.invited
+                    or GameSession.is_playing(user_id)
+                    or user_id in tournaments.entered)
+
+    async def _online_opponent(self, user_id: int,
+                               now: float) -> int | None:
+        '''Свободный игрок онлайн для user_id, давно ждущего в одиночку'''
+        while self.invited and self.invited[
+                next(iter(self.invited))] <= now - self.max_wait:
+            self.invited.popitem(last=False)
+        candidates = [
+            opponent_id for opponent_id
+            in get_random_online_users(user_id, ONLINE_CANDIDATES)
+            if self._invitable(opponent_id)
+        ]
+        busy = await self._playing_elsewhere(candidates)
+        for opponent_id in candidates:
+            if opponent_id not in busy and self._invitable(opponent_id):
+                self.invited[opponent_id] = now
+                self.stats.invited += 1
+                return opponent_id
+        return None
+
+    async def pop_pairs(self) -> list[Pair]:
+        '''
+        Забирает из начала очереди до batch_size пар. Игроки, которые уже
+        играют в этом или (по общему хранилищу) в другом процессе бота,
+        выбрасываются. Непарный игрок остается, а если ждет дольше
+        invite_after - ему зовется игрок онлайн.
+        '''
+        head = list(islice(self.waiting, 2 * self.batch_size))
+        busy = await self._playing_elsewhere(head)
+        now = time.monotonic()
+        pairs: list[Pair] = []
+        pending: tuple[int, float] | None = None
+        for user_id in head:
+            # Пока ждали хранилище, игрок мог покинуть очередь
+            enqueued_at = self.waiting.pop(user_id, None)
+            if enqueued_at is None:
+                continue
+            if user_id in busy or GameSession.is_playing(user_id):
+                self.stats.skipped_busy += 1
+                continue
+            if pending is None:
+                pending = (user_id, enqueued_at)
+                continue
+            self._record_wait(pending[1], now)
+            self._record_wait(enqueued_at, now)
+            pairs.append((pending[0], user_id))
+            pending = None
+        if pending is not None:
+            user_id, enqueued_at = pending
+            opponent_id = None
+            if self.invite_after and now - enqueued_at >= self.invite_after:
+                opponent_id = await self._online_opponent(user_id, now)
+            if opponent_id is not None:
+                self._record_wait(enqueued_at, now)
+                pairs.append((user_id, opponent_id))
+            elif user_id not in self.waiting:
+                # Возвращаем непарного в начало очереди
+                self.waiting[user_id] = enqueued_at
+                self.waiting.move_to_end(user_id, last=False)
+        if len(self.waiting) < 2:
+            self.ready.clear()
+        return pairs
+
+
+# Глобальная очередь подбора соперников
+matchmaking_queue = MatchmakingQueue()
+
+metrics.collect('bot_matchmaking_queue_depth',
+                'Players waiting for an opponent',
+                lambda: matchmaking_queue.depth)
+metrics.collect('bot_matchmaking_players_total',
+                'Players leaving the matchmaking queue, by result',
+                lambda: {(result,): getattr(matchmaking_queue.stats, result)
+                         for result in ('matched', 'skipped_busy',
+                                        'expired')},
+                kind='counter', labels=('result',))
+metrics.collect('bot_matchmaking_invited_total',
+                'Online players invited as opponents for a lone waiter',
+                lambda: matchmaking_queue.stats.invited, kind='counter')
+metrics.collect('bot_matchmaking_publish_failures_total',
+                'Pairs that could not be published',
+                lambda: matchmaking_queue.stats.failed, kind='counter')
+
+
+def _get_context(bot: Bot, storage: BaseStorage, user_id: int) -> FSMContext:
+    key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+    return FSMContext(storage=storage, key=key)
+
+
+async def publish_pair(bot: Bot, storage: BaseStorage, pair: Pair) -> None:
+    '''Сохраняет соперников в FSM обоих игроков и рассылает приглашения'''
+    user_id, opponent_id = pair
+    user_state = _get_context(bot, storage, user_id)
+    opponent_state = _get_context(bot, storage, opponent_id)
+
+    # Сначала состояние и соперник, чтобы кнопки сразу работали
+    await user_state.set_state(FSMPlay.waiting_game_start)
+    await opponent_state.set_state(FSMPlay.waiting_game_start)
+    await user_state.update_data(opponent_id=opponent_id)
+    await opponent_state.update_data(opponent_id=user_id)
+
+    waiting_game_start_kb = create_inline_kb('start_game', 'refuse')
+
+    # Отправляем сообщение сопернику о том, что его выбрали для игры
+    await outbound.send_message(
+        bot,
+        chat_id=opponent_id,
+        text=LEXICON['you_are_chosen'].format(user_id=user_id),
+        priority=Priority.CRITICAL,
+        reply_markup=waiting_game_start_kb
+    )
+
+    # Отправляем сообщение пользователю о его сопернике
+    await outbound.send_message(
+        bot,
+        chat_id=user_id,
+        text=LEXICON['your_opponent'].format(opponent_id=opponent_id),
+        priority=Priority.CRITICAL,
+        reply_markup=waiting_game_start_kb,
+        parse_mode='HTML'
+    )
+
+
+async def notify_expired(bot: Bot, storage: BaseStorage,
+                         user_id: int) -> None:
+    await outbound.send_message(bot, chat_id=user_id,
+                                text=LEXICON['opponent_not_found'])
+    await _get_context(bot, storage, user_id).clear()
+
+
+async def matchmaking_task(queue: MatchmakingQueue, bot: Bot,
+                           storage: BaseStorage) -> None:
+    """Фоновый подборщик: пачками формирует пары из очереди."""
+    while True:
+        try:  # Просыпаемся, когда есть пара, или раз в секунду
+            await asyncio.wait_for(queue.ready.wait(), timeout=1)
+            # Даем очереди накопиться, чтобы подбирать пары пачкой
+            await asyncio.sleep(queue.pair_interval)
+        except asyncio.TimeoutError:
+            pass
+        jobs = [notify_expired(bot, storage, user_id)
+                for user_id in queue.pop_expired()]
+        jobs += [publish_pair(bot, storage, pair)
+                 for pair in await queue.pop_pairs()]
+        for result in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(result, Exception):
+                queue.stats.failed += 1
+                logger.error('Matchmaking publish failed', exc_info=result)
@@ -0,0 +1,242 @@
+import math
+from bisect import bisect_left
+from typing import Any, Callable, Iterator, Mapping, Sequence
+
+from aiohttp import web
+
+from services.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# Значение метрики, снимаемой при опросе: число или label-значения -> число
+Sample = float | Mapping[tuple[str, ...], float]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин гистограмм по умолчанию, с
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"'
+                     for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # Последний элемент - наблюдения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+# Метрика с набором меток: по каждому набору значений меток - свой
+# дочерний объект. Его стоит получить через labels() один раз и держать:
+# тогда запись - одно сложение без поиска в словаре
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._children: dict[tuple[str, ...], Any] = {}
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def header(self) -> Iterator[str]:
+        documentation = (self.documentation.replace('\\', '\\\\')
+                         .replace('\n', '\\n'))
+        yield f'# HELP {self.name} {documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+
+    def render(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def labels(self, *values: str) -> CounterChild:
+        return super().labels(*values)  # type: ignore[return-value]
+
+    def inc(self, amount: float = 1) -> None:
+        '''Для метрики без меток'''
+        self.labels().inc(amount)
+
+    def render(self) -> Iterator[str]:
+        yield from self.header()
+        for values, child in self._children.items():
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}{labels} {_format_value(child.value)}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def labels(self, *values: str) -> HistogramChild:
+        return super().labels(*values)  # type: ignore[return-value]
+
+    def observe(self, value: float) -> None:
+        '''Для метрики без меток'''
+        self.labels().observe(value)
+
+    def render(self) -> Iterator[str]:
+        yield from self.header()
+        names = (*self.labelnames, 'le')
+        bounds = (*self.buckets, math.inf)
+        for values, child in self._children.items():
+            total = 0
+            for bound, count in zip(bounds, child.counts):
+                total += count
+                labels = _format_labels(names, (*values, _format_value(bound)))
+                yield f'{self.name}_bucket{labels} {total}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(child.sum)}'
+            yield f'{self.name}_count{labels} {total}'
+
+
+# Метрика, значение которой считается при опросе: запись ничего не стоит,
+# а считать ее можно по уже существующим счетчикам и коллекциям
+class Collected(_Metric):
+    def __init__(self, name: str, documentation: str,
+                 function: Callable[[], Sample], kind: str = 'gauge',
+                 labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.function = function
+
+    def render(self) -> Iterator[str]:
+        sample = self.function()
+        yield from self.header()
+        if not isinstance(sample, Mapping):
+            sample = {(): sample}
+        for values, value in sample.items():
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}{labels} {_format_value(value)}'
+
+
+# Реестр метрик в текстовом формате Prometheus 0.0.4. Метрики заводят
+# модули, которые их пишут; отдает их HTTP-сервер в том же цикле событий
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, _Metric] = {}
+        self.failed = 0  # Опросы, на которых метрика не посчиталась
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labels: Sequence[str] = ()) -> Counter:
+        return self._register(  # type: ignore[return-value]
+            Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str,
+                  labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(  # type: ignore[return-value]
+            Histogram(name, documentation, labels, buckets))
+
+    def collect(self, name: str, documentation: str,
+                function: Callable[[], Sample], kind: str = 'gauge',
+                labels: Sequence[str] = ()) -> Collected:
+        '''
+        function вызывается при каждом опросе и возвращает число или
+        словарь: кортеж значений меток -> число. kind - gauge или counter
+        (для уже накопленных где-то счетчиков).
+        '''
+        return self._register(  # type: ignore[return-value]
+            Collected(name, documentation, function, kind, labels))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # Одна сломанная метрика не должна лишать опроса остальных
+                self.failed += 1
+                logger.exception('Metric failed', metric=metric.name)
+        lines.append('')
+        return '\n'.join(lines)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.render().encode(),
+                            headers={'Content-Type': CONTENT_TYPE})
+
+
+metrics = MetricsRegistry()
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str,
+                               port: int) -> web.AppRunner:
+    """
+    Отдает метрики по GET /metrics в текущем цикле событий. Возвращает
+    runner: его cleanup() останавливает сервер.
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', registry.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
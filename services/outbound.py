@@ -0,0 +1,318 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (DeleteMessage, EditMessageText, SendMessage,
+                             TelegramMethod)
+from aiogram.types import Message
+
+from services.metrics import metrics
+
+
+class Priority(enum.IntEnum):
+    CRITICAL = 0  # Ход игры: приглашения, раунды, результаты
+    NORMAL = 1  # Меню и прочие ответы
+    COUNTDOWN = 2  # Обновления обратного отсчета
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Пауза по retry_after от Telegram
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        '''Момент, когда в ведре появится токен (now - если уже есть)'''
+        self._refill(now)
+        ready = now if self.tokens >= 1 else (
+            now + (1 - self.tokens) / self.rate)
+        return max(ready, self.blocked_until)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass
+class OutboundJob:
+    bot: Bot
+    method: TelegramMethod
+    priority: Priority
+    chat_id: int | str | None
+    enqueued_at: float
+    # Ожидающие результата (несколько - если правки сообщения слились)
+    futures: list[asyncio.Future] = field(default_factory=list)
+    merge_key: tuple[Any, Any] | None = None
+    retries: int = 0
+
+
+@dataclass
+class OutboundStats:
+    submitted: int = 0
+    sent: int = 0
+    merged: int = 0  # Правки, слитые с еще не отправленной правкой
+    retries: int = 0  # Повторы после 429 Too Many Requests
+    failed: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    recent_waits: deque[float] = field(
+        default_factory=lambda: deque(maxlen=1000))
+
+
+# Планировщик исходящих запросов к Bot API с учетом лимитов Telegram
+class OutboundScheduler:
+    def __init__(self, global_rate: float = 30, global_burst: float = 30,
+                 chat_rate: float = 1, chat_burst: float = 5,
+                 max_retries: int = 3) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_buckets: dict[int | str, TokenBucket] = {}
+        self.stats = OutboundStats()
+        self._seq = itertools.count()
+        # Готовые к отправке: (приоритет, порядковый номер, задание)
+        self._ready: list[tuple[int, int, OutboundJob]] = []
+        # Ждущие токена своего чата: (когда можно, приоритет, номер, задание)
+        self._deferred: list[tuple[float, int, int, OutboundJob]] = []
+        self._pending_edits: dict[tuple[Any, Any], OutboundJob] = {}
+        self._depth: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        # Идущие запросы: цикл событий держит задачи только по слабой ссылке
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def depth(self) -> int:
+        return sum(self._depth.values())
+
+    def depth_by_priority(self) -> dict[Priority, int]:
+        return dict(self._depth)
+
+    def wait_percentile(self, q: float) -> float:
+        waits = sorted(self.stats.recent_waits)
+        if not waits:
+            return 0.0
+        return waits[min(int(len(waits) * q), len(waits) - 1)]
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if (self._worker is None or self._worker.done()
+                or self._worker.get_loop() is not loop):
+            # Event привязывается к циклу при первом ожидании
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+    def _push(self, job: OutboundJob) -> None:
+        heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def submit(self, bot: Bot, method: TelegramMethod,
+               priority: Priority = Priority.NORMAL) -> asyncio.Future:
+        '''Ставит запрос в очередь и возвращает future с его результатом'''
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self.stats.submitted += 1
+        merge_key = None
+        if isinstance(method, EditMessageText):
+            merge_key = (method.chat_id, method.message_id)
+            if (job := self._pending_edits.get(merge_key)) is not None:
+                # Еще не отправленную правку просто заменяем новой
+                job.method = method
+                job.futures.append(future)
+                self.stats.merged += 1
+                return future
+        job = OutboundJob(bot=bot, method=method, priority=priority,
+                          chat_id=getattr(method, 'chat_id', None),
+                          enqueued_at=time.monotonic(), futures=[future],
+                          merge_key=merge_key)
+        if merge_key is not None:
+            self._pending_edits[merge_key] = job
+        self._depth[priority] += 1
+        self._push(job)
+        return future
+
+    async def call(self, bot: Bot, method: TelegramMethod,
+                   priority: Priority = Priority.NORMAL) -> Any:
+        return await self.submit(bot, method, priority)
+
+    async def send_message(self, bot: Bot, chat_id: int, text: str,
+                           priority: Priority = Priority.NORMAL,
+                           **kwargs: Any) -> Message:
+        return await self.call(
+            bot, SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    async def answer(self, message: Message, text: str,
+                     priority: Priority = Priority.NORMAL,
+                     **kwargs: Any) -> Message:
+        '''Аналог message.answer, но через очередь'''
+        return await self.send_message(
+            message.bot, message.chat.id, text,  # type: ignore[arg-type]
+            priority, **kwargs)
+
+    async def edit_message_text(self, bot: Bot, chat_id: int,
+                                message_id: int, text: str,
+                                priority: Priority = Priority.NORMAL,
+                                **kwargs: Any) -> Any:
+        return await self.call(bot, EditMessageText(
+            chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+            priority)
+
+    async def delete_message(self, bot: Bot, chat_id: int, message_id: int,
+                             priority: Priority = Priority.NORMAL) -> bool:
+        return await self.call(bot, DeleteMessage(
+            chat_id=chat_id, message_id=message_id), priority)
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        if (bucket := self.chat_buckets.get(chat_id)) is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self, now: float) -> None:
+        # Полные ведра ничего не ограничивают - их можно забыть
+        for chat_id in [chat_id for chat_id, bucket
+                        in self.chat_buckets.items() if bucket.is_idle(now)]:
+            del self.chat_buckets[chat_id]
+
+    def _next_job(self, now: float) -> OutboundJob | float:
+        '''Следующее задание, которому можно уйти, или время ожидания'''
+        while self._deferred and self._deferred[0][0] <= now:
+            _, priority, seq, job = heapq.heappop(self._deferred)
+            heapq.heappush(self._ready, (priority, seq, job))
+        while self._ready:
+            priority, seq, job = heapq.heappop(self._ready)
+            if job.chat_id is not None:
+                ready_at = self._chat_bucket(job.chat_id).ready_at(now)
+                if ready_at > now:  # Лимит чата - откладываем задание
+                    heapq.heappush(self._deferred,
+                                   (ready_at, priority, seq, job))
+                    continue
+            return job
+        return self._deferred[0][0] - now if self._deferred else 1.0
+
+    async def _run(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            now = time.monotonic()
+            ready_at = self.global_bucket.ready_at(now)
+            if ready_at > now:  # Глобальный лимит исчерпан
+                await asyncio.sleep(ready_at - now)
+                continue
+            job = self._next_job(now)
+            if isinstance(job, float):
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), job)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.global_bucket.take()
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id).take()
+            if job.merge_key is not None:
+                self._pending_edits.pop(job.merge_key, None)
+            self._depth[job.priority] -= 1
+            wait = now - job.enqueued_at
+            self.stats.wait_total += wait
+            self.stats.wait_max = max(self.stats.wait_max, wait)
+            self.stats.recent_waits.append(wait)
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            if now - last_prune > 10:
+                self._prune_buckets(now)
+                last_prune = now
+
+    async def _execute(self, job: OutboundJob) -> None:
+        try:
+            result = await job.bot(job.method)
+        except TelegramRetryAfter as error:
+            if job.retries < self.max_retries:
+                # Telegram просит подождать: ставим на паузу чат (или всю
+                # очередь, если запрос не к чату) и повторяем после паузы
+                pause_until = time.monotonic() + error.retry_after
+                bucket = (self.global_bucket if job.chat_id is None
+                          else self._chat_bucket(job.chat_id))
+                bucket.blocked_until = max(bucket.blocked_until, pause_until)
+                job.retries += 1
+                self.stats.retries += 1
+                self._depth[job.priority] += 1
+                self._push(job)
+                return
+            self._fail(job, error)
+        except asyncio.CancelledError:
+            for future in job.futures:
+                future.cancel()
+            raise
+        except Exception as error:
+            self._fail(job, error)
+        else:
+            self.stats.sent += 1
+            for future in job.futures:
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self, timeout: float = 10) -> None:
+        '''
+        Дожидается отправки очереди и идущих запросов, но не дольше
+        timeout секунд, и останавливает планировщик. Что не успело уйти,
+        отменяется.
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while ((self.depth or self._tasks)
+               and (left := deadline - loop.time()) > 0):
+            await asyncio.sleep(min(left, 0.05))
+        tasks = list(self._tasks)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in ([job for *_, job in self._ready]
+                    + [job for *_, job in self._deferred]):
+            for future in job.futures:
+                future.cancel()
+        self._ready.clear()
+        self._deferred.clear()
+        self._pending_edits.clear()
+        self._depth = dict.fromkeys(Priority, 0)
+
+    def _fail(self, job: OutboundJob, error: Exception) -> None:
+        self.stats.failed += 1
+        for future in job.futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+# Глобальный планировщик исходящих сообщений
+outbound = OutboundScheduler()
+
+metrics.collect('bot_outbound_queued', 'Outgoing requests waiting to be sent',
+                lambda: {(priority.name.lower(),): depth for priority, depth
+                         in outbound.depth_by_priority().items()},
+                labels=('priority',))
+metrics.collect('bot_outbound_requests_total', 'Outgoing requests by result',
+                lambda: {(result,): getattr(outbound.stats, result)
+                         for result in ('sent', 'merged', 'retries',
+                                        'failed')},
+                kind='counter', labels=('result',))
@@ -0,0 +1,191 @@
+from collections import defaultdict
+from typing import Iterable, Mapping, TypeAlias
+
+from database.history import MatchRecord
+from utils.enums import MatchOutcome
+
+
+# Строка таблицы лидеров: (место, id пользователя, округленный рейтинг)
+Entry: TypeAlias = tuple[int, int, int]
+
+# Итоги, меняющие рейтинг: победа, ничья оставленных рук и ничья, когда
+# не успел никто
+RATED_OUTCOMES = (MatchOutcome.WIN, MatchOutcome.DRAW, MatchOutcome.NO_MOVES)
+
+
+# Таблица лидеров: пользователи упорядочены по убыванию округленного
+# рейтинга. Дерево Фенвика хранит число пользователей на каждое значение
+# рейтинга (от высоких к низким), так что место пользователя и
+# пользователь на заданном месте находятся за O(log R), где R - диапазон
+# рейтингов, без сортировки всех пользователей. Равные по рейтингу стоят
+# в массиве своего значения: переход на другой рейтинг - O(1) при любом
+# числе равных, а их порядок между собой произволен
+class Leaderboard:
+    MIN_RATING = 0
+    MAX_RATING = 4000
+
+    def __init__(self) -> None:
+        self.size = self.MAX_RATING - self.MIN_RATING + 1
+        self._tree = [0] * (self.size + 1)
+        # Пользователи с одинаковым рейтингом
+        self._members: dict[int, list[int]] = defaultdict(list)
+        self._bucket_of: dict[int, int] = {}  # id -> округленный рейтинг
+        self._positions: dict[int, int] = {}  # id -> индекс в _members
+
+    def __len__(self) -> int:
+        return len(self._bucket_of)
+
+    def _bucket(self, rating: float) -> int:
+        return min(max(round(rating), self.MIN_RATING), self.MAX_RATING)
+
+    def _index(self, bucket: int) -> int:
+        # Индексы дерева с 1, высокие рейтинги - в начале
+        return self.MAX_RATING - bucket + 1
+
+    def _add(self, index: int, delta: int) -> None:
+        while index <= self.size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index: int) -> int:
+        '''Число пользователей на индексах 1..index'''
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _select(self, place: int) -> int:
+        '''Наименьший индекс, на котором набирается place пользователей'''
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            if (index + step <= self.size
+                    and self._tree[index + step] < place):
+                index += step
+                place -= self._tree[index]
+            step >>= 1
+        return index + 1
+
+    def set(self, user_id: int, rating: float) -> None:
+        '''Добавляет пользователя или переносит его на новый рейтинг'''
+        bucket = self._bucket(rating)
+        old = self._bucket_of.get(user_id)
+        if old == bucket:
+            return
+        if old is not None:
+            # Удаление из массива обменом с последним элементом, O(1)
+            members = self._members[old]
+            position = self._positions[user_id]
+            last_id = members.pop()
+            if last_id != user_id:
+                members[position] = last_id
+                self._positions[last_id] = position
+            if not members:
+                del self._members[old]
+            self._add(self._index(old), -1)
+        members = self._members[bucket]
+        self._positions[user_id] = len(members)
+        members.append(user_id)
+        self._bucket_of[user_id] = bucket
+        self._add(self._index(bucket), 1)
+
+    def place(self, user_id: int) -> int | None:
+        '''Место пользователя с 1 или None, если у него нет рейтинга'''
+        bucket = self._bucket_of.get(user_id)
+        if bucket is None:
+            return None
+        return (self._prefix(self._index(bucket) - 1)
+                + self._positions[user_id] + 1)
+
+    def entries(self, place: int, count: int) -> list[Entry]:
+        '''До count строк таблицы, начиная с места place'''
+        result: list[Entry] = []
+        while len(result) < count and place <= len(self):
+            # Переход к следующему рейтингу - за O(log R), пустые
+            # значения рейтинга не просматриваются
+            index = self._select(place)
+            bucket = self.MAX_RATING - index + 1
+            offset = place - self._prefix(index - 1) - 1
+            for user_id in self._members[bucket][
+                    offset:offset + count - len(result)]:
+                result.append((place, user_id, bucket))
+                place += 1
+        return result
+
+    def top(self, count: int = 10) -> list[Entry]:
+        return self.entries(1, count)
+
+    def around(self, user_id: int, radius: int = 2) -> list[Entry]:
+        '''Пользователь и до radius соседей выше и ниже него'''
+        place = self.place(user_id)
+        if place is None:
+            return []
+        start = max(1, place - radius)
+        return self.entries(start, place - start + radius + 1)
+
+    def rebuild(self, ratings: Mapping[int, float]) -> None:
+        '''Строит таблицу заново по всем рейтингам разом, за O(n + R)'''
+        members: dict[int, list[int]] = defaultdict(list)
+        self._bucket_of = {}
+        self._positions = {}
+        for user_id, rating in ratings.items():
+            bucket = self._bucket(rating)
+            user_ids = members[bucket]
+            self._positions[user_id] = len(user_ids)
+            user_ids.append(user_id)
+            self._bucket_of[user_id] = bucket
+        self._tree = [0] * (self.size + 1)
+        for bucket, user_ids in members.items():
+            self._tree[self._index(bucket)] = len(user_ids)
+        # Построение дерева Фенвика на месте за линейное время
+        for index in range(1, self.size + 1):
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self._tree[parent] += self._tree[index]
+        self._members = members
+
+
+# Рейтинг Эло игроков. Меняется по итогам игр из RATED_OUTCOMES и сразу
+# переносится в таблицу лидеров
+class Ratings:
+    def __init__(self, initial: float = 1000, k_factor: float = 32) -> None:
+        self.initial = initial
+        self.k_factor = k_factor
+        self.ratings: dict[int, float] = {}
+        self.leaderboard = Leaderboard()
+
+    def get(self, user_id: int) -> float:
+        return self.ratings.get(user_id, self.initial)
+
+    def _update(self, match: MatchRecord) -> bool:
+        match match.outcome:
+            case MatchOutcome.WIN:
+                score = 1.0 if match.winner == match.player1 else 0.0
+            case MatchOutcome.DRAW | MatchOutcome.NO_MOVES:
+                score = 0.5
+            case _:
+                return False
+        rating1, rating2 = self.get(match.player1), self.get(match.player2)
+        expected = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+        change = self.k_factor * (score - expected)
+        self.ratings[match.player1] = rating1 + change
+        self.ratings[match.player2] = rating2 - change
+        return True
+
+    def apply(self, match: MatchRecord) -> None:
+        '''Учитывает итог только что закончившейся игры'''
+        if self._update(match):
+            for user_id in (match.player1, match.player2):
+                self.leaderboard.set(user_id, self.ratings[user_id])
+
+    def rebuild(self, matches: Iterable[MatchRecord]) -> None:
+        '''Пересчитывает рейтинги по истории игр (в порядке их окончания)'''
+        self.ratings = {}
+        for match in matches:
+            self._update(match)
+        self.leaderboard.rebuild(self.ratings)
+
+
+# Общие рейтинги игроков (настраиваются и восстанавливаются в main.py)
+ratings = Ratings()
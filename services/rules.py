@@ -0,0 +1,101 @@
+from typing import Iterable, Mapping, Sequence
+
+from lexicon.lexicon_ru import LEXICON_MOVES
+from utils.enums import RoundResult
+
+try:  # NumPy нужен только для пакетного разрешения раундов
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+
+# Правила игры для набора ходов. Исходы всех пар ходов считаются один раз
+# в матрицу: исход раунда - одно обращение к ней, а пачка раундов
+# разрешается разом, выборкой из матрицы по индексам ходов
+class Rules:
+    def __init__(self, moves: Sequence[str],
+                 beats: Mapping[str, Iterable[str]]) -> None:
+        '''beats: ход -> ходы, которые он бьет. Прочие пары - ничьи'''
+        self.moves = tuple(moves)
+        self.index = {move: index for index, move in enumerate(self.moves)}
+        size = len(self.moves)
+        # Исходы для первого игрока: matrix[a * size + b]
+        matrix = [RoundResult.DRAW] * (size * size)
+        for move, victims in beats.items():
+            for victim in victims:
+                first, second = self.index[move], self.index[victim]
+                if first == second or (matrix[second * size + first]
+                                       is RoundResult.FIRST):
+                    raise ValueError(
+                        f"Inconsistent rules: {move!r} vs {victim!r}")
+                matrix[first * size + second] = RoundResult.FIRST
+                matrix[second * size + first] = RoundResult.SECOND
+        self.matrix = bytes(matrix)
+        self._outcomes = {(a, b): matrix[self.index[a] * size
+                                         + self.index[b]]
+                          for a in self.moves for b in self.moves}
+        self._np_matrix: 'np.ndarray | None' = (
+            np.frombuffer(self.matrix, dtype=np.int8)
+            if np is not None else None)
+
+    @classmethod
+    def cyclic(cls, moves: Sequence[str]) -> 'Rules':
+        '''
+        Нечетное число ходов по кругу: каждый бьет (n - 1) / 2 следующих
+        за ним. Для ('rock', 'scissors', 'paper') - обычные правила.
+        '''
+        if len(moves) % 2 == 0:
+            raise ValueError("Cyclic rules need an odd number of moves")
+        half = len(moves) // 2
+        return cls(moves, {
+            move: [moves[(index + step) % len(moves)]
+                   for step in range(1, half + 1)]
+            for index, move in enumerate(moves)})
+
+    def resolve(self, first: str, second: str) -> RoundResult:
+        '''Исход раунда для первого игрока, O(1)'''
+        return self._outcomes[first, second]
+
+    def encode(self, moves: Iterable[str]) -> bytes:
+        '''Ходы в индексы для resolve_batch (по байту на ход)'''
+        return bytes(map(self.index.__getitem__, moves))
+
+    def resolve_batch(self, first: Sequence[int],
+                      second: Sequence[int]) -> 'np.ndarray | bytes':
+        '''
+        Исходы пачки раундов по индексам ходов (см. encode) - значения
+        RoundResult. С NumPy - numpy.ndarray int8, считается векторно;
+        без него - bytes.
+        '''
+        if len(first) != len(second):
+            raise ValueError("Batches of different length")
+        size, matrix = len(self.moves), self.matrix
+        if self._np_matrix is not None:
+            first_ids, second_ids = _as_indexes(first), _as_indexes(second)
+            if size * size > 256:  # Номер пары ходов не влезет в байт
+                first_ids = first_ids.astype(np.intp)
+            return np.take(self._np_matrix, first_ids * size + second_ids)
+        return bytes(matrix[a * size + b] for a, b in zip(first, second))
+
+
+def _as_indexes(moves: Sequence[int]) -> 'np.ndarray':
+    if isinstance(moves, (bytes, bytearray)):
+        return np.frombuffer(moves, dtype=np.uint8)
+    return np.asarray(moves)
+
+
+# Камень, ножницы, бумага, ящерица, Спок: каждый ход бьет два других
+RPSLS = Rules.cyclic(('rock', 'scissors', 'lizard', 'paper', 'spock'))
+
+# Обычные правила: ход -> ходы, которые он бьет. Порядок кнопок в
+# LEXICON_MOVES на них не влияет, но набор ходов должен совпадать
+CLASSIC_BEATS: dict[str, tuple[str, ...]] = {
+    'rock': ('scissors',),
+    'scissors': ('paper',),
+    'paper': ('rock',),
+}
+if set(CLASSIC_BEATS) != set(LEXICON_MOVES):
+    raise ValueError("CLASSIC_BEATS and LEXICON_MOVES list different moves")
+
+# Правила игры бота - для ходов из LEXICON_MOVES
+rules = Rules(tuple(LEXICON_MOVES), CLASSIC_BEATS)
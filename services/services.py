@@ -1,33 +1,25 @@
 import random
 
-from lexicon.lexicon_ru import LEXICON_MOVES
 from database.db import online_users
-from random import choice
+from services.rules import rules
+from utils.enums import RoundResult
+
+
+# Ключи LEXICON с итогом игры против бота
+WINNER_KEYS = {RoundResult.DRAW: "nobody_won",
+               RoundResult.FIRST: "user_won",
+               RoundResult.SECOND: "bot_won"}
 
 
 # Функция, возвращающая случайный выбор бота в игре
 def get_bot_choice() -> str:
-    return random.choice(["rock", "paper", "scissors"])
+    return random.choice(rules.moves)
 
 
 # Функция, определяющая победителя
 def get_winner(user_choice: str, bot_choice: str) -> str:
-    rules = {"rock": "scissors",
-             "scissors": "paper",
-             "paper": "rock"}
-    print(f"user_choice = {user_choice}")
-    print(f"bot_choice = {bot_choice}")
-    if user_choice == bot_choice:
-        return "nobody_won"
-    elif rules[user_choice] == bot_choice:
-        return "user_won"
-    return "bot_won"
-
-
-def get_random_online_user(except_user_id: int) -> int:
-    users = {**online_users.users}
-    users.pop(except_user_id, None)
-    if not len(users):
-        raise IndexError
-    opponent_id = choice(list(users.keys()))
-    return opponent_id
+    return WINNER_KEYS[rules.resolve(user_choice, bot_choice)]
+
+
+def get_random_online_users(except_user_id: int, k: int) -> list[int]:
+    return online_users.sample_many(k, except_user_id=except_user_id)
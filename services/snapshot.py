@@ -0,0 +1,310 @@
+import asyncio
+import gc
+import glob
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Any, Iterator
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage
+
+from database.db import OnlineUsers
+from database.storage import JournaledMemoryStorage, KeyFields, key_fields
+from handlers.user_handlers.game_managers import GameSession
+from services.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# Запись журнала: ['f', поля ключа, состояние, данные] - FSM игрока,
+# ['s', id сессии, состояние или None, если сессия удалена] - сессия
+JournalEntry = list[Any]
+
+
+@dataclass
+class SnapshotStats:
+    flushes: int = 0
+    records: int = 0  # Записей, дописанных в журнал
+    journal_bytes: int = 0  # Размер журнала текущего поколения
+    compactions: int = 0
+    compaction_seconds: float = 0.0  # Длительность последнего сжатия
+    restored_fsm: int = 0
+    restored_sessions: int = 0
+    restore_seconds: float = 0.0
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Сотни тысяч новых контейнеров подряд раз за разом запускают сборку
+    # мусора по всей куче - она в разы дольше самого разбора снимка
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Снапшоты состояния бота в локальном каталоге: полный снимок поколения
+# g (snapshot.json) и журнал изменений после него (journal.<g>.log, по
+# JSON-строке на запись). Раз в interval в журнал дописываются только
+# изменившиеся FSM-записи и сессии. При сжатии состояние целиком уходит в
+# снимок поколения g + 1, а старый журнал удаляется
+class SnapshotManager:
+    SNAPSHOT_FILE = 'snapshot.json'
+
+    def __init__(self, path: str, bot: Bot, storage: BaseStorage,
+                 online_users: OnlineUsers, compact_interval: float = 60,
+                 max_journal_bytes: int = 64 * 2 ** 20) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.bot = bot
+        self.storage = storage
+        self.online_users = online_users
+        self.compact_interval = compact_interval
+        self.max_journal_bytes = max_journal_bytes
+        self.generation = 0
+        self.stats = SnapshotStats()
+        self._last_compaction = time.monotonic()
+        # Журнал изменений сессий ведет сам GameSession
+        GameSession.journal = set()
+
+    @property
+    def fsm(self) -> JournaledMemoryStorage | None:
+        # FSM в redis сама переживает перезапуск - снимаем только память
+        if isinstance(self.storage, JournaledMemoryStorage):
+            return self.storage
+        return None
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.path, f'journal.{generation}.log')
+
+    def _collect(self) -> list[JournalEntry]:
+        '''Забирает изменения с прошлой записи (в потоке цикла событий)'''
+        entries: list[JournalEntry] = []
+        if (fsm := self.fsm) is not None:
+            keys, fsm.journal = fsm.journal, set()
+            for key in keys:
+                record = fsm.storage[key]
+                # set_data заменяет словарь целиком, так что ссылку на него
+                # можно сериализовать в другом потоке
+                entries.append(['f', key_fields(key), record.state,
+                                record.data])
+        if (session_ids := GameSession.journal) is not None:
+            GameSession.journal = set()
+            for session_id in session_ids:
+                session = GameSession.sessions.get(session_id)
+                entries.append(['s', list(session_id),
+                                session.to_dict() if session else None])
+        return entries
+
+    def _append(self, entries: list[JournalEntry]) -> int:
+        data = ''.join(json.dumps(entry) + '\n' for entry in entries).encode()
+        with open(self._journal_path(self.generation), 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return len(data)
+
+    async def flush(self) -> None:
+        '''Дописывает изменения в журнал; запись идет в отдельном потоке'''
+        with _gc_paused():
+            entries = self._collect()
+        if not entries:
+            return
+        self.stats.journal_bytes += await asyncio.to_thread(
+            self._append, entries)
+        self.stats.flushes += 1
+        self.stats.records += len(entries)
+
+    def should_compact(self) -> bool:
+        return (self.stats.journal_bytes >= self.max_journal_bytes
+                or time.monotonic() - self._last_compaction
+                >= self.compact_interval)
+
+    def _fsm_columns(self) -> list[list[Any]]:
+        '''
+        FSM для снимка по столбцам: ключи с общими bot_id, thread_id,
+        business_connection_id и destiny собраны в группу [общие поля,
+        chat_id, user_id, состояния, данные]. Такой снимок разбирается
+        вдвое быстрее, чем по строке на запись
+        '''
+        if (fsm := self.fsm) is None:
+            return []
+        groups: dict[KeyFields, list[list[Any]]] = {}
+        for fields, state, data in fsm.storage.records():
+            bot_id, chat_id, user_id, thread_id, connection_id, destiny = (
+                fields)
+            chat_ids, user_ids, states, values = groups.setdefault(
+                (bot_id, thread_id, connection_id, destiny),
+                [[], [], [], []])
+            chat_ids.append(chat_id)
+            user_ids.append(user_id)
+            states.append(state)
+            values.append(data)
+        return [[list(scope), *columns] for scope, columns in groups.items()]
+
+    def _snapshot(self) -> dict[str, Any]:
+        now, monotonic_now = time.time(), time.monotonic()
+        users = self.online_users.users
+        return {
+            'generation': self.generation + 1,
+            'saved_at': now,
+            'fsm': self._fsm_columns(),
+            'sessions': [session.to_dict()
+                         for session in GameSession.sessions.values()],
+            # id и время активности (с точностью до мс) двумя столбцами
+            'online': [list(users),
+                       [round(now - (monotonic_now - seen), 3)
+                        for seen in users.values()]],
+        }
+
+    def _write_snapshot(self, snapshot: dict[str, Any]) -> None:
+        temporary = os.path.join(self.path, self.SNAPSHOT_FILE + '.tmp')
+        # dumps целиком в C заметно быстрее потоковой json.dump
+        data = json.dumps(snapshot).encode()
+        with open(temporary, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # Подмена атомарна: после сбоя остается либо старый снимок со своим
+        # журналом, либо новый
+        os.replace(temporary, os.path.join(self.path, self.SNAPSHOT_FILE))
+
+    async def compact(self) -> None:
+        '''Пишет полный снимок нового поколения и удаляет старый журнал'''
+        start = time.perf_counter()
+        # Сначала журнал: тогда новый снимок не содержит ничего, чего нет в
+        # старом снимке с журналом, и сбой посередине ничего не теряет
+        await self.flush()
+        with _gc_paused():
+            snapshot = self._snapshot()
+        await asyncio.to_thread(self._write_snapshot, snapshot)
+        old_journal = self._journal_path(self.generation)
+        self.generation = snapshot['generation']
+        self.stats.journal_bytes = 0
+        if os.path.exists(old_journal):
+            os.remove(old_journal)
+        self._last_compaction = time.monotonic()
+        self.stats.compactions += 1
+        self.stats.compaction_seconds = time.perf_counter() - start
+
+    def _replay(self, fsm: dict[KeyFields, tuple[str | None, dict]],
+                sessions: dict[tuple, dict[str, Any]]) -> None:
+        path = self._journal_path(self.generation)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as file:
+            end = 0  # Конец последней целой строки
+            for line in file:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    entry = json.loads(line)
+                except ValueError:
+                    # Недописанная при сбое последняя строка: отрезаем ее,
+                    # иначе к ней приклеится следующая запись журнала
+                    file.truncate(end)
+                    break
+                end += len(line)
+                match entry:
+                    case ['f', fields, state, data]:
+                        fsm[tuple(fields)] = (state, data)
+                    case ['s', session_id, None]:
+                        sessions.pop(tuple(session_id), None)
+                    case ['s', session_id, value]:
+                        sessions[tuple(session_id)] = value
+
+    def restore(self) -> bool:
+        '''
+        Восстанавливает FSM, игровые сессии (с их таймерами) и онлайн
+        из снимка и журнала. Вызывается при старте, до приема апдейтов.
+        Возвращает False, если восстанавливать было нечего. Если было,
+        восстановленные объекты переносятся в постоянное поколение сборщика
+        мусора (gc.freeze).
+        '''
+        start = time.perf_counter()
+        with _gc_paused():
+            restored = self._restore()
+        if restored:
+            # Восстановленное живет до остановки - сборщику незачем его
+            # обходить
+            gc.freeze()
+        self.stats.restore_seconds = time.perf_counter() - start
+        return restored
+
+    def _restore(self) -> bool:
+        snapshot_path = os.path.join(self.path, self.SNAPSHOT_FILE)
+        snapshot: dict[str, Any] = {
+            'generation': 0, 'saved_at': time.time(),
+            'fsm': [], 'sessions': [], 'online': [[], []]}
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as file:
+                snapshot = json.load(file)
+        self.generation = snapshot['generation']
+        sessions = {tuple(value['id']): value
+                    for value in snapshot['sessions']}
+        journal: dict[KeyFields, tuple[str | None, dict]] = {}
+        self._replay(journal, sessions)
+        # Журналы других поколений остались от сбоя во время сжатия
+        current = self._journal_path(self.generation)
+        for path in glob.glob(os.path.join(self.path, 'journal.*.log')):
+            if path != current:
+                os.remove(path)
+        if os.path.exists(current):
+            self.stats.journal_bytes = os.path.getsize(current)
+
+        restored_fsm = 0
+        if (storage := self.fsm) is not None:
+            # Записи остаются полями ключа до первого обращения к ним
+            restored = storage.storage.restored
+            for scope, chat_ids, user_ids, states, values in snapshot['fsm']:
+                bot_id, thread_id, connection_id, destiny = scope
+                keys = zip(repeat(bot_id), chat_ids, user_ids,
+                           repeat(thread_id), repeat(connection_id),
+                           repeat(destiny))
+                restored.update(zip(keys, zip(states, values)))
+            # Журнал новее снимка - его записи поверх
+            for fields, (state, data) in journal.items():
+                if state is not None or data:
+                    restored[fields] = (state, data)
+                else:
+                    restored.pop(fields, None)
+            storage.journal.clear()
+            restored_fsm = len(restored)
+
+        # Снимок хранит онлайн в порядке реестра - от давних к свежим
+        now, monotonic_now = time.time(), time.monotonic()
+        deadline = now - self.online_users.online_duration
+        self.online_users.load(
+            (user_id, monotonic_now - (now - seen))
+            for user_id, seen in zip(*snapshot['online']) if seen > deadline)
+
+        # От давних к свежим - в том же порядке, что и реестр сессий
+        for value in sorted(sessions.values(),
+                            key=lambda value: value['active']):
+            GameSession.from_dict(value, self.bot, self.storage)
+        GameSession.journal = set()
+
+        self.stats.restored_fsm = restored_fsm
+        self.stats.restored_sessions = len(sessions)
+        return bool(restored_fsm or sessions or snapshot['online'][0])
+
+
+async def snapshot_task(manager: SnapshotManager,
+                        interval: float = 1.0) -> None:
+    """Дописывает журнал раз в interval секунд и время от времени сжимает."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await manager.flush()
+            if manager.should_compact():
+                await manager.compact()
+        except OSError as error:
+            logger.error('Snapshot failed', error=error)
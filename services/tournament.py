@@ -0,0 +1,399 @@
+import asyncio
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.types import InlineKeyboardMarkup
+
+from database.history import MatchRecord
+from handlers.user_handlers.game_managers import GameSession
+from keyboards.keyboards import create_inline_kb
+from lexicon.lexicon_ru import LEXICON
+from services.logs import get_logger
+from services.outbound import Priority, outbound
+from services.rating import ratings
+from states.states import FSMPlay
+from utils.enums import MatchOutcome
+
+
+logger = get_logger(__name__)
+
+
+# Пара соперников раунда, как id сессии: (меньший id, больший id)
+Pair = tuple[int, int]
+
+# Итоги, при которых проигравший не вышел на игру: он выбывает из турнира
+FORFEITS = (MatchOutcome.REFUSED, MatchOutcome.NO_CONSENT)
+
+
+def _unplayed(pair: Pair, outcome: MatchOutcome,
+              winner: int | None = None) -> MatchRecord:
+    """Итог игры пары, которая так и не была сыграна"""
+    return MatchRecord(
+        finished_at=time.time(), player1=pair[0], player2=pair[1],
+        first_hand1=None, second_hand1=None, first_hand2=None,
+        second_hand2=None, winner=winner, outcome=outcome)
+
+
+@dataclass
+class Entrant:
+    user_id: int
+    score: float = 0.0
+    opponents: set[int] = field(default_factory=set)
+    had_bye: bool = False
+    withdrawn: bool = False  # Не явился, отказался или ушел сам
+
+
+@dataclass
+class TournamentStats:
+    started: int = 0
+    cancelled: int = 0  # Не набрали min_players к концу записи
+    rounds: int = 0
+    matches: int = 0
+    byes: int = 0
+    forfeits: int = 0
+    rematches: int = 0  # Пары, сыгравшие друг с другом не впервые
+    unfinished: int = 0  # Игры, удаленные по истечении времени раунда
+    publish_failed: int = 0
+    pairing_seconds: float = 0.0  # Суммарное время составления пар
+    pairing_max: float = 0.0
+
+
+# Турнир по швейцарской системе: каждый раунд игроки с равными очками
+# играют между собой, никто не выбывает по проигрышу. Побеждает набравший
+# больше очков за все раунды
+class Tournament:
+    def __init__(self, tournament_id: int, lookahead: int = 8) -> None:
+        self.tournament_id = tournament_id
+        # Сколько ближайших по месту игроков просматривать, подбирая
+        # соперника, с которым игрок еще не играл
+        self.lookahead = lookahead
+        self.entrants: dict[int, Entrant] = {}
+        self.round = 0
+        self.rounds = 0
+        self.starts_at = 0.0  # time.monotonic() конца записи
+        # Сессии текущего раунда, которые еще не закончились
+        self.pending: set[Pair] = set()
+        self.round_over = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.entrants)
+
+    @property
+    def active(self) -> list[Entrant]:
+        return [entrant for entrant in self.entrants.values()
+                if not entrant.withdrawn]
+
+    def register(self, user_id: int) -> bool:
+        if user_id in self.entrants:
+            return False
+        self.entrants[user_id] = Entrant(user_id)
+        return True
+
+    def withdraw(self, user_id: int) -> None:
+        '''До начала турнира - убирает игрока, после - снимает с турнира'''
+        if self.round == 0:
+            self.entrants.pop(user_id, None)
+        elif (entrant := self.entrants.get(user_id)) is not None:
+            entrant.withdrawn = True
+
+    def standings(self) -> list[Entrant]:
+        '''
+        Итоговая таблица: по очкам, при равенстве - по сумме очков
+        соперников (коэффициент Бухгольца), затем по id
+        '''
+        entrants = self.entrants
+
+        def buchholz(entrant: Entrant) -> float:
+            return sum(entrants[user_id].score
+                       for user_id in entrant.opponents)
+
+        return sorted(entrants.values(), key=lambda entrant: (
+            -entrant.score, -buchholz(entrant), entrant.user_id))
+
+    def pair_round(self) -> tuple[list[Pair], int | None, int]:
+        '''
+        Пары следующего раунда, игрок без пары (или None) и число
+        повторных встреч. Игроки сортируются по очкам и рейтингу, затем
+        каждый берет ближайшего свободного соперника, с которым еще не
+        играл, среди lookahead следующих. Всего O(n log n) на сортировку
+        и O(n * lookahead) на проход.
+        '''
+        active = sorted(self.active, key=lambda entrant: (
+            -entrant.score, -ratings.get(entrant.user_id), entrant.user_id))
+        bye = None
+        if len(active) % 2:
+            # Без пары остается самый слабый из тех, у кого пропуска не было
+            index = next((index for index in range(len(active) - 1, -1, -1)
+                          if not active[index].had_bye), len(active) - 1)
+            bye = active.pop(index).user_id
+        taken = [False] * len(active)
+        pairs: list[Pair] = []
+        rematches = 0
+        for index, entrant in enumerate(active):
+            if taken[index]:
+                continue
+            taken[index] = True
+            chosen, seen = None, 0
+            for other in range(index + 1, len(active)):
+                if taken[other]:
+                    continue
+                if chosen is None:
+                    chosen = other  # Если новых соперников нет - ближайший
+                if active[other].user_id not in entrant.opponents:
+                    chosen = other
+                    break
+                seen += 1
+                if seen >= self.lookahead:
+                    break
+            assert chosen is not None  # Игроков четное число
+            taken[chosen] = True
+            opponent_id = active[chosen].user_id
+            rematches += opponent_id in entrant.opponents
+            pairs.append(GameSession.generate_session_id(
+                entrant.user_id, opponent_id))
+        return pairs, bye, rematches
+
+    def award_bye(self, user_id: int) -> None:
+        entrant = self.entrants[user_id]
+        entrant.score += 1
+        entrant.had_bye = True
+
+    def record(self, match: MatchRecord) -> None:
+        '''Учитывает итог игры раунда: победа - 1 очко, ничья - 0.5'''
+        players = (match.player1, match.player2)
+        first, second = (self.entrants[user_id] for user_id in players)
+        first.opponents.add(second.user_id)
+        second.opponents.add(first.user_id)
+        if match.winner is not None:
+            self.entrants[match.winner].score += 1
+        elif match.outcome not in FORFEITS:
+            # Ничья, никто не успел с ходами или игра не закончилась к сроку
+            first.score += 0.5
+            second.score += 0.5
+        if match.outcome in FORFEITS:
+            for entrant in (first, second):
+                if entrant.user_id != match.winner:
+                    entrant.withdrawn = True
+        self.pending.discard(players)
+        if not self.pending:
+            self.round_over.set()
+
+
+# Турниры: запись на ближайший турнир, его запуск по окончании записи и
+# проведение раундов. Игры раунда - обычные GameSession, которые создает
+# турнир; неявка и отказ засчитываются через таймауты самих сессий
+class TournamentManager:
+    def __init__(self, registration: float = 60, min_players: int = 4,
+                 max_rounds: int = 0, start_timeout: float = 30,
+                 round_grace: float = 5,
+                 publish_concurrency: int = 100) -> None:
+        self.registration = registration  # Сколько длится запись, с
+        self.min_players = min_players
+        self.max_rounds = max_rounds  # 0 - столько, чтобы выявить лучшего
+        self.start_timeout = start_timeout  # Сколько ждать согласия, с
+        self.round_grace = round_grace  # Запас ко времени раунда, с
+        # Сколько приглашений публикуется одновременно: остальные ждут,
+        # так что раунд на тысячи игр не забивает очередь исходящих
+        self.publish_concurrency = publish_concurrency
+        self.open: Tournament | None = None  # Идет запись
+        self.entered: dict[int, Tournament] = {}  # user_id -> турнир
+        self.opened = asyncio.Event()
+        self.stats = TournamentStats()
+        self._ids = itertools.count(1)
+
+    @property
+    def round_timeout(self) -> float:
+        '''Самая долгая игра: согласие, ожидание соперника, ходы и выбор'''
+        return (self.start_timeout + GameSession.consent_timeout
+                + GameSession.hands_timeout + GameSession.choice_timeout
+                + self.round_grace)
+
+    def join(self, user_id: int) -> Tournament | None:
+        '''
+        Записывает игрока на ближайший турнир, открывая запись, если ее
+        нет. None - игрок уже записан или играет в турнире.
+        '''
+        if user_id in self.entered:
+            return None
+        if self.open is None:
+            self.open = Tournament(next(self._ids))
+            self.open.starts_at = time.monotonic() + self.registration
+            self.opened.set()
+        self.open.register(user_id)
+        self.entered[user_id] = self.open
+        return self.open
+
+    def leave(self, user_id: int) -> None:
+        if (tournament := self.entered.pop(user_id, None)) is not None:
+            tournament.withdraw(user_id)
+
+    def close_registration(self) -> Tournament | None:
+        tournament, self.open = self.open, None
+        self.opened.clear()
+        return tournament
+
+    def rounds_for(self, players: int) -> int:
+        # За log2(n) раундов у единственного лидера больше очков, чем у
+        # всех остальных
+        rounds = max(1, math.ceil(math.log2(players)))
+        return min(rounds, self.max_rounds) if self.max_rounds else rounds
+
+    def _finished(self, tournament: Tournament, match: MatchRecord) -> None:
+        self.stats.matches += 1
+        if match.outcome in FORFEITS:
+            self.stats.forfeits += 1
+        tournament.record(match)
+
+    async def _publish(self, bot: Bot, storage: BaseStorage,
+                       tournament: Tournament, session: GameSession,
+                       keyboard: InlineKeyboardMarkup) -> None:
+        '''Приглашает пару на игру и запускает ожидание согласия'''
+        try:
+            for user_id in session.session_id:
+                key = StorageKey(bot_id=bot.id, chat_id=user_id,
+                                 user_id=user_id)
+                await storage.set_state(key, FSMPlay.waiting_game_start)
+                await storage.update_data(
+                    key, {'opponent_id': session.opponent_of(user_id)})
+            # Обычный приоритет: сообщения идущих игр уходят раньше
+            await asyncio.gather(*(
+                outbound.send_message(
+                    bot, chat_id=user_id, priority=Priority.NORMAL,
+                    text=LEXICON['tournament_round'].format(
+                        round=tournament.round,
+                        score=f"{tournament.entrants[user_id].score:g}",
+                        opponent_id=session.opponent_of(user_id)),
+                    reply_markup=keyboard, parse_mode='HTML')
+                for user_id in session.session_id))
+        finally:
+            # Не дошедшее приглашение - тоже неявка, раунд не зависнет
+            session.expect_start(self.start_timeout)
+
+    async def play_round(self, tournament: Tournament, bot: Bot,
+                         storage: BaseStorage) -> None:
+        tournament.round += 1
+        start = time.perf_counter()
+        pairs, bye, rematches = tournament.pair_round()
+        elapsed = time.perf_counter() - start
+        self.stats.rounds += 1
+        self.stats.rematches += rematches
+        self.stats.pairing_seconds += elapsed
+        self.stats.pairing_max = max(self.stats.pairing_max, elapsed)
+        keyboard = create_inline_kb('start_game', 'refuse')
+        semaphore = asyncio.Semaphore(self.publish_concurrency)
+
+        async def publish(session: GameSession) -> None:
+            async with semaphore:
+                await self._publish(bot, storage, tournament, session,
+                                    keyboard)
+
+        jobs: list[Awaitable[Any]] = []
+        for pair in pairs:
+            busy = [user_id for user_id in pair
+                    if GameSession.is_playing(user_id)]
+            if busy:
+                # Игрок занят другой игрой - считаем, что он не явился
+                free = [user_id for user_id in pair if user_id not in busy]
+                self._finished(tournament, _unplayed(
+                    pair, MatchOutcome.NO_CONSENT,
+                    winner=free[0] if free else None))
+                continue
+            session = GameSession(pair, bot, storage)
+            session.on_finish = partial(self._finished, tournament)
+            tournament.pending.add(pair)
+            jobs.append(publish(session))
+        # Игры раунда заканчиваются не раньше, чем разойдутся приглашения
+        tournament.round_over.clear()
+        if bye is not None:
+            tournament.award_bye(bye)
+            self.stats.byes += 1
+            jobs.append(outbound.send_message(
+                bot, chat_id=bye, parse_mode='HTML',
+                text=LEXICON['tournament_bye'].format(
+                    round=tournament.round)))
+        for result in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.stats.publish_failed += 1
+                logger.error('Tournament publish failed', exc_info=result)
+        if not tournament.pending:
+            return
+        try:
+            await asyncio.wait_for(tournament.round_over.wait(),
+                                   self.round_timeout)
+        except asyncio.TimeoutError:
+            # Незаконченные к сроку игры удаляются и идут как ничьи
+            for pair in list(tournament.pending):
+                stale = GameSession.sessions.get(pair)
+                if stale is not None:
+                    stale.evict()  # Итог придет в турнир через on_finish
+                else:
+                    # Сессию уже удалили, не известив турнир
+                    self._finished(tournament, _unplayed(
+                        pair, MatchOutcome.ABANDONED))
+                self.stats.unfinished += 1
+            tournament.pending.clear()
+
+    async def _announce(self, tournament: Tournament, bot: Bot) -> None:
+        standings = tournament.standings()
+        jobs = [
+            outbound.send_message(
+                bot, chat_id=entrant.user_id, parse_mode='HTML',
+                text=LEXICON['tournament_finished'].format(
+                    place=place, players=len(standings),
+                    score=f"{entrant.score:g}"))
+            for place, entrant in enumerate(standings, start=1)
+            if not entrant.withdrawn]
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def run(self, tournament: Tournament, bot: Bot,
+                  storage: BaseStorage) -> None:
+        '''Проводит турнир от первого раунда до объявления итогов'''
+        try:
+            if len(tournament) < self.min_players:
+                self.stats.cancelled += 1
+                await asyncio.gather(*(
+                    outbound.send_message(
+                        bot, chat_id=user_id,
+                        text=LEXICON['tournament_cancelled'])
+                    for user_id in tournament.entrants),
+                    return_exceptions=True)
+                return
+            self.stats.started += 1
+            tournament.rounds = self.rounds_for(len(tournament))
+            while (tournament.round < tournament.rounds
+                   and len(tournament.active) >= 2):
+                await self.play_round(tournament, bot, storage)
+            await self._announce(tournament, bot)
+        finally:
+            for user_id in tournament.entrants:
+                if self.entered.get(user_id) is tournament:
+                    del self.entered[user_id]
+
+
+# Общий менеджер турниров (настраивается в main.py)
+tournaments = TournamentManager()
+
+
+async def tournament_task(manager: TournamentManager, bot: Bot,
+                          storage: BaseStorage) -> None:
+    """
+    Ждет открытия записи, по ее окончании запускает турнир и снова ждет.
+    Турниры идут отдельными задачами, так что запись на следующий
+    открывается, пока идет предыдущий.
+    """
+    running: set[asyncio.Task] = set()
+    while True:
+        await manager.opened.wait()
+        tournament = manager.open
+        assert tournament is not None
+        await asyncio.sleep(max(0.0, tournament.starts_at - time.monotonic()))
+        manager.close_registration()
+        task = asyncio.create_task(manager.run(tournament, bot, storage))
+        running.add(task)
+        task.add_done_callback(running.discard)
@@ -0,0 +1,119 @@
+import asyncio
+import hmac
+import time
+from dataclasses import dataclass
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config_data.config import WebhookConfig
+from services.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+@dataclass
+class WebhookStats:
+    received: int = 0
+    rejected: int = 0  # Неверный секрет
+    dropped: int = 0  # Очередь переполнена, Telegram пришлет апдейт снова
+    processed: int = 0
+    failed: int = 0
+
+
+# Прием апдейтов по вебхуку: ответ 200 сразу, обработка - пулом воркеров
+class WebhookIngestor:
+    def __init__(self, dispatcher: Dispatcher, bot: Bot,
+                 secret: str, queue_size: int = 10000,
+                 workers: int = 64) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret = secret
+        self.workers = workers
+        # В очереди сырое тело запроса и момент его приема
+        self.queue: asyncio.Queue[tuple[bytes, float]] = asyncio.Queue(
+            maxsize=queue_size)
+        self.stats = WebhookStats()
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def _check_secret(self, request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ''),
+                                   self.secret)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._check_secret(request):
+            self.stats.rejected += 1
+            return web.Response(status=401)
+        body = await request.read()
+        self.stats.received += 1
+        try:
+            self.queue.put_nowait((body, time.monotonic()))
+        except asyncio.QueueFull:
+            # Не 200 - Telegram повторит доставку позже
+            self.stats.dropped += 1
+            return web.Response(status=503)
+        return web.Response(status=200)
+
+    async def _work(self) -> None:
+        while True:
+            body, received_at = await self.queue.get()
+            try:
+                update = Update.model_validate_json(
+                    body, context={'bot': self.bot})
+                await self.dispatcher.feed_update(
+                    self.bot, update, received_at=received_at)
+                self.stats.processed += 1
+            except Exception:
+                self.stats.failed += 1
+                logger.exception('Webhook update failed')
+            finally:
+                self.queue.task_done()
+
+    def start_workers(self) -> None:
+        self._worker_tasks = [asyncio.create_task(self._work())
+                              for _ in range(self.workers)]
+
+    async def drain(self) -> None:
+        '''Дожидается обработки принятых апдейтов и останавливает воркеров'''
+        await self.queue.join()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def build_app(self, path: str) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot,
+                      config: WebhookConfig) -> None:
+    """Регистрирует вебхук в Telegram и обслуживает входящие апдейты."""
+    if config.secret is None:
+        # Без секрета любой мог бы присылать поддельные апдейты
+        raise ValueError("Webhook mode requires a secret")
+    ingestor = WebhookIngestor(dispatcher, bot, secret=config.secret,
+                               queue_size=config.queue_size,
+                               workers=config.workers)
+    runner = web.AppRunner(ingestor.build_app(config.path))
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    ingestor.start_workers()
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+    if config.url:
+        await bot.set_webhook(
+            url=config.url, secret_token=config.secret,
+            allowed_updates=dispatcher.resolve_used_update_types())
+    try:
+        await asyncio.Event().wait()  # Работаем до отмены
+    finally:
+        await runner.cleanup()  # Перестаем принимать новые апдейты
+        await ingestor.drain()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        await bot.session.close()
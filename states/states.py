@@ -12,6 +12,7 @@ class FSMMenu(StatesGroup):
     choice_game_mode = State()
     quick_game = State()
     matchmaking = State()
+    tournament = State()
 
 
 class FSMPlay(StatesGroup):
@@ -0,0 +1,26 @@
+"""Поддельные объекты aiogram для тестов без обращения к Telegram."""
+import itertools
+from types import SimpleNamespace
+from typing import Any
+
+from aiogram import Bot
+from aiogram.methods import SendMessage, TelegramMethod
+
+
+class RecordingBot(Bot):
+    """Бот, который вместо запросов к Bot API запоминает их."""
+
+    def __init__(self, bot_id: int = 42) -> None:
+        super().__init__(token=f'{bot_id}:TEST')
+        self.methods: list[TelegramMethod[Any]] = []
+        self._message_ids = itertools.count(1)
+
+    async def __call__(self, method: TelegramMethod[Any],
+                       request_timeout: int | None = None) -> Any:
+        # Так вызывает методы планировщик исходящих сообщений
+        self.methods.append(method)
+        if isinstance(method, SendMessage):
+            return SimpleNamespace(message_id=next(self._message_ids),
+                                   chat=SimpleNamespace(id=method.chat_id),
+                                   text=method.text)
+        return True
@@ -0,0 +1,31 @@
+import asyncio
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from handlers.user_handlers.game_managers import (GameEvent, GameSession,
+                                                  Move, Timeout)
+from tests.fakes import RecordingBot
+
+
+def test_failed_event_does_not_strand_mailbox() -> None:
+    """Ошибка в обработке события не останавливает разбор почтового ящика"""
+    session = GameSession((1, 2), RecordingBot(), MemoryStorage())
+    handled: list[GameEvent] = []
+
+    async def handle(event: GameEvent) -> None:
+        if not handled:
+            handled.append(event)
+            raise RuntimeError('handler failed')
+        handled.append(event)
+
+    session.handle = handle  # type: ignore[method-assign]
+    events: list[GameEvent] = [Move(1, 'left', 'rock'),
+                               Move(2, 'left', 'paper'), Timeout('hands')]
+    session.mailbox.extend(events)
+    try:
+        asyncio.run(session._drain())
+    finally:
+        session.evict()
+    assert handled == events
+    assert not session.mailbox
+    assert GameSession.running == 0
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+import services.matchmaking
+from database.db import OnlineUsers
+from database.resp import RespClient, RespServer
+from database.storage import SharedState
+from handlers.user_handlers.game_managers import GameSession
+from services.matchmaking import MatchmakingQueue
+
+
+def pop_pairs(queue: MatchmakingQueue) -> list[tuple[int, int]]:
+    return asyncio.run(queue.pop_pairs())
+
+
+def test_enqueue_ignores_repeats() -> None:
+    queue = MatchmakingQueue()
+    assert queue.enqueue(1)
+    assert not queue.ready.is_set()
+    assert not queue.enqueue(1)
+    assert queue.enqueue(2)
+    assert queue.ready.is_set()
+    assert queue.depth == 2
+    assert queue.stats.enqueued == 2
+
+
+def test_pairs_in_queue_order_by_batches() -> None:
+    """Пары берутся из начала очереди, не больше batch_size за проход"""
+    queue = MatchmakingQueue(batch_size=2)
+    for user_id in range(1, 8):
+        queue.enqueue(user_id)
+    assert pop_pairs(queue) == [(1, 2), (3, 4)]
+    assert list(queue.waiting) == [5, 6, 7]
+    assert queue.ready.is_set()
+    assert pop_pairs(queue) == [(5, 6)]
+    # Непарный ждет дальше - в начале очереди
+    assert list(queue.waiting) == [7]
+    assert not queue.ready.is_set()
+    assert queue.stats.matched == 6
+
+
+def test_players_in_game_are_dropped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(GameSession.players, 2, (2, 9))
+    queue = MatchmakingQueue()
+    for user_id in (1, 2, 3):
+        queue.enqueue(user_id)
+    assert pop_pairs(queue) == [(1, 3)]
+    assert queue.stats.skipped_busy == 1
+    assert not queue.waiting
+
+
+def test_players_in_game_elsewhere_are_dropped(
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    """Занятость в других процессах берется из общего хранилища"""
+    async def scenario() -> list[tuple[int, int]]:
+        server = RespServer()
+        await server.start()
+        client = RespClient.from_url(server.url)
+        try:
+            shared_state = SharedState(client, OnlineUsers(60))
+            monkeypatch.setattr(GameSession, 'shared_state', shared_state)
+            # Сессию 3 и 9 завел другой процесс
+            other = SharedState(client, OnlineUsers(60))
+            other.session_started((3, 9))
+            await other.sync()
+            for user_id in (1, 2, 3, 4):
+                queue.enqueue(user_id)
+            return await queue.pop_pairs()
+        finally:
+            await client.close()
+            await server.stop()
+
+    queue = MatchmakingQueue()
+    assert asyncio.run(scenario()) == [(1, 2)]
+    assert list(queue.waiting) == [4]
+    assert queue.stats.skipped_busy == 1
+
+
+def test_lone_player_gets_online_opponent(
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(services.matchmaking, 'get_random_online_users',
+                        lambda user_id, k: [2, 5, 6])
+    monkeypatch.setitem(GameSession.players, 5, (5, 8))
+    queue = MatchmakingQueue(invite_after=10)
+    queue.enqueue(1)
+    queue.invited[2] = time.monotonic()
+    assert pop_pairs(queue) == []
+    assert list(queue.waiting) == [1]
+    queue.waiting[1] -= 10
+    # Уже приглашенный 2 и играющий 5 не подходят - зовется 6
+    assert pop_pairs(queue) == [(1, 6)]
+    assert queue.stats.invited == 1
+    assert 6 in queue.invited
+
+
+def test_expired_players_leave_queue() -> None:
+    queue = MatchmakingQueue(max_wait=60)
+    for user_id in (1, 2, 3):
+        queue.enqueue(user_id)
+    queue.waiting[1] -= 120
+    queue.waiting[2] -= 120
+    assert queue.pop_expired() == [1, 2]
+    assert list(queue.waiting) == [3]
+    assert queue.stats.expired == 2
+
+
+def test_wait_stats() -> None:
+    """Глубина очереди и время до получения соперника"""
+    queue = MatchmakingQueue()
+    for user_id in range(1, 6):
+        queue.enqueue(user_id)
+    assert queue.depth == 5
+    assert queue.wait_percentile(0.5) == 0.0
+    now = time.monotonic()
+    for user_id, wait in zip(range(1, 5), (1, 2, 3, 4)):
+        queue.waiting[user_id] = now - wait
+    pop_pairs(queue)
+    assert queue.depth == 1
+    assert queue.stats.matched == 4
+    assert queue.stats.wait_max == pytest.approx(4, abs=0.5)
+    assert queue.stats.wait_total == pytest.approx(10, abs=1)
+    assert queue.wait_percentile(0.5) == pytest.approx(3, abs=0.5)
+    assert queue.wait_percentile(1) == queue.stats.wait_max
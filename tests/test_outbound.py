@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage, TelegramMethod
+
+from services.outbound import OutboundScheduler, Priority
+from tests.fakes import RecordingBot
+
+
+def run(scenario: Callable[[OutboundScheduler], Awaitable[Any]],
+        **options: Any) -> OutboundScheduler:
+    scheduler = OutboundScheduler(**{'global_rate': 1e6, 'global_burst': 1e6,
+                                     'chat_rate': 1e6, 'chat_burst': 1e6,
+                                     **options})
+
+    async def main() -> None:
+        try:
+            await scenario(scheduler)
+        finally:
+            await scheduler.close(timeout=1)
+
+    asyncio.run(main())
+    return scheduler
+
+
+def texts(bot: RecordingBot) -> list[str | None]:
+    return [method.text for method in bot.methods
+            if isinstance(method, (SendMessage, EditMessageText))]
+
+
+def test_higher_priority_goes_first() -> None:
+    bot = RecordingBot()
+
+    async def scenario(scheduler: OutboundScheduler) -> None:
+        # Все ставятся в очередь до того, как планировщик проснется
+        await asyncio.gather(
+            scheduler.send_message(bot, 1, 'countdown', Priority.COUNTDOWN),
+            scheduler.send_message(bot, 2, 'menu'),
+            scheduler.send_message(bot, 3, 'move', Priority.CRITICAL))
+
+    scheduler = run(scenario)
+    assert texts(bot) == ['move', 'menu', 'countdown']
+    assert scheduler.stats.sent == 3
+    assert scheduler.depth == 0
+
+
+def test_pending_edits_of_one_message_merge() -> None:
+    bot = RecordingBot()
+
+    async def scenario(scheduler: OutboundScheduler) -> None:
+        results = await asyncio.gather(*(
+            scheduler.edit_message_text(bot, 1, 10, f'{seconds} s left')
+            for seconds in (3, 2, 1)))
+        assert results == [True] * 3
+
+    scheduler = run(scenario)
+    # До отправки дошла только последняя правка
+    assert texts(bot) == ['1 s left']
+    assert scheduler.stats.merged == 2
+
+
+def test_chat_limit_lets_other_chats_through() -> None:
+    bot = RecordingBot()
+
+    async def scenario(scheduler: OutboundScheduler) -> None:
+        first, second, other = (
+            scheduler.submit(bot, SendMessage(chat_id=chat_id, text=text))
+            for chat_id, text in ((1, 'first'), (1, 'second'), (2, 'other')))
+        await asyncio.gather(first, other)
+        # Второе сообщение чату 1 ждет токена, пока уходят другие чаты
+        assert not second.done()
+        await second
+
+    run(scenario, chat_rate=20, chat_burst=1)
+    assert texts(bot) == ['first', 'other', 'second']
+
+
+class FloodedBot(RecordingBot):
+    """Бот, которому Telegram первый раз отвечает 429"""
+
+    async def __call__(self, method: TelegramMethod[Any],
+                       request_timeout: int | None = None) -> Any:
+        if not self.methods:
+            self.methods.append(method)
+            raise TelegramRetryAfter(method, 'Too Many Requests', 0)
+        return await super().__call__(method)
+
+
+def test_retry_after_flood_error() -> None:
+    bot = FloodedBot()
+
+    async def scenario(scheduler: OutboundScheduler) -> None:
+        message = await scheduler.send_message(bot, 1, 'hello')
+        assert message.text == 'hello'
+
+    scheduler = run(scenario)
+    assert texts(bot) == ['hello', 'hello']
+    assert scheduler.stats.retries == 1
+    assert scheduler.stats.failed == 0
+
+
+def test_close_cancels_unsent_requests() -> None:
+    bot = RecordingBot()
+
+    async def scenario(scheduler: OutboundScheduler) -> None:
+        futures = [scheduler.submit(bot, SendMessage(chat_id=1, text=text))
+                   for text in ('sent', 'stuck')]
+        await futures[0]
+        await scheduler.close(timeout=0.05)
+        assert futures[1].cancelled()
+        assert scheduler.depth == 0
+
+    run(scenario, chat_rate=0.01, chat_burst=1)
+    assert texts(bot) == ['sent']
@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+from collections import Counter
+from typing import Iterator
+
+import pytest
+
+from database.db import OnlineUsers, sweep_presence
+from database.presence import PresenceTable
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def table() -> Iterator[PresenceTable]:
+    table = PresenceTable.open(f'test-presence-{os.getpid()}-{next(_names)}',
+                               capacity=256, owner=True)
+    yield table
+    table.close()
+    table.unlink()
+
+
+def live_keys(table: PresenceTable) -> Counter[int]:
+    return Counter(key for key in table._keys if key > 0)
+
+
+def test_sample_uses_index_of_last_sweep(table: PresenceTable) -> None:
+    """Выборка идет по индексу последней очистки и проверяет его слоты"""
+    now = time.monotonic()
+    for user_id in range(1, 51):
+        table.touch(user_id, now)
+    assert table.sample_many(5, 0, now - 60) == []
+    asyncio.run(sweep_presence(table, online_duration=60, chunk=64))
+    assert table.live == 50
+    sample = table.sample_many(5, 1, now - 60)
+    assert len(set(sample)) == 5
+    assert 1 not in sample
+    # Устаревший индекс: ушедшие после очистки в выборку не попадают
+    for user_id in range(1, 46):
+        table.touch(user_id, now - 120)
+    assert sorted(table.sample_many(10, 0, now - 60)) == [46, 47, 48, 49, 50]
+    assert table.stats.short == 2
+
+
+def test_online_users_top_up_from_local_sample(table: PresenceTable) -> None:
+    """Пришедших после очистки владельца добирает выборка процесса"""
+    online = OnlineUsers(online_duration=60)
+    online.table = table
+    for user_id in range(1, 4):
+        online.set_online(user_id)
+    assert sorted(online.sample_many(5, 3)) == [1, 2]
+
+
+def test_sweep_merges_duplicated_id(table: PresenceTable) -> None:
+    """Id, вставленный гонкой в два слота, очистка оставляет в первом"""
+    now = time.monotonic()
+    home = table._home(7)
+    copy = (home + 1) & table._mask
+    table._keys[home], table._seen[home] = 7, now - 30
+    table._keys[copy], table._seen[copy] = 7, now
+    asyncio.run(sweep_presence(table, online_duration=60))
+    assert live_keys(table)[7] == 1
+    assert table.last_seen(7) == now
+    assert table.stats.merged == 1
+    assert table.live == 1
+
+
+def test_lost_insert_is_restored_by_next_touch(table: PresenceTable) -> None:
+    """Отметку, затертую гонкой вставки, возвращает следующая отметка"""
+    table.touch(7)
+    # Второй процесс видел тот же пустой слот и записал свой id позже
+    table._keys[table._home(7)] = 8
+    assert table.last_seen(7) is None
+    table.touch(7)
+    assert table.last_seen(7) is not None
+    assert live_keys(table) == {7: 1, 8: 1}
+
+
+def touch_all(name: str, users: int, rounds: int) -> None:
+    table = PresenceTable.open(name)
+    for _ in range(rounds):
+        for user_id in range(1, users + 1):
+            table.touch(user_id)
+    table.close()
+
+
+def test_concurrent_writers(table: PresenceTable) -> None:
+    """
+    Два процесса отмечают одних и тех же пользователей без блокировок:
+    гонка может потерять или задвоить id, очистка убирает копии, а
+    следующая отметка возвращает потерянных
+    """
+    users = 100
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=touch_all,
+                               args=(table.block.name, users, 200))
+               for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    keys = live_keys(table)
+    assert set(keys) <= set(range(1, users + 1))
+    asyncio.run(sweep_presence(table, online_duration=60))
+    assert max(live_keys(table).values()) == 1
+    touch_all(table.block.name, users, 1)
+    assert live_keys(table) == Counter(range(1, users + 1))
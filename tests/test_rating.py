@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from database.history import MatchRecord
+from services.rating import Leaderboard, Ratings
+from utils.enums import MatchOutcome
+
+
+def match(player1: int, player2: int, outcome: MatchOutcome,
+          winner: int | None = None) -> MatchRecord:
+    return MatchRecord(finished_at=0.0, player1=player1, player2=player2,
+                       first_hand1=None, second_hand1=None, first_hand2=None,
+                       second_hand2=None, winner=winner, outcome=outcome)
+
+
+def test_elo_update() -> None:
+    ratings = Ratings(initial=1000, k_factor=32)
+    ratings.apply(match(1, 2, MatchOutcome.WIN, winner=1))
+    # Равные соперники: ожидаемый счет 0.5, победа дает K / 2
+    assert ratings.get(1) == 1016
+    assert ratings.get(2) == 984
+    ratings.apply(match(1, 2, MatchOutcome.DRAW))
+    # Ничья с более слабым отнимает очки у сильного
+    assert ratings.get(1) < 1016
+    assert ratings.get(1) + ratings.get(2) == pytest.approx(2000)
+    ratings.apply(match(1, 3, MatchOutcome.REFUSED))
+    assert 3 not in ratings.ratings
+
+
+def test_rebuild_matches_applying_one_by_one() -> None:
+    rng = random.Random(1)
+    pairs = [rng.sample(range(1, 20), 2) for _ in range(200)]
+    matches = [match(player1, player2, MatchOutcome.NO_MOVES)
+               for player1, player2 in pairs]
+    applied, rebuilt = Ratings(), Ratings()
+    for record in matches:
+        applied.apply(record)
+    rebuilt.rebuild(matches)
+    assert rebuilt.ratings == applied.ratings
+    assert rebuilt.leaderboard.top(20) == applied.leaderboard.top(20)
+
+
+def test_leaderboard_places() -> None:
+    leaderboard = Leaderboard()
+    for user_id, rating in ((1, 1200), (2, 900), (3, 1500.4), (4, 1000)):
+        leaderboard.set(user_id, rating)
+    assert leaderboard.top(3) == [(1, 3, 1500), (2, 1, 1200), (3, 4, 1000)]
+    assert leaderboard.place(2) == 4
+    assert leaderboard.place(5) is None
+    leaderboard.set(2, 1600)
+    assert leaderboard.place(2) == 1
+    assert leaderboard.around(1, radius=1) == [(2, 3, 1500), (3, 1, 1200),
+                                               (4, 4, 1000)]
+
+
+def test_leaderboard_against_sorting() -> None:
+    """Места согласованы с сортировкой по рейтингу при многих равных"""
+    rng = random.Random(2)
+    ratings: dict[int, float] = {}
+    leaderboard = Leaderboard()
+    for _ in range(5000):
+        user_id = rng.randrange(200)
+        ratings[user_id] = rng.choice((999, 1000, 1001, rng.gauss(1000, 50)))
+        leaderboard.set(user_id, ratings[user_id])
+    entries = leaderboard.entries(1, len(ratings))
+    assert [place for place, _, _ in entries] == list(
+        range(1, len(ratings) + 1))
+    assert [rating for _, _, rating in entries] == sorted(
+        (round(rating) for rating in ratings.values()), reverse=True)
+    assert all(leaderboard.place(user_id) == place
+               for place, user_id, _ in entries)
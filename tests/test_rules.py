@@ -0,0 +1,56 @@
+import pytest
+
+from lexicon.lexicon_ru import LEXICON_MOVES
+from services.rules import RPSLS, Rules, rules
+from utils.enums import RoundResult
+
+
+@pytest.mark.parametrize('first, second, result', [
+    ('rock', 'scissors', RoundResult.FIRST),
+    ('scissors', 'paper', RoundResult.FIRST),
+    ('paper', 'rock', RoundResult.FIRST),
+    ('scissors', 'rock', RoundResult.SECOND),
+    ('paper', 'paper', RoundResult.DRAW),
+])
+def test_classic_rules(first: str, second: str, result: RoundResult) -> None:
+    assert rules.resolve(first, second) is result
+
+
+def test_rules_cover_lexicon_moves() -> None:
+    assert set(rules.moves) == set(LEXICON_MOVES)
+
+
+def test_move_order_does_not_change_rules() -> None:
+    beats = {'rock': ['scissors'], 'scissors': ['paper'], 'paper': ['rock']}
+    reordered = Rules(('paper', 'rock', 'scissors'), beats)
+    assert all(reordered.resolve(a, b) is rules.resolve(a, b)
+               for a in rules.moves for b in rules.moves)
+
+
+def test_inconsistent_rules_are_rejected() -> None:
+    with pytest.raises(ValueError):
+        Rules(('rock', 'paper'), {'rock': ['paper'], 'paper': ['rock']})
+    with pytest.raises(ValueError):
+        Rules.cyclic(('rock', 'paper'))
+
+
+def test_cyclic_rules_are_balanced() -> None:
+    """В RPSLS каждый ход бьет ровно два других"""
+    for move in RPSLS.moves:
+        wins = [other for other in RPSLS.moves
+                if RPSLS.resolve(move, other) is RoundResult.FIRST]
+        assert len(wins) == 2
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_resolve_batch_matches_resolve(monkeypatch: pytest.MonkeyPatch,
+                                       vectorized: bool) -> None:
+    if not vectorized:  # Путь без NumPy
+        monkeypatch.setattr(RPSLS, '_np_matrix', None)
+    elif RPSLS._np_matrix is None:
+        pytest.skip('NumPy is not installed')
+    first = [a for a in RPSLS.moves for _ in RPSLS.moves]
+    second = [b for _ in RPSLS.moves for b in RPSLS.moves]
+    outcomes = RPSLS.resolve_batch(RPSLS.encode(first), RPSLS.encode(second))
+    assert list(outcomes) == [RPSLS.resolve(a, b)
+                              for a, b in zip(first, second)]
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from services.timers import TimerWheel
+
+
+def run(scenario: Callable[[TimerWheel], Awaitable[Any]],
+        **options: Any) -> TimerWheel:
+    '''Гоняет колесо вручную, через advance: фоновый драйвер не нужен'''
+    wheel = TimerWheel(**options)
+
+    async def main() -> None:
+        try:
+            await scenario(wheel)
+        finally:
+            if wheel._driver is not None:
+                wheel._driver.cancel()
+
+    asyncio.run(main())
+    return wheel
+
+
+def test_timer_fires_at_its_tick() -> None:
+    fired: list[str] = []
+
+    async def scenario(wheel: TimerWheel) -> None:
+        timer = wheel.schedule(5, fired.append, 'a')
+        # Срок округляется вверх до тика
+        assert 4.9 < wheel.remaining(timer) < 6
+        assert wheel.advance(timer.expires - 1) == 0
+        assert fired == []
+        assert wheel.advance(timer.expires) == 1
+        assert fired == ['a']
+        assert wheel.pending == 0
+
+    wheel = run(scenario, tick=1)
+    assert wheel.stats.fired == wheel.stats.batches == 1
+
+
+def test_cancelled_timer_does_not_fire() -> None:
+    fired: list[str] = []
+
+    async def scenario(wheel: TimerWheel) -> None:
+        timer = wheel.schedule(3, fired.append, 'a')
+        wheel.schedule(3, fired.append, 'b')
+        assert wheel.cancel(timer)
+        assert not wheel.cancel(timer)
+        wheel.advance(timer.expires)
+        assert fired == ['b']
+
+    wheel = run(scenario, tick=1)
+    assert wheel.stats.cancelled == 1
+
+
+def test_long_timers_cascade_down_to_their_tick() -> None:
+    """Таймеры верхних уровней и дальше всего колеса срабатывают в срок"""
+    fired: list[tuple[int, int]] = []
+
+    async def scenario(wheel: TimerWheel) -> None:
+        # Обороты уровней: 4, 16 и 64 тика
+        timers = [wheel.schedule(delay, lambda delay: fired.append(
+            (delay, wheel.current)), delay) for delay in (3, 10, 50, 200)]
+        expires = {timer.args[0]: timer.expires for timer in timers}
+        for tick in range(wheel.current + 1, max(expires.values()) + 1):
+            wheel.advance(tick)
+        assert fired == sorted(expires.items())
+
+    wheel = run(scenario, tick=1, slots=4, levels=3)
+    assert wheel.stats.cascaded > 0
+    assert wheel.pending == 0
+
+
+def test_failing_callback_does_not_stop_batch() -> None:
+    fired: list[str] = []
+
+    def fail() -> None:
+        raise RuntimeError('callback failed')
+
+    async def scenario(wheel: TimerWheel) -> None:
+        wheel.schedule(1, fail)
+        timer = wheel.schedule(1, fired.append, 'a')
+        wheel.advance(timer.expires)
+
+    wheel = run(scenario, tick=1)
+    assert fired == ['a']
+    assert wheel.stats.failed == 1
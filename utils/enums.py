@@ -6,3 +6,27 @@ class PlayerCode(enum.Enum):
     USER = 1
     OPPONENT = 2
     BOTH = 3
+
+
+class GamePhase(enum.Enum):
+    NEW = 0  # Никто еще не согласился на игру
+    CONSENT = 1  # Один игрок согласился и ждет второго
+    MOVES = 2  # Игроки выбирают ходы обеих рук
+    HAND_CHOICE = 3  # Выбор оставшейся руки
+    FINISHED = 4
+
+
+class MatchOutcome(enum.Enum):
+    WIN = 0  # Победа оставленной рукой или соперник не успел с ходом
+    NO_MOVES = 1  # Никто не успел выбрать ходы
+    REFUSED = 2  # Игрок отказался от игры
+    NO_CONSENT = 3  # Соперник не согласился вовремя
+    ABANDONED = 4  # Сессия брошена: удалена по TTL или вытеснена
+    DRAW = 5  # Оставленные руки сыграли вничью
+
+
+class RoundResult(enum.IntEnum):
+    '''Исход раунда для первого из двух игроков'''
+    DRAW = 0
+    FIRST = 1  # Первый победил
+    SECOND = 2  # Победил второй